@@ -0,0 +1,88 @@
+"""
+Batch simulation of headless games
+
+Usage (from the src directory):
+
+    python -m batch [--seeds N] [--monster-count N [N ...]]
+                    [--attack-distance D [D ...]] [--processes N]
+                    [--output RESULTS.json]
+
+Runs a game for every seed and every combination of parameters in a
+process pool and prints statistics aggregated by parameters. With
+--output, results of all games are saved as well.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+from batch import runner
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(prog='python -m batch')
+    parser.add_argument('--seeds', type=int, default=100, help='games per parameter combination')
+    parser.add_argument('--first-seed', type=int, default=0)
+    parser.add_argument('--map-size', type=int, default=runner.DEFAULT_CONFIG['map_size'])
+    parser.add_argument('--coin-count', type=int, default=runner.DEFAULT_CONFIG['coin_count'])
+    parser.add_argument('--monster-count', type=int, nargs='+',
+                        default=[runner.DEFAULT_CONFIG['monster_count']])
+    parser.add_argument('--attack-distance', type=float, nargs='+', default=[None],
+                        help='AgressiveAIComponent attack distance')
+    parser.add_argument('--attack-speed', type=float, nargs='+', default=[None],
+                        help='AgressiveAIComponent attack speed')
+    parser.add_argument('--max-seconds', type=float, default=300.0,
+                        help='simulated seconds of every game')
+    parser.add_argument('--processes', type=int, help='number of processes, one per CPU by default')
+    parser.add_argument('--output', metavar='PATH', help='save results of all games')
+    args = parser.parse_args(argv)
+
+    jobs = []
+    for monster_count, attack_distance, attack_speed in itertools.product(
+            args.monster_count, args.attack_distance, args.attack_speed):
+        monster_ai = {}
+        if attack_distance is not None:
+            monster_ai['attack_distance'] = attack_distance
+        if attack_speed is not None:
+            monster_ai['attack_speed'] = attack_speed
+        config = {
+            'map_size': args.map_size,
+            'coin_count': args.coin_count,
+            'monster_count': monster_count,
+            'monster_ai': monster_ai or None,
+            'max_ticks': int(args.max_seconds * 60),
+        }
+        jobs.extend((seed, config) for seed in xrange(args.first_seed, args.first_seed + args.seeds))
+
+    done = [0]
+
+    def progress(result):
+        done[0] += 1
+        sys.stderr.write('\r%d / %d games' % (done[0], len(jobs)))
+        sys.stderr.flush()
+
+    results = runner.run_batch(jobs, processes=args.processes, callback=progress)
+    sys.stderr.write('\n')
+
+    for config, statistics in runner.aggregate(results):
+        print 'monster_count=%s monster_ai=%s' % (config['monster_count'], config['monster_ai'])
+        print '    games %d, caught %.1f%%' % (statistics['games'], 100 * statistics['caught_ratio'])
+        for name in ('survival_seconds', 'coins_collected', 'tick_mean', 'tick_p99'):
+            s = statistics[name]
+            print '    %-17s mean %9.3f  p50 %9.3f  p95 %9.3f' % (name, s['mean'], s['p50'], s['p95'])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results, 'summary': runner.aggregate(results)},
+                      f, indent=2, sort_keys=True)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
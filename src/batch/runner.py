@@ -0,0 +1,166 @@
+import multiprocessing
+import random
+import timeit
+import pygame
+from mygame import Game
+from mygame.components import Component
+from mygame.stats import summarize
+from mygame.telemetry import Telemetry
+
+# Job configuration, a job is a (seed, config) pair, where config overrides
+# some of these
+DEFAULT_CONFIG = {
+    'map_size': 63,
+    'coin_count': 25,
+    'monster_count': 5,
+    'monster_ai': None,          # See factory.MONSTER_AI
+    'vectorized_movement': False,
+    'max_ticks': 5 * 60 * 60,    # 5 minutes at 60 fps
+    'turn_ticks': 30,            # Player changes direction every N ticks
+    'bomb_chance': 0.01,         # Chance of the player planting a bomb every tick
+}
+
+_moves = (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN)
+
+
+class PlayerBot(object):
+    """
+    Pressed keys of a player running in random directions and planting
+    bombs now and then, see ScriptedInput; uses its own random generator, so
+    the game stays deterministic
+    """
+
+    def __init__(self, seed, turn_ticks, bomb_chance):
+        self.random = random.Random(seed)
+        self.turn_ticks = turn_ticks
+        self.bomb_chance = bomb_chance
+        self._move = None
+
+    def __call__(self, tick):
+        if tick % self.turn_ticks == 0:
+            self._move = self.random.choice(_moves)
+        if self.random.random() < self.bomb_chance:
+            return (self._move, pygame.K_SPACE)
+        return (self._move,)
+
+
+def get_config(config):
+    full_config = dict(DEFAULT_CONFIG)
+    full_config.update(config)
+    return full_config
+
+
+def is_caught(game):
+    """
+    Player is caught when a monster is in the same cell
+    """
+    return bool(game.get_entities('monsters', coord=game.player.location.cs))
+
+
+def run_job(job):
+    """
+    Simulate a headless game until the player is caught or max_ticks;
+    returns statistics of the game
+    """
+
+    seed, config = job
+    full_config = get_config(config)
+
+    start = timeit.default_timer()
+
+    telemetry = Telemetry(capacity=full_config['max_ticks'])
+    game = Game(headless=True, seed=seed, telemetry=telemetry,
+                map_size=(full_config['map_size'], full_config['map_size']),
+                coin_count=full_config['coin_count'],
+                monster_count=full_config['monster_count'],
+                monster_ai=full_config['monster_ai'],
+                vectorized_movement=full_config['vectorized_movement'])
+    bot = PlayerBot(seed, full_config['turn_ticks'], full_config['bomb_chance'])
+
+    caught = False
+    ticks = 0
+    while ticks < full_config['max_ticks'] and not caught:
+        game.simulate(1, inputs=lambda _: bot(ticks))
+        ticks += 1
+        caught = is_caught(game)
+
+    tick_cost = telemetry.get_summary()['window']['update']
+
+    return {
+        'seed': seed,
+        'config': config,
+        'caught': caught,
+        'survival_ticks': ticks,
+        'survival_seconds': 1.0 * ticks / game.fps,
+        'coins_collected': game.player(Component.COLLECTOR).collected,
+        'coins': full_config['coin_count'],
+        'tick_mean': tick_cost['mean'],
+        'tick_p99': tick_cost['p99'],
+        'seconds': timeit.default_timer() - start,
+    }
+
+
+def run_batch(jobs, processes=None, callback=None):
+    """
+    Run the jobs in a process pool, one process per CPU by default; returns
+    results in the order of the jobs
+
+    callback  Function called with every result as soon as it's ready
+    """
+
+    jobs = list(jobs)
+    if not jobs:
+        return []
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    # Jobs are sent in chunks to keep inter-process traffic low, but small
+    # enough to keep all processes busy until the end
+    chunksize = max(1, len(jobs) // (4 * processes))
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = []
+        for i, result in pool.imap_unordered(_run_indexed_job, enumerate(jobs), chunksize):
+            results.append((i, result))
+            if callback is not None:
+                callback(result)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    return [result for _, result in sorted(results)]
+
+
+def _run_indexed_job((i, job)):
+    return i, run_job(job)
+
+
+def aggregate(results):
+    """
+    Group results by config; returns [(config, statistics), ...] in the
+    order of first appearance
+    """
+
+    groups = []
+    by_config = {}
+    for result in results:
+        key = repr(sorted(result['config'].items()))
+        if key not in by_config:
+            by_config[key] = []
+            groups.append((result['config'], by_config[key]))
+        by_config[key].append(result)
+
+    return [(config, {
+                'games': len(group),
+                'caught_ratio': 1.0 * sum(r['caught'] for r in group) / len(group),
+                'survival_seconds': summarize([r['survival_seconds'] for r in group]),
+                'coins_collected': summarize([r['coins_collected'] for r in group]),
+                'tick_mean': summarize([r['tick_mean'] for r in group]),
+                'tick_p99': summarize([r['tick_p99'] for r in group]),
+            })
+            for config, group in groups]
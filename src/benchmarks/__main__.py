@@ -0,0 +1,72 @@
+"""
+Benchmark suite
+
+Usage (from the src directory):
+
+    python -m benchmarks [-k FILTER] [--min-time SECONDS]
+                         [--save BASELINE.json] [--baseline BASELINE.json]
+
+Runs headless with the SDL dummy video driver. With --baseline, results are
+compared with a previously saved baseline and the exit status is non-zero
+if any scenario became slower by more than --tolerance.
+"""
+import argparse
+import os
+import sys
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+from benchmarks import runner, scenarios
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument('-k', dest='filter', help='run only scenarios containing FILTER in their id')
+    parser.add_argument('--min-time', type=float, default=1.0, help='seconds to run every scenario')
+    parser.add_argument('--save', metavar='PATH', help='save results as a baseline')
+    parser.add_argument('--baseline', metavar='PATH', help='compare results with a baseline')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='allowed relative slowdown against the baseline')
+    args = parser.parse_args(argv)
+
+    baseline = runner.load_baseline(args.baseline) if args.baseline else {}
+
+    pygame.init()
+
+    results = []
+    for scenario in scenarios.get_scenarios():
+        if args.filter and args.filter not in scenario.id:
+            continue
+        result = runner.run_scenario(scenario, min_time=args.min_time)
+        results.append(result)
+        print '%-75s %10.1f ops/s  p50 %9.3f ms  p99 %9.3f ms' % (
+            result['id'], result['ops_per_sec'], result['p50'], result['p99'])
+        sys.stdout.flush()
+
+    pygame.quit()
+
+    if args.save:
+        runner.save_baseline(args.save, results)
+
+    regressions = 0
+    if baseline:
+        print
+        print 'Compared with %s:' % args.baseline
+        for result, _, change in runner.compare(results, baseline):
+            if change < -args.tolerance:
+                regressions += 1
+                mark = 'SLOWER'
+            elif args.tolerance < change:
+                mark = 'faster'
+            else:
+                mark = ''
+            print '%-75s %+7.1f%%  %s' % (result['id'], 100 * change, mark)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+"""
+Map generation benchmark
+
+Usage (from the src directory):
+
+    python -m benchmarks.map_generation [size ...]
+"""
+import sys
+import time
+from mygame.map import Cell
+from mygame.map.arraymap import ArrayMap
+from mygame.map.generator import ArrayMazeGenerator
+
+SIZES = (1024, 4096, 8192)
+
+
+class _EmptyMapGenerator(object):
+    def generate(self, map_):
+        pass
+
+
+def run(size, seed=0):
+
+    map_ = ArrayMap(None, (size + 1, size + 1), _EmptyMapGenerator())
+    map_generator = ArrayMazeGenerator(seed=seed)
+
+    start = time.time()
+    types = map_generator.generate_types(map_.size)
+    generated = time.time()
+    map_.set_types(types)
+    finished = time.time()
+
+    return {
+        'size': size,
+        'generate': generated - start,
+        'set_types': finished - generated,
+        'total': finished - start,
+        'floor_ratio': 1.0 * map_.count(Cell.FLOOR) / types.size,
+    }
+
+
+def main(sizes):
+    for size in sizes:
+        result = run(size)
+        print '%(size)5dx%(size)-5d  generate %(generate)7.3fs  set_types %(set_types)7.3fs  ' \
+              'total %(total)7.3fs  floor %(floor_ratio).2f' % result
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or SIZES)
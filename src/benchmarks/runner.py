@@ -0,0 +1,98 @@
+import json
+import timeit
+from mygame.stats import summarize
+
+
+class Scenario(object):
+
+    def __init__(self, name, setup, **params):
+        """
+        name    Scenario name, shared by all parameter combinations
+        setup   Function, which takes the params and returns the operation
+                to measure, or (operation, prepare) pair, where prepare is
+                called before every operation and is not measured, or
+                (operation, prepare, cleanup), where cleanup is called
+                after the last operation; prepare may be None
+        params  Scenario parameters
+        """
+        self.name = name
+        self.setup = setup
+        self.params = params
+
+    @property
+    def id(self): #@ReservedAssignment
+        params = ','.join('%s=%s' % (name, self.params[name]) for name in sorted(self.params))
+        return '%s[%s]' % (self.name, params)
+
+
+def run_scenario(scenario, min_time=1.0, min_ops=5, max_ops=100000):
+    """
+    Repeat the scenario operation for at least min_time seconds and min_ops
+    times; returns timings in milliseconds
+    """
+
+    operation = scenario.setup(**scenario.params)
+    prepare = None
+    cleanup = None
+    if isinstance(operation, tuple):
+        if len(operation) == 3:
+            operation, prepare, cleanup = operation
+        else:
+            operation, prepare = operation
+
+    timer = timeit.default_timer
+    timings = []
+    total_time = 0.0
+
+    try:
+        while len(timings) < max_ops and (len(timings) < min_ops or total_time < min_time):
+            if prepare is not None:
+                prepare()
+            start = timer()
+            operation()
+            elapsed = timer() - start
+            timings.append(1000.0 * elapsed)
+            total_time += elapsed
+    finally:
+        if cleanup is not None:
+            cleanup()
+
+    summary = summarize(timings, (50, 99))
+
+    return {
+        'id': scenario.id,
+        'name': scenario.name,
+        'params': scenario.params,
+        'ops': len(timings),
+        'ops_per_sec': len(timings) / total_time if total_time else None,
+        'mean': summary['mean'],
+        'p50': summary['p50'],
+        'p99': summary['p99'],
+    }
+
+
+def save_baseline(path, results):
+    with open(path, 'w') as f:
+        json.dump({'version': 1, 'results': dict((r['id'], r) for r in results)},
+                  f, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare(results, baseline):
+    """
+    Compare results with the baseline by ops/sec; returns list of
+    (result, baseline_result, change) for scenarios present in both, where
+    change is relative: -0.2 means 20% slower
+    """
+    comparison = []
+    for result in results:
+        baseline_result = baseline.get(result['id'])
+        if baseline_result is None or not baseline_result['ops_per_sec']:
+            continue
+        change = result['ops_per_sec'] / baseline_result['ops_per_sec'] - 1.0
+        comparison.append((result, baseline_result, change))
+    return comparison
@@ -0,0 +1,400 @@
+import functools
+import itertools
+import os
+import random
+import tempfile
+import numpy
+import pygame
+from mygame import Game, factory, replay, savegame
+from mygame.components import Component, ExplosionComponent
+from mygame.components.behavior import FollowTargetAIComponent
+from mygame.components.location import ArrayMovingLocationComponent
+from mygame.entities import Entity
+from mygame.input import KeyState
+from mygame.map import Cell, Map, generator
+from mygame.map.arraymap import ArrayMap
+from mygame.map.chunkedmap import ChunkedMap
+from mygame.map.flowfield import FlowField
+from mygame.map.pathfinding import HierarchicalPathfinder, IncrementalPlanner, PassabilityLog
+from mygame.render import Renderer, DirtyRectRenderer, ChunkedRenderer
+from mygame.systems.movement import MovementSystem
+from mygame.types import direction
+
+
+def _create_game(map_size, monster_count=0, coin_count=0, bomb_count=0, headless=True, seed=0,
+                 **kwargs):
+
+    game = Game(headless=headless,
+                seed=seed,
+                map_size=(map_size, map_size),
+                coin_count=coin_count,
+                monster_count=monster_count,
+                **kwargs)
+
+    # Bombs, which never explode by themselves
+    for cell in random.sample(list(game.map.get_cells(Cell.FLOOR)), bomb_count):
+        bomb = factory.create_bomb(cell.coord)
+        bomb(Component.EXPLOSION).time = None
+        game.add_entity('bombs', bomb)
+
+    if not headless:
+        game.screen = pygame.display.set_mode(game.screen_size)
+
+    return game
+
+
+def _get_distant_cells(game_map):
+    """
+    Two floor cells in the opposite corners of the map
+    """
+    cells = list(game_map.get_cells(Cell.FLOOR))
+    return (min(cells, key=lambda cell: cell.x + cell.y),
+            max(cells, key=lambda cell: cell.x + cell.y))
+
+
+# == Map generation ==
+
+def maze_generation(map_size):
+    return lambda: Map(None, (map_size, map_size), generator.MazeGenerator())
+
+
+def array_maze_generation(map_size):
+    return lambda: ArrayMap(None, (map_size, map_size), generator.ArrayMazeGenerator(seed=0))
+
+
+def random_floor_cell(map_size):
+    game_map = Map(None, (map_size, map_size), generator.MazeGenerator())
+    return lambda: game_map.get_random_cell(Cell.FLOOR)
+
+
+# == Pathfinding ==
+
+def astar_search(map_size):
+
+    game = _create_game(map_size)
+    start, target = _get_distant_cells(game.map)
+    game.player.location.c = target.coord
+    monster = factory.create_monster(start.coord)
+
+    behavior = FollowTargetAIComponent()
+    return lambda: behavior._get_movement_direction(game, monster)
+
+
+def flow_field_update(map_size):
+
+    game = _create_game(map_size)
+    sources = itertools.cycle(cell.coord for cell in _get_distant_cells(game.map))
+    flow_field = FlowField(game.map)
+
+    return lambda: flow_field.update(next(sources))
+
+
+def hierarchical_path_search(map_size):
+    """
+    Searches between opposite corners of a large maze, after the first
+    search has built the clusters on the way
+    """
+
+    game = _create_game(63)
+    game.map = ArrayMap(game, (map_size, map_size), generator.ArrayMazeGenerator(seed=0))
+    start, target = _get_distant_cells(game.map)
+    pathfinder = HierarchicalPathfinder(game.map)
+    pathfinder.get_next_step(start.coord, target.coord)
+
+    return lambda: pathfinder.get_next_step(start.coord, target.coord)
+
+
+def hierarchical_path_repair(map_size):
+    """
+    Searches between opposite corners of a large maze, with a stone cell
+    next to the path mined through or put back before every search
+    """
+
+    game = _create_game(63)
+    game.map = ArrayMap(game, (map_size, map_size), generator.ArrayMazeGenerator(seed=0))
+    start, target = _get_distant_cells(game.map)
+    pathfinder = HierarchicalPathfinder(game.map)
+    path = pathfinder.get_path(start.coord, target.coord)
+
+    # Stone cells next to the path
+    stones = itertools.cycle([cell for coord in path[::16]
+                                   for cell in game.map.get_adjacent_cells(coord, Cell.STONE)])
+
+    def prepare():
+        cell = next(stones)
+        cell.change_to(Cell.FLOOR if cell.type == Cell.STONE else Cell.STONE)
+
+    return (lambda: pathfinder.get_next_step(start.coord, target.coord)), prepare
+
+
+def incremental_path_repair(map_size):
+    """
+    Steps between opposite corners of a large maze, with a stone cell next
+    to the path mined through or put back before every step
+    """
+
+    game = _create_game(63)
+    game.map = ArrayMap(game, (map_size, map_size), generator.ArrayMazeGenerator(seed=0))
+    start, target = _get_distant_cells(game.map)
+    planner = IncrementalPlanner(game.map, PassabilityLog(game.map), max_expansions=map_size ** 2)
+    path = HierarchicalPathfinder(game.map).get_path(start.coord, target.coord)
+    planner.get_next_step(start.coord, target.coord)
+
+    # Stone cells next to the path
+    stones = itertools.cycle([cell for coord in path[::16]
+                                   for cell in game.map.get_adjacent_cells(coord, Cell.STONE)])
+
+    def prepare():
+        cell = next(stones)
+        cell.change_to(Cell.FLOOR if cell.type == Cell.STONE else Cell.STONE)
+
+    return (lambda: planner.get_next_step(start.coord, target.coord)), prepare
+
+
+# == Explosions ==
+
+def explosion_cells(power):
+    explosion = ExplosionComponent(power=power)
+    return lambda: list(explosion._get_damaged_cells((0, 0)))
+
+
+def detonation(map_size, bomb_count):
+
+    game = _create_game(map_size)
+    cells = list(game.map.get_cells(Cell.FLOOR))
+
+    def prepare():
+        for cell in random.sample(cells, bomb_count):
+            bomb = factory.create_bomb(cell.coord)
+            bomb(Component.EXPLOSION).trigger()
+            game.add_entity('bombs', bomb)
+
+    return (lambda: game.simulate(1)), prepare
+
+
+def chain_reaction(map_size, bomb_count):
+
+    game = _create_game(map_size)
+
+    # Bombs close enough to set each other off, only the first one is
+    # triggered
+    columns = map_size / 3
+    coords = [(3 * (i % columns), 3 * (i / columns)) for i in xrange(bomb_count)]
+
+    def prepare():
+        for coord in coords:
+            bomb = factory.create_bomb(coord)
+            bomb(Component.EXPLOSION).time = None
+            game.add_entity('bombs', bomb)
+        bomb(Component.EXPLOSION).trigger()
+
+    return (lambda: game.simulate(1)), prepare
+
+
+# == Full ticks ==
+
+def tick_update(map_size, monster_count, coin_count, bomb_count):
+    game = _create_game(map_size, monster_count, coin_count, bomb_count)
+    return lambda: game.simulate(1)
+
+
+def long_session_tick_update(map_size, minutes):
+    """
+    Ticks after a session of the player planting bombs all the time
+    """
+    game = _create_game(map_size)
+    game.simulate(minutes * 60 * game.fps, inputs=lambda tick: (pygame.K_SPACE,))
+    return lambda: game.simulate(1, inputs=lambda tick: (pygame.K_SPACE,))
+
+
+def profiled_tick_update(map_size, monster_count):
+    game = _create_game(map_size, monster_count, profile=True)
+    return lambda: game.simulate(1)
+
+
+def tick_draw(map_size, monster_count, coin_count, bomb_count):
+    game = _create_game(map_size, monster_count, coin_count, bomb_count, headless=False)
+    game.simulate(1)
+    # The first frame draws the whole map
+    game.on_draw()
+    return game.on_draw
+
+
+_renderers = {
+    'full': Renderer,
+    'dirty_rect': DirtyRectRenderer,
+    'chunked': ChunkedRenderer,
+}
+
+
+def scrolling_draw(map_size, renderer):
+    """
+    Frames of the player walking across a large array map, so the screen
+    scrolls every frame
+    """
+
+    game = _create_game(map_size, headless=False, map_class=ArrayMap,
+                        map_generator=generator.ArrayMazeGenerator(seed=0),
+                        renderer_class=_renderers[renderer])
+    game.on_draw()
+
+    coords = itertools.cycle((x + 0.5, map_size / 2) for x in xrange(map_size))
+
+    def draw():
+        game.player.location.c = next(coords)
+        game.on_draw()
+
+    return draw
+
+
+def chunked_world_walk(map_size, max_memory):
+    """
+    Ticks and frames of the player walking straight across a chunked map,
+    so new chunks are generated and old ones evicted all the time
+    """
+
+    game = _create_game(map_size, headless=False,
+                        map_class=functools.partial(ChunkedMap, max_memory=max_memory),
+                        map_generator=generator.ArrayMazeGenerator(seed=0),
+                        renderer_class=ChunkedRenderer)
+    coords = ((x + 0.5, map_size / 2) for x in itertools.count(map_size / 2))
+
+    def walk():
+        game.player.location.c = next(coords)
+        game.simulate(1)
+        game.on_draw()
+
+    # Evicted chunks are spilled to a temporary directory
+    return walk, None, game.map.close
+
+
+# == Saved games ==
+
+def savegame_load(map_size):
+
+    game = _create_game(63, map_class=ArrayMap, map_generator=generator.ArrayMazeGenerator(seed=0))
+    game.map = ArrayMap(game, (map_size, map_size), generator.ArrayMazeGenerator(seed=0))
+
+    path = os.path.join(tempfile.mkdtemp(), 'benchmark.sav')
+    savegame.save(game, path)
+
+    return lambda: savegame.load(game, path)
+
+
+# == Replays ==
+
+def session_replay(map_size, ticks):
+    """
+    Replay of a recorded session of the player running around and planting
+    bombs, the game is created from the recorded seed before every replay
+    """
+
+    path = os.path.join(tempfile.mkdtemp(), 'benchmark.rec')
+    rng = random.Random(0)
+    keys = (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN, pygame.K_SPACE)
+    recorder = replay.Recorder(path)
+    recorder.start(0, 60)
+    for _ in xrange(ticks):
+        recorder.record(rng.choice((16, 17)), KeyState(rng.sample(keys, 2)))
+    recorder.close()
+    recording = replay.load(path)
+
+    games = []
+
+    def prepare():
+        games[:] = [_create_game(map_size, monster_count=5, coin_count=25, seed=recording.seed)]
+
+    return (lambda: games[0].replay(recording)), prepare
+
+
+# == Movement ==
+
+def movement_system(map_size, entity_count):
+
+    game = _create_game(map_size)
+    game.milliseconds = 1000.0 / game.fps
+    game.movement_system = system = MovementSystem()
+    cells = list(game.map.get_cells(Cell.FLOOR))
+
+    for _ in xrange(entity_count):
+        location = ArrayMovingLocationComponent(system, random.choice(cells).coord, speed=3)
+        entity = Entity(components={Component.LOCATION: location})
+        location.attach(entity)
+        game.add_entity('monsters', entity)
+
+    directions = numpy.array(direction.directions, dtype=numpy.int8)
+
+    def prepare():
+        # Some entities change their minds every tick
+        turning = numpy.random.randint(0, 10, size=system.count) == 0
+        system.next_direction[:system.count][turning] = \
+            directions[numpy.random.randint(0, len(directions), size=turning.sum())]
+
+    return (lambda: system.update(game)), prepare
+
+
+def get_scenarios():
+
+    from benchmarks.runner import Scenario
+
+    scenarios = []
+
+    for map_size in (63, 127):
+        scenarios.append(Scenario('maze_generation', maze_generation, map_size=map_size))
+        scenarios.append(Scenario('random_floor_cell', random_floor_cell, map_size=map_size))
+    for map_size in (255, 1023):
+        scenarios.append(Scenario('array_maze_generation', array_maze_generation, map_size=map_size))
+
+    for map_size in (63, 127, 255):
+        scenarios.append(Scenario('astar_search', astar_search, map_size=map_size))
+        scenarios.append(Scenario('flow_field_update', flow_field_update, map_size=map_size))
+
+    for map_size in (255, 2047):
+        scenarios.append(Scenario('hierarchical_path_search', hierarchical_path_search, map_size=map_size))
+        scenarios.append(Scenario('hierarchical_path_repair', hierarchical_path_repair, map_size=map_size))
+
+    for map_size in (255, 1023):
+        scenarios.append(Scenario('incremental_path_repair', incremental_path_repair, map_size=map_size))
+
+    for power in (2, 8, 32):
+        scenarios.append(Scenario('explosion_cells', explosion_cells, power=power))
+    for bomb_count in (1, 10, 50, 200):
+        scenarios.append(Scenario('detonation', detonation, map_size=127, bomb_count=bomb_count))
+    for bomb_count in (50, 200, 1000):
+        scenarios.append(Scenario('chain_reaction', chain_reaction, map_size=127, bomb_count=bomb_count))
+
+    for map_size in (63, 255, 1023):
+        for renderer in ('full', 'dirty_rect', 'chunked'):
+            scenarios.append(Scenario('scrolling_draw', scrolling_draw,
+                                      map_size=map_size, renderer=renderer))
+
+    for max_memory in (2 ** 20, 2 ** 24):
+        scenarios.append(Scenario('chunked_world_walk', chunked_world_walk,
+                                  map_size=2 ** 24, max_memory=max_memory))
+
+    for map_size in (1024, 4096):
+        scenarios.append(Scenario('savegame_load', savegame_load, map_size=map_size))
+
+    for ticks in (600,):
+        scenarios.append(Scenario('session_replay', session_replay, map_size=63, ticks=ticks))
+
+    for entity_count in (1000, 10000, 50000):
+        scenarios.append(Scenario('movement_system', movement_system,
+                                  map_size=255, entity_count=entity_count))
+
+    for map_size, monster_count, coin_count, bomb_count in itertools.product(
+            (63, 255), (5, 100), (25, 500), (0, 20)):
+        params = dict(map_size=map_size, monster_count=monster_count,
+                      coin_count=coin_count, bomb_count=bomb_count)
+        scenarios.append(Scenario('tick_update', tick_update, **params))
+        scenarios.append(Scenario('tick_draw', tick_draw, **params))
+
+    for minutes in (0, 5):
+        scenarios.append(Scenario('long_session_tick_update', long_session_tick_update,
+                                  map_size=63, minutes=minutes))
+
+    for monster_count in (5, 100):
+        scenarios.append(Scenario('profiled_tick_update', profiled_tick_update,
+                                  map_size=255, monster_count=monster_count))
+
+    return scenarios
@@ -1,19 +1,58 @@
 import random
 import math
+import timeit
 import pygame
-from mygame import factory
+from mygame import factory, savegame
 from mygame.map import generator, Map, Cell
+from mygame.map.flowfield import FlowField
+from mygame.map.pathfinding import HierarchicalPathfinder, PassabilityLog
+from mygame.messages import Message
+from mygame.entities.index import EntityIndex
+from mygame.entities.pool import EntityPool
+from mygame.render import Renderer
+from mygame.input import ScriptedInput
+from mygame.profiler import Profiler
+from mygame.systems.explosion import ExplosionSystem
+from mygame.systems.movement import MovementSystem
 
 class BaseGame(object):
 
-    def __init__(self):
+    def __init__(self, headless=False, profile=False, telemetry=None, seed=None, recorder=None):
+        """
+        headless   Game is only simulated, without display and drawing,
+                   see simulate()
+        profile    Collect timings of the game loop phases, see Profiler
+        telemetry  Telemetry recording frame times and entity counts of
+                   every frame, see mygame.telemetry
+        seed       Seed of the global random generator, which is seeded
+                   before on_init(); random by default
+        recorder   Recorder writing the session for a replay, see
+                   mygame.replay
+        """
+
+        self.headless = headless
+        self.profiler = Profiler(enabled=profile)
+        self.telemetry = telemetry
+        self.recorder = recorder
+
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.seed = seed
+        random.seed(seed)
 
         self.is_running = False
         self.milliseconds = 0
+        self.ticks = 0
+
+        # Keys pressed in the current tick, None means real keyboard
+        self._pressed_keys = None
 
         self.fps = 60
         self.screen_size = (640, 480)
 
+        if telemetry is not None:
+            telemetry.set_fps(self.fps)
+
         self.clock = None
         self.screen = None
 
@@ -32,33 +71,152 @@ class BaseGame(object):
 
         self.on_start()
 
+        if self.recorder is not None:
+            self.recorder.start(self.seed, self.fps)
+
         self.run()
 
     def run(self):
         self.is_running = True
         while True:
             self.milliseconds = self.clock.tick(self.fps)
+            keydown = []
+            keyup = []
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     self.stop()
                 elif event.type == pygame.KEYDOWN:
+                    keydown.append(event.key)
                     self.on_keydown(event.key)
                 elif event.type == pygame.KEYUP:
+                    keyup.append(event.key)
                     self.on_keyup(event.key)
                 elif event.type == pygame.MOUSEMOTION:
                     self.on_mouse_motion(event.pos, event.rel)
             if self.is_running:
-                self.on_update()
-                self.on_draw()
-                pygame.display.update()
+                if self.recorder is not None:
+                    # The game sees the keys exactly as they are replayed
+                    self._pressed_keys = self.recorder.record(
+                        self.milliseconds, pygame.key.get_pressed(), keydown, keyup)
+                start = timeit.default_timer()
+                with self.profiler.section('update'):
+                    self.on_update()
+                updated = timeit.default_timer()
+                self.ticks += 1
+                with self.profiler.section('draw'):
+                    updated_rects = self.on_draw()
+                with self.profiler.section('display'):
+                    if updated_rects is None:
+                        pygame.display.update()
+                    else:
+                        pygame.display.update(updated_rects)
+                self.profiler.end_frame()
+                if self.telemetry is not None:
+                    self.telemetry.record(self.ticks, self.milliseconds,
+                                          1000.0 * (updated - start),
+                                          1000.0 * (timeit.default_timer() - updated),
+                                          self.get_entity_count())
             else:
                 break
 
+    def simulate(self, ticks, dt=None, inputs=None):
+        """
+        Run game logic for the given number of ticks as fast as possible,
+        without waiting for real time, reading the keyboard or drawing
+
+        ticks   Number of ticks to simulate
+        dt      Simulated time of every tick in seconds, 1 / fps by default
+        inputs  Pressed keys, see ScriptedInput; the tick number passed to
+                the script is counted from the start of this simulation
+
+        Returns number of simulated ticks, which is less than requested if
+        the game has been stopped.
+        """
+
+        if dt is None:
+            dt = 1.0 / self.fps
+
+        if not isinstance(inputs, ScriptedInput):
+            inputs = ScriptedInput(inputs)
+
+        self.is_running = True
+
+        tick = 0
+        try:
+            while tick < ticks and self.is_running:
+                self._simulate_tick(1000.0 * dt, inputs.get_pressed(tick))
+                tick += 1
+        finally:
+            self._pressed_keys = None
+
+        return tick
+
+    def replay(self, recording):
+        """
+        Re-run a recorded session as fast as possible, with exactly the same
+        results, see mygame.replay; the game has to be just created with the
+        seed of the recording
+
+        Returns number of replayed ticks.
+        """
+
+        if recording.seed != self.seed:
+            raise ValueError('The game has to be created with the seed of the recording')
+
+        self.is_running = True
+
+        tick = 0
+        try:
+            for milliseconds, pressed_keys, keydown, keyup in recording:
+                for key in keydown:
+                    self.on_keydown(key)
+                for key in keyup:
+                    self.on_keyup(key)
+                if not self.is_running:
+                    break
+                self._simulate_tick(milliseconds, pressed_keys)
+                tick += 1
+        finally:
+            self._pressed_keys = None
+
+        return tick
+
+    def _simulate_tick(self, milliseconds, pressed_keys):
+
+        self.milliseconds = milliseconds
+        self._pressed_keys = pressed_keys
+
+        start = timeit.default_timer()
+        with self.profiler.section('update'):
+            self.on_update()
+        self.profiler.end_frame()
+        self.ticks += 1
+
+        if self.telemetry is not None:
+            # Simulated frames take as long as their update
+            update_time = 1000.0 * (timeit.default_timer() - start)
+            self.telemetry.record(self.ticks, update_time, update_time, 0.0,
+                                  self.get_entity_count())
+
+    def get_pressed_keys(self):
+        """
+        Same as pygame.key.get_pressed(), but returns scripted keys during
+        a simulation and recorded keys during a recording or a replay
+        """
+        if self._pressed_keys is not None:
+            return self._pressed_keys
+        return pygame.key.get_pressed()
+
     def stop(self):
         if self.is_running:
             self.on_stop()
-            pygame.quit()
+            if not self.headless:
+                pygame.quit()
             self.is_running = False
+            if self.recorder is not None:
+                self.recorder.close()
+            if self.telemetry is not None and self.telemetry.path is not None:
+                self.telemetry.write_summary()
             self.on_stopped()
 
     def on_init(self): pass
@@ -77,36 +235,146 @@ class BaseGame(object):
 
     def on_update(self): pass
 
-    def on_draw(self): pass
+    def on_draw(self):
+        """
+        Returns list of updated screen rectangles, None means the whole screen
+        """
+        pass
+
+    def on_entity_message(self, entity, message): pass
+
+    def on_entities_moved(self, entities, coords):
+        """
+        Entities have moved to new cells, called by MovementSystem instead of
+        CHANGE_LOCATION messages to entities, which don't handle them
+        """
+        pass
+
+    def get_entity_count(self):
+        """
+        Number of entities in the game, recorded by telemetry
+        """
+        return 0
 
 class Game(BaseGame):
 
+    def __init__(self, map_class=Map, renderer_class=Renderer, headless=False,
+                 map_size=None, map_generator=None, coin_count=25, monster_count=5, monster_ai=None,
+                 vectorized_movement=False, hierarchical_pathfinding=False, save_path=None,
+                 profile=False, telemetry=None, seed=None, recorder=None):
+        """
+        map_class       Map subclass used to store the map, e.g. ArrayMap
+        renderer_class  Renderer subclass used to draw frames, e.g.
+                        DirtyRectRenderer or ChunkedRenderer for large maps
+        headless        See BaseGame
+        map_size        Map size in cells, by default the map fits the screen
+        map_generator   MapGenerator, MazeGenerator by default
+        coin_count      Number of coins on the map
+        monster_count   Number of monsters on the map
+        monster_ai      AgressiveAIComponent arguments of monsters, see
+                        factory.MONSTER_AI
+        vectorized_movement
+                        Monsters are moved all at once by MovementSystem
+        hierarchical_pathfinding
+                        Path search uses HierarchicalPathfinder, for large
+                        maps
+        save_path       Start from the saved game instead of generating a new
+                        one, see mygame.savegame
+        profile         See BaseGame, F3 shows the profiler overlay
+        telemetry       See BaseGame
+        seed            See BaseGame
+        recorder        See BaseGame
+        """
+        self.map_class = map_class
+        self.renderer_class = renderer_class
+        self.map_size = map_size
+        self.map_generator = map_generator
+        self.coin_count = coin_count
+        self.monster_count = monster_count
+        self.monster_ai = monster_ai
+        self.vectorized_movement = vectorized_movement
+        self.hierarchical_pathfinding = hierarchical_pathfinding
+        self.save_path = save_path
+        super(Game, self).__init__(headless=headless, profile=profile, telemetry=telemetry,
+                                   seed=seed, recorder=recorder)
+
     def on_init(self):
 
         self.entities = {}
+        self.entity_index = EntityIndex()
+
+        # Short-lived entities are reused, see spawn_entity()
+        self.entity_pools = {
+            'bombs': EntityPool(factory.create_bomb, factory.reset_bomb),
+        }
+
+        # Number of entities destroyed since the last compaction
+        self._destroyed_count = 0
 
         self.cell_size = (10, 10)
 
+        self.entities['coins'] = []
+        self.entities['bombs'] = []
+        self.entities['monsters'] = []
+        self.explosion_system = ExplosionSystem()
+        if self.vectorized_movement:
+            self.movement_system = MovementSystem()
+        else:
+            self.movement_system = None
+
+        # Init map and entities
+        if self.save_path is None:
+            self._generate_world()
+        else:
+            savegame.load(self, self.save_path)
+        self.map_size_in_pixels = tuple(self.map.size[i] * self.cell_size[i] for i in (0, 1))
+
+        # Directions to the player, shared by all chasing monsters
+        self.player_flow_field = FlowField(self.map, max_distance=64)
+
+        # Changed cells for incremental path search, see FollowTargetAIComponent
+        self.passability_log = PassabilityLog(self.map)
+
+        # Long-range path search, see FollowTargetAIComponent
+        if self.hierarchical_pathfinding:
+            self.pathfinder = HierarchicalPathfinder(self.map)
+        else:
+            self.pathfinder = None
+
+        # Init drawing surfaces
+        self.redraw_cells = []
+        self.redraw_map = True
+        if self.headless:
+            self.renderer = None
+        else:
+            self.renderer = self.renderer_class(self)
+
+        # Pause functionality
+        self._paused = False
+
+    def _generate_world(self):
+
         # Init map
-        map_size = [0, 0]
-        for i in (0, 1):
-            map_size[i] = int(1.0 * self.screen_size[i] / self.cell_size[i])
-            if map_size[i] % 2 == 0:
-                map_size[i] -= 1
-        self.map_size_in_pixels = tuple(map_size[i] * self.cell_size[i] for i in (0, 1))
-        map_generator = generator.MazeGenerator()
-        self.map = Map(self, map_size, map_generator)
+        if self.map_size is None:
+            map_size = [0, 0]
+            for i in (0, 1):
+                map_size[i] = int(1.0 * self.screen_size[i] / self.cell_size[i])
+                if map_size[i] % 2 == 0:
+                    map_size[i] -= 1
+        else:
+            map_size = list(self.map_size)
+        map_generator = self.map_generator
+        if map_generator is None:
+            map_generator = generator.MazeGenerator()
+        self.map = self.map_class(self, map_size, map_generator)
         empty_cells = list(self.map.get_cells(Cell.FLOOR))
 
         # Init coins
-        self.entities['coins'] = []
-        coin_cells = random.sample(list(self.map.get_cells((Cell.FLOOR, Cell.STONE))), 25)
+        coin_cells = list(self.map.get_cells((Cell.FLOOR, Cell.STONE)))
+        coin_cells = random.sample(coin_cells, min(self.coin_count, len(coin_cells)))
         for cell in coin_cells:
             coin = factory.create_coin(cell.coord)
-            self.entities['coins'].append(coin)
-
-        # Init bombs
-        self.entities['bombs'] = []
+            self.add_entity('coins', coin)
 
         # Init player
         self.player = factory.create_player(coord=random.choice(empty_cells).coord)
@@ -116,15 +384,13 @@ class Game(BaseGame):
                                 if 15 < math.sqrt((cell.x - self.player.location.x) ** 2 +
                                                   (cell.y - self.player.location.y) ** 2))
 
-        # Init monsters
-        self.entities['monsters'] = []
-
-        # Agressive
-        for _ in xrange(5):
+        # Init monsters, agressive
+        for _ in xrange(min(self.monster_count, len(empty_cells))):
             cell = random.choice(empty_cells)
             empty_cells.remove(cell)
-            monster = factory.create_monster(coord=cell.coord)
-            self.entities['monsters'].append(monster)
+            monster = factory.create_monster(coord=cell.coord, movement_system=self.movement_system,
+                                             ai=self.monster_ai)
+            self.add_entity('monsters', monster)
 
 #        # Harmless
 #        for _ in xrange(1):
@@ -142,43 +408,103 @@ class Game(BaseGame):
 #            monster.color = (255, 0, 255)
 #            self.entities['monsters'].append(monster)
 
-        # Init drawing surfaces
-        self.redraw_cells = []
-        self.redraw_map = True
-        self.map_surface = pygame.Surface(self.map_size_in_pixels)
-        self.draw_surface = pygame.Surface(self.map_size_in_pixels)
+    def add_entity(self, entity_type, entity):
+        if not self.entities.has_key(entity_type):
+            self.entities[entity_type] = []
+        self.entities[entity_type].append(entity)
+        self.entity_index.add(entity, entity_type)
+
+    def spawn_entity(self, entity_type, coord):
+        """
+        Add a new entity of a pooled type, reusing a destroyed one if there
+        is any; returns the entity
+        """
+        entity = self.entity_pools[entity_type].acquire(coord)
+        self.add_entity(entity_type, entity)
+        return entity
+
+    def compact_entities(self):
+        """
+        Remove destroyed entities from the entity lists and return them to
+        their pools; called at the end of every tick
+        """
+
+        if not self._destroyed_count:
+            return
+        self._destroyed_count = 0
 
-        # Pause functionality
-        self._paused = False
+        for entity_type, entities in self.entities.items():
+            pool = self.entity_pools.get(entity_type)
+            if pool is not None:
+                for e in entities:
+                    if e.destroyed:
+                        pool.release(e)
+            entities[:] = [e for e in entities if not e.destroyed]
 
     def get_entities(self, types=None, coord=None):
 
+        if types is not None and not hasattr(types, '__iter__'):
+            types = [types]
+
+        if coord is not None:
+            return self.entity_index.get(coord, types)
+
         if types is None:
             types = self.entities.keys()
         else:
-            if not hasattr(types, '__iter__'):
-                types = [types]
             types = (t for t in types if self.entities.has_key(t))
 
         entities = (e for t in types
                       for e in self.entities[t]
                       if not e.destroyed)
 
-        if coord is not None:
-            entities = (e for e in entities
-                          if e.location and e.location.cr == coord)
-
         return entities
 
+    def get_entity_count(self):
+        return sum(len(entities) for entities in self.entities.values())
+
+    def on_entity_message(self, entity, message):
+        if message.type == Message.CHANGE_LOCATION:
+            self.entity_index.move(entity, message.coord)
+        elif message.type == Message.DESTROY:
+            self.entity_index.remove(entity)
+            self._destroyed_count += 1
+
+    def on_entities_moved(self, entities, coords):
+        move = self.entity_index.move
+        for entity, coord in zip(entities, coords):
+            move(entity, coord)
+
     def on_update(self):
 
         if self._paused:
             return
 
-        for e in self.get_entities():
-            e.update(self)
+        profiler = self.profiler
+
+        with profiler.section('update/entities'):
+            if profiler.enabled:
+                for e in self.get_entities():
+                    e.profile_update(self, profiler)
+            else:
+                for e in self.get_entities():
+                    e.update(self)
+
+        if self.movement_system is not None:
+            with profiler.section('update/movement'):
+                self.movement_system.update(self)
 
-        self.player.update(self)
+        with profiler.section('update/explosions'):
+            self.explosion_system.update(self)
+
+        with profiler.section('update/player'):
+            self.player.update(self)
+
+        with profiler.section('update/map'):
+            self.map.update(self)
+
+        with profiler.section('update/compaction'):
+            self.compact_entities()
 
         #if self.player.location_changed:
         #    # Check if player collected a coin
@@ -193,52 +519,43 @@ class Game(BaseGame):
         #    bomb.update(self)
 
     def on_draw(self):
-
-        self._clear_screen()
-
-        self.map.draw(self, self.map_surface)
-        self.draw_surface.blit(self.map_surface, (0, 0))
-
-        for e in self.get_entities():
-            e.draw(self, self.draw_surface)
-
-        #for coin in self.get_entities('coins'):
-        #    coin.draw(self, self.draw_surface, milliseconds)
-
-        #for bomb in self.get_entities('bombs'):
-        #    bomb.draw(self, self.draw_surface, milliseconds)
-
-        #self._draw_monsters()
-        #self._draw_player()
-        self.player.draw(self, self.draw_surface)
-
-        #self._draw_fps()
-
-        self._update_screen()
-
-    def _clear_screen(self):
-        self.screen.fill((0, 0, 0))
-        self.draw_surface.fill((0, 0, 0))
-
-    def _update_screen(self):
+        updated_rects = self.renderer.draw(self)
+        if self.profiler.overlay:
+            rect = self.profiler.draw_overlay(self.screen)
+            if updated_rects is not None:
+                updated_rects.append(rect)
+        return updated_rects
+
+    def get_screen_offset(self):
+        """
+        Position of the map on the screen: centered if the map is smaller
+        than the screen, otherwise following the player
+        """
         offset = [0, 0]
         for i in (0, 1):
             if self.map_size_in_pixels[i] <= self.screen_size[i]:
                 offset[i] = (self.screen_size[i] - self.map_size_in_pixels[i]) / 2
             else:
-                player_offset = round(self.cell_size[i] * (self.player.location[i] + self.player.offset[i]))
+                player_offset = int(round(self.cell_size[i] * (self.player.location.c[i] + 0.5)))
                 offset[i] = self.screen_size[i] / 2 - player_offset
                 if offset[i] > 0:
                     offset[i] = 0
                 elif offset[i] < self.screen_size[i] - self.map_size_in_pixels[i]:
                     offset[i] = self.screen_size[i] - self.map_size_in_pixels[i]
-        self.screen.blit(self.draw_surface, offset)
+        return tuple(offset)
+
+    def on_stopped(self):
+        self.map.close()
 
     def on_keydown(self, key):
         if key == pygame.K_ESCAPE:
             self.stop()
         if key == pygame.K_PAUSE:
             self.toggle_pause()
+        if key == pygame.K_F3:
+            self.profiler.toggle_overlay()
+            if not self.profiler.overlay:
+                self.renderer.invalidate()
 
     def pause(self):
         self._paused = True
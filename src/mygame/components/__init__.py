@@ -1,6 +1,6 @@
-import math
 from mygame.messages import Message
-from mygame.types import direction, damage
+from mygame.systems import explosion
+from mygame.types import direction, damage, state
 
 class Component(object):
 
@@ -30,7 +30,7 @@ class HealthComponent(Component):
             self.health -= message.damage
 
         if self.health <= 0.0:
-            entity.destroyed = True
+            entity.destroy(game)
 
 
 class ExplosionComponent(Component):
@@ -60,51 +60,31 @@ class ExplosionComponent(Component):
         if self.time is not None:
             fract_time = 2 * self.time - int(2 * self.time)
             if fract_time < 0.3:
-                entity.set_state('flashing')
+                entity.set_state_flags(state.FLASHING)
             else:
-                entity.unset_state('flashing')
+                entity.unset_state_flags(state.FLASHING)
 
         # Check is should explode
         if self.time is not None and self.time <= 0:
+            self.explode(game, entity)
 
-            # Prepare lists of entites for each affected cells
-            entities = {}
-            for e in game.get_entities():
-                coord = e.location.cr
-                if not entities.has_key(coord):
-                    entities[coord] = []
-                entities[coord].append(e)
-
-            # Do some serious damage
-            for coord, damage_amount in self._get_damaged_cells(entity.location.c):
-                cell = game.map(coord)
-                if cell:
-
-                    # Damage map
-                    cell.hit(damage_amount, damage.BOMB)
-
-                    # Damage entities
-                    for e in entities.get(coord, []):
-                        e.send_message(game, Message.DAMAGE, damage=damage_amount)
-
-            entity.destroyed = True
+    def explode(self, game, entity):
+        """
+        Damage is done by the game's ExplosionSystem together with all other
+        explosions of this tick, including the chain reaction
+        """
+        if entity.destroyed:
+            return
+        game.explosion_system.detonate(entity.location.c, self.power)
+        entity.destroy(game)
 
     def _get_explosion_radius(self):
-        return (8 * self.power) ** 0.5
+        return explosion.get_radius(self.power)
 
     def _get_damaged_cells(self, coord):
-
-        r = self._get_explosion_radius()
-        ri = int(math.ceil(r))
-
-        for dx in xrange(-ri, ri + 1):
-            for dy in xrange(-ri, ri + 1):
-                d = math.sqrt(dx ** 2 + dy ** 2)
-                if d <= r:
-                    x = coord[0] + dx
-                    y = coord[1] + dy
-                    damage_amount = self.power * (1 - (d / r) ** 2)
-                    yield ((x, y), damage_amount)
+        dx, dy, damage_amount = explosion.get_kernel(self.power)
+        for x, y, d in zip(dx.tolist(), dy.tolist(), damage_amount.tolist()):
+            yield ((coord[0] + x, coord[1] + y), d)
 
 
 class MiningComponent(Component):
@@ -114,7 +94,7 @@ class MiningComponent(Component):
 
     def update(self, game, entity):
 
-        if not entity.has_state('colliding'):
+        if not entity.has_state_flags(state.COLLIDING):
             return
 
         damage_amount = self.power * game.seconds
@@ -127,11 +107,16 @@ class MiningComponent(Component):
 class CollectableComponent(Component):
 
     def on_collect(self, game, entity, message):
-        entity.destroyed = True
+        entity.destroy(game)
 
 
 class CollectorComponent(Component):
 
+    def __init__(self):
+        self.collected = 0  # Number of collected entities
+
     def on_change_location(self, game, entity, message):
         for e in game.get_entities(coord=message.coord):
             e.send_message(game, Message.COLLECT, collector=entity)
+            if e.destroyed and e(Component.COLLECTABLE) is not None:
+                self.collected += 1
@@ -1,9 +1,11 @@
 import random
 import math
+import heapq
 import pygame
-from mygame.types import direction
+from mygame.types import direction, state
 from mygame.components import Component
 from mygame.map import Cell
+from mygame.map.pathfinding import IncrementalPlanner
 
 class BehaviorComponent(Component):
     pass
@@ -17,19 +19,17 @@ class HumanPlayerInputComponent(BehaviorComponent):
 
     def update(self, game, entity):
 
-        entity.location.direction = self._get_movement_direction(entity.location)
+        entity.location.direction = self._get_movement_direction(game)
 
         self._time_since_last_bomb += game.seconds
-        if self._is_planting_bomb() and self._min_time_between_bombs < self._time_since_last_bomb:
-            from mygame import factory
-            bomb = factory.create_bomb(entity.location.cs)
-            game.entities['bombs'].append(bomb)
+        if self._is_planting_bomb(game) and self._min_time_between_bombs < self._time_since_last_bomb:
+            game.spawn_entity('bombs', entity.location.cs)
             self._time_since_last_bomb = 0.0
 
-    def _get_movement_direction(self, location):
+    def _get_movement_direction(self, game):
 
         # Check, which player control keys are pressed
-        keys = pygame.key.get_pressed()
+        keys = game.get_pressed_keys()
         key_left  = keys[pygame.K_LEFT]
         key_right = keys[pygame.K_RIGHT]
         key_up    = keys[pygame.K_UP]
@@ -50,8 +50,8 @@ class HumanPlayerInputComponent(BehaviorComponent):
 
         return direction.NONE
 
-    def _is_planting_bomb(self):
-        return pygame.key.get_pressed()[pygame.K_SPACE]
+    def _is_planting_bomb(self, game):
+        return game.get_pressed_keys()[pygame.K_SPACE]
 
 
 class RandomMovementComponent(BehaviorComponent):
@@ -105,6 +105,12 @@ class RandomMovementComponent(BehaviorComponent):
 
 class FollowTargetAIComponent(BehaviorComponent):
 
+    def __init__(self, max_nodes=None, incremental=False):
+        self.max_nodes = max_nodes      # Maximum nodes to expand per search; None means no limit
+        self.nodes_expanded = 0         # Number of nodes expanded by the last search
+        self.incremental = incremental  # Keep the search between steps, see IncrementalPlanner
+        self._planner = None
+
     def update(self, game, entity):
         entity.location.direction = self._get_movement_direction(game, entity)
 
@@ -127,89 +133,121 @@ class FollowTargetAIComponent(BehaviorComponent):
             # Target reached!
             return direction.NONE
 
-        new_direction = direction.NONE
+        return self._get_path_direction(game, entity, target)
 
-        game_map = game.map
+    def _get_path_direction(self, game, entity, target):
 
-        # List item: coord: (parent_coord, G, H)
-        open_list = {entity.location.cs: (None, 0, self._get_distance_to_target(entity.location.cs, target))}
-        closed_list = {}
+        if self.incremental:
+            planner = self._get_planner(game)
+            next_coord = planner.get_next_step(entity.location.cs, target.location.cs)
+            self.nodes_expanded = planner.expansions
+            if next_coord is None:
+                return direction.NONE
+            return self._get_direction_to_cell(entity, next_coord)
 
-        while True:
+        if game.pathfinder is not None:
+            next_coord = game.pathfinder.get_next_step(entity.location.cs, target.location.cs)
+            if next_coord is None:
+                return direction.NONE
+            return self._get_direction_to_cell(entity, next_coord)
 
-            if not open_list:
-                # Can't find the path: don't move anymore
-                break
+        game_map = game.map
 
-            # Find "best" cell in the open list, i.e. cell with the shortest
-            # predicted path to the target
-            best_cell_coord = self._get_best_cell(open_list)
+        start_coord = entity.location.cs
+        target_coord = target.location.cs
+        start_h = self._get_distance_to_target(start_coord, target)
 
-            # Remove "best" cell from the open list and add to the closed list
-            best_cell = open_list.pop(best_cell_coord)
-            closed_list[best_cell_coord] = best_cell
+        # Heap item: (F, H, counter, coord); equal F is broken by H, i.e. cells
+        # closer to the target go first, and then by insertion order
+        open_heap = [(start_h, start_h, 0, start_coord)]
+        counter = 1
 
-            # Check if we've reachet the target
-            if best_cell_coord == target.location.cs:
-                new_direction = self._get_direction_to_target(entity, closed_list, best_cell_coord)
-                break
+        # coord: parent_coord / G
+        parents = {start_coord: None}
+        costs = {start_coord: 0}
+        closed_list = set()
 
-            # Find cells adjacent to the "best" cell
-            adjacent_cells = game_map.get_adjacent_cells(best_cell_coord, Cell.FLOOR)
+        # Closest cell to the target found so far, used when the target can't
+        # be reached
+        best_coord = start_coord
+        best_h = start_h
 
-            # Add these adjacent cells to the open list, but only if they
-            # are not present in the closed list
-            for cell in adjacent_cells:
-                if not closed_list.has_key(cell.coord):
+        self.nodes_expanded = 0
 
-                    # Distance from our position to the current cell
-                    g = best_cell[1] + 1
+        while open_heap:
 
-                    if not open_list.has_key(cell.coord):
+            # Take the "best" cell, i.e. cell with the shortest predicted path
+            # to the target
+            _, h, _, coord = heapq.heappop(open_heap)
 
-                        # Add new cell to the open list
-                        h = self._get_distance_to_target(cell.coord, target)
-                        open_list[cell.coord] = (best_cell_coord, g, h)
+            # Cell has already been reached by a shorter route
+            if coord in closed_list:
+                continue
 
-                    elif g < open_list[cell.coord][1]:
+            closed_list.add(coord)
+            self.nodes_expanded += 1
 
-                        # This cell already exists in the open list, but we've found a better route
-                        open_list[cell.coord] = (best_cell_coord, g, open_list[cell.coord][2])
+            # Check if we've reached the target
+            if coord == target_coord:
+                return self._get_direction_to_target(entity, parents, coord)
 
-        return new_direction
+            if h < best_h:
+                best_coord = coord
+                best_h = h
+
+            if self.max_nodes is not None and self.max_nodes <= self.nodes_expanded:
+                break
+
+            # Distance from our position to adjacent cells
+            g = costs[coord] + 1
+
+            # Add adjacent cells to the open list, but only if they are not
+            # closed yet and we've found a better route to them
+            for cell in game_map.get_adjacent_cells(coord, Cell.FLOOR):
+                if cell.coord in closed_list:
+                    continue
+                if cell.coord not in costs or g < costs[cell.coord]:
+                    costs[cell.coord] = g
+                    parents[cell.coord] = coord
+                    h = self._get_distance_to_target(cell.coord, target)
+                    heapq.heappush(open_heap, (g + h, h, counter, cell.coord))
+                    counter += 1
+
+        # Can't find the full path: move towards the closest cell we've found
+        return self._get_direction_to_target(entity, parents, best_coord)
+
+    def _get_planner(self, game):
+
+        # Every entity keeps its own search, the planner is created on the
+        # first step and again for a new map
+        if self._planner is None or self._planner.passability_log is not game.passability_log:
+            if self.max_nodes is None:
+                self._planner = IncrementalPlanner(game.map, game.passability_log)
+            else:
+                self._planner = IncrementalPlanner(game.map, game.passability_log,
+                                                   max_expansions=self.max_nodes)
+        return self._planner
 
     def _get_distance_to_target(self, coord, target):
         return abs(coord[0] - target.location.xs) + abs(coord[1] - target.location.ys)
 
-    def _get_best_cell(self, cells):
-        best_cell_coord = None
-        best_cost = None
-        for coord, (_, g, h) in cells.items():
-            f = g + h
-            if best_cost is None or f < best_cost:
-                best_cost = f
-                best_cell_coord = coord
-        return best_cell_coord
-
-    def _get_direction_to_target(self, entity, cells, target_coord):
+    def _get_direction_to_target(self, entity, parents, target_coord):
 
         # Build backwards path from target to us
-        cell = cells[target_coord]
         path = [target_coord]
         while True:
-            parent_coord = cell[0]
+            parent_coord = parents[path[-1]]
             if parent_coord is None:
                 break
             path.append(parent_coord)
-            cell = cells[parent_coord]
 
         if len(path) <= 1:
             return direction.NONE
 
         # -1 is our location, -2 is the next cell
-        next_cell_coord = path[-2]
+        return self._get_direction_to_cell(entity, path[-2])
 
-        # Calculate direction
+    def _get_direction_to_cell(self, entity, next_cell_coord):
         dx = next_cell_coord[0] - entity.location.xs
         dy = next_cell_coord[1] - entity.location.ys
         if dx < 0:
@@ -224,9 +262,32 @@ class FollowTargetAIComponent(BehaviorComponent):
             return direction.NONE
 
 
+class FlowFieldFollowAIComponent(FollowTargetAIComponent):
+    """
+    Follows the player using the flow field shared by all such entities;
+    falls back to the path search when the entity is outside the field
+    """
+
+    def _get_path_direction(self, game, entity, target):
+
+        if target is not game.player:
+            return super(FlowFieldFollowAIComponent, self)._get_path_direction(game, entity, target)
+
+        flow_field = game.player_flow_field
+
+        # Rebuilt only if the player has moved to another cell or the map has changed
+        flow_field.update(target.location.cs)
+
+        if not flow_field.has(entity.location.cs):
+            return super(FlowFieldFollowAIComponent, self)._get_path_direction(game, entity, target)
+
+        return flow_field.get_direction(entity.location.cs)
+
+
 class AgressiveAIComponent(BehaviorComponent):
 
-    def __init__(self, walk_distance=0, attack_distance=0, walk_speed=None, attack_speed=None):
+    def __init__(self, walk_distance=0, attack_distance=0, walk_speed=None, attack_speed=None,
+                 max_search_nodes=None, use_flow_field=False, incremental_path_search=False):
 
         self.walk_distance = walk_distance
         self.attack_distance = attack_distance
@@ -236,7 +297,12 @@ class AgressiveAIComponent(BehaviorComponent):
 
         self.is_following = False
 
-        self._follow_target_behavior = FollowTargetAIComponent()
+        if use_flow_field:
+            follow_class = FlowFieldFollowAIComponent
+        else:
+            follow_class = FollowTargetAIComponent
+        self._follow_target_behavior = follow_class(max_nodes=max_search_nodes,
+                                                    incremental=incremental_path_search)
         self._random_movement_behavior = RandomMovementComponent()
 
     def update(self, game, entity):
@@ -258,7 +324,7 @@ class AgressiveAIComponent(BehaviorComponent):
             self.is_following = True
             if self.attack_speed is not None:
                 entity.location.speed = self.attack_speed
-            entity.set_state('chasing')
+            entity.set_state_flags(state.CHASING)
 
         elif self.is_following and self.walk_distance <= distance:
 
@@ -266,7 +332,7 @@ class AgressiveAIComponent(BehaviorComponent):
             self.is_following = False
             if self.walk_speed is not None:
                 entity.location.speed = self.walk_speed
-            entity.unset_state('chasing')
+            entity.unset_state_flags(state.CHASING)
 
         if self.is_following:
             self._follow_target_behavior.update(game, entity)
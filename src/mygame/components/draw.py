@@ -1,6 +1,10 @@
 import pygame
 
 from mygame.components import Component
+from mygame.types import state
+
+# Pre-rendered sprites, (shape, size, color, cell_size): surface
+sprite_cache = {}
 
 
 class DrawComponent(Component):
@@ -9,14 +13,53 @@ class DrawComponent(Component):
         self.color = color
         self.color_by_state = color_by_state
 
+    @property
+    def color_by_state(self):
+        return self._color_by_state
+
+    @color_by_state.setter
+    def color_by_state(self, color_by_state):
+        self._color_by_state = color_by_state
+        # Same colors by state flags, in the same order
+        self._color_by_flag = [(state.get_flag(name), color)
+                               for name, color in color_by_state.items()]
+
     def get_color(self, entity):
-        for state in self.color_by_state:
-            if entity.has_state(state):
-                return self.color_by_state[state]
+        state_mask = entity.state_mask
+        for flag, color in self._color_by_flag:
+            if state_mask & flag:
+                return color
         return self.color
 
+    def get_rect(self, game, entity):
+        """
+        Area of the surface covered by the entity, in pixels
+        """
+        return pygame.rect.Rect(0, 0, 0, 0)
+
+    def get_sprite(self, game, entity):
+        """
+        Returns (surface, position) pair ready to be blitted, surfaces are
+        rendered once for every look and shared by all entities
+        """
+
+        color = self.get_color(entity)
+
+        key = (self.__class__, self.size, color, game.cell_size)
+        sprite = sprite_cache.get(key)
+        if sprite is None:
+            sprite = sprite_cache[key] = self._render_sprite(game.cell_size, color)
+
+        return sprite, self._get_position(game, entity)
+
+    def _get_position(self, game, entity):
+        return self.get_rect(game, entity).topleft
+
+    def _render_sprite(self, cell_size, color):
+        raise NotImplementedError
+
     def draw(self, game, surface, entity):
-        pass
+        surface.blit(*self.get_sprite(game, entity))
 
 
 class DrawCircleComponent(DrawComponent):
@@ -25,13 +68,27 @@ class DrawCircleComponent(DrawComponent):
         super(DrawCircleComponent, self).__init__(color, color_by_state)
         self.size = size
 
-    def draw(self, game, surface, entity):
+    def _get_radius(self, cell_size):
+        return int(self.size * (cell_size[0] + cell_size[1]) / 4)
 
-        x = int(game.cell_size[0] * (entity.location.x + 0.5))
-        y = int(game.cell_size[1] * (entity.location.y + 0.5))
-        r = int(self.size * (game.cell_size[0] + game.cell_size[1]) / 4)
+    def _get_position(self, game, entity):
+        cw, ch = game.cell_size
+        r = self._get_radius(game.cell_size)
+        return (int(cw * (entity.location.x + 0.5)) - r,
+                int(ch * (entity.location.y + 0.5)) - r)
 
-        pygame.draw.circle(surface, self.get_color(entity), (x, y), r)
+    def get_rect(self, game, entity):
+        r = self._get_radius(game.cell_size)
+        return pygame.rect.Rect(self._get_position(game, entity), (2 * r + 1, 2 * r + 1))
+
+    def _render_sprite(self, cell_size, color):
+        r = self._get_radius(cell_size)
+        sprite = pygame.Surface((2 * r + 1, 2 * r + 1))
+        colorkey = (0, 0, 0) if tuple(color) != (0, 0, 0) else (255, 255, 255)
+        sprite.fill(colorkey)
+        sprite.set_colorkey(colorkey, pygame.RLEACCEL)
+        pygame.draw.circle(sprite, color, (r, r), r)
+        return sprite
 
 
 class DrawRectangleComponent(DrawComponent):
@@ -40,7 +97,7 @@ class DrawRectangleComponent(DrawComponent):
         super(DrawRectangleComponent, self).__init__(color, color_by_state)
         self.size = size
 
-    def draw(self, game, surface, entity):
+    def get_rect(self, game, entity):
 
         cw, ch = game.cell_size
 
@@ -49,5 +106,9 @@ class DrawRectangleComponent(DrawComponent):
         w = int(cw * self.size)
         h = int(ch * self.size)
 
-        rect = pygame.rect.Rect(x, y, w, h)
-        pygame.draw.rect(surface, self.get_color(entity), rect)
+        return pygame.rect.Rect(x, y, w, h)
+
+    def _render_sprite(self, cell_size, color):
+        sprite = pygame.Surface((int(cell_size[0] * self.size), int(cell_size[1] * self.size)))
+        sprite.fill(color)
+        return sprite
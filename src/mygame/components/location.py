@@ -1,5 +1,5 @@
 import math
-from mygame.types import direction
+from mygame.types import direction, state
 from mygame.components import Component
 from mygame.messages import Message
 
@@ -195,11 +195,85 @@ class MovingLocationComponent(LocationComponent):
             self._direction = self._next_direction
 
         if self._direction != direction.NONE:
-            entity.set_state('moving')
+            entity.set_state_flags(state.MOVING)
         else:
-            entity.unset_state('moving')
+            entity.unset_state_flags(state.MOVING)
 
         if is_colliding and self._direction != direction.NONE:
-            entity.set_state('colliding')
+            entity.set_state_flags(state.COLLIDING)
         else:
-            entity.unset_state('colliding')
+            entity.unset_state_flags(state.COLLIDING)
+
+
+class ArrayMovingLocationComponent(MovingLocationComponent):
+    """
+    Moving location, which keeps its data in a MovementSystem; the entity is
+    moved by the system together with all other entities, not by update()
+    """
+
+    def __init__(self, movement_system, coord=(0.0, 0.0), speed=0.0, direction_=direction.NONE):
+        self._system = movement_system
+        self._slot = movement_system.add(coord, speed, direction_)
+
+    def attach(self, entity):
+        """
+        Start moving the entity, the system has to know it to notify it about
+        new locations
+        """
+        self._system.attach(self._slot, entity)
+
+    # == Storage ==
+
+    @property
+    def _x(self):
+        return float(self._system.x[self._slot])
+
+    @_x.setter
+    def _x(self, x):
+        self._system.x[self._slot] = x
+
+    @property
+    def _y(self):
+        return float(self._system.y[self._slot])
+
+    @_y.setter
+    def _y(self, y):
+        self._system.y[self._slot] = y
+
+    @property
+    def speed(self):
+        return float(self._system.speed[self._slot])
+
+    @speed.setter
+    def speed(self, speed):
+        self._system.speed[self._slot] = speed
+
+    @property
+    def _direction(self):
+        return int(self._system.direction[self._slot])
+
+    @_direction.setter
+    def _direction(self, direction_):
+        self._system.direction[self._slot] = direction_
+
+    @property
+    def _next_direction(self):
+        return int(self._system.next_direction[self._slot])
+
+    @_next_direction.setter
+    def _next_direction(self, direction_):
+        self._system.next_direction[self._slot] = direction_
+
+    # == Movement ==
+
+    # Not updated one by one, so entities don't even call update()
+    update = Component.update
+
+    def on_destroy(self, game, entity, message):
+        # Keep the last location in a private system, so the slot can be reused
+        system = self._system.__class__(capacity=1)
+        slot = system.add((self._x, self._y), self.speed, self._direction)
+        system.next_direction[slot] = self._next_direction
+        self._system.remove(self._slot)
+        self._system = system
+        self._slot = slot
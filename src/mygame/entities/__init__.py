@@ -1,35 +1,54 @@
 from mygame.messages import Message
 from mygame.components import Component
 from mygame.components.draw import DrawComponent
+from mygame.types import state
 
 
 class Entity(object):
 
-    def __init__(self, components={}, properties={}, states=set()):
-        self.components = components
-        self.properties = properties
-        self.states = states
-        self.destroyed = False
+    __slots__ = (
+        'components',
+        '_properties',
+        'state_mask',
+        '_destroyed',
+        '_component_list',
+        '_component_table',
+    )
+
+    def __init__(self, components=None, properties=None, states=None):
+        self.components = components if components is not None else {}
+        self._properties = dict(properties) if properties else None
+        self.state_mask = state.get_mask(states) if states else 0
+        self._destroyed = False
+        self._compile_components()
 
     # == Properties ==
 
+    @property
+    def properties(self):
+        if self._properties is None:
+            self._properties = {}
+        return self._properties
+
     def set_property(self, name, value):
         self.properties[name] = value
 
     def unset_property(self, name):
         try:
-            del self.properties[name]
-        except KeyError:
+            del self._properties[name]
+        except (KeyError, TypeError):
             pass
 
     def get_property(self, name, default=None):
-        return self.properties.get(name, default)
+        if self._properties is None:
+            return default
+        return self._properties.get(name, default)
 
     def has_property(self, name):
-        return self.properties.has_key(name)
+        return self._properties is not None and name in self._properties
 
     def clear_properties(self):
-        self.properties = {}
+        self._properties = None
 
     # == Special properties ==
 
@@ -41,19 +60,44 @@ class Entity(object):
     def destroyed(self, value):
         self._destroyed = bool(value)
 
+    def destroy(self, game):
+        if self._destroyed:
+            return
+        self._destroyed = True
+        self.send_message(game, Message.DESTROY)
+
     # == States ==
 
+    @property
+    def states(self):
+        return state.get_names(self.state_mask)
+
+    @states.setter
+    def states(self, names):
+        self.state_mask = state.get_mask(names)
+
     def set_state(self, *names):
-        self.states = self.states.union(names)
+        for name in names:
+            self.state_mask |= state.get_flag(name)
 
     def unset_state(self, *names):
-        self.states = self.states.difference(names)
+        for name in names:
+            self.state_mask &= ~state.get_flag(name)
 
     def has_state(self, name):
-        return name in self.states
+        return self.state_mask & state.get_flag(name) != 0
+
+    def set_state_flags(self, mask):
+        self.state_mask |= mask
+
+    def unset_state_flags(self, mask):
+        self.state_mask &= ~mask
+
+    def has_state_flags(self, mask):
+        return self.state_mask & mask == mask
 
     def clear_states(self):
-        self.states = set()
+        self.state_mask = 0
 
     # == Components ==
 
@@ -71,6 +115,27 @@ class Entity(object):
     #def drawer(self):
     #    return self(Component.DRAW)
 
+    def add_component(self, name, component):
+        self.components[name] = component
+        self._compile_components()
+
+    def remove_component(self, name):
+        try:
+            del self.components[name]
+        except KeyError:
+            return
+        self._compile_components()
+
+    def _compile_components(self):
+        """
+        Look up the component table, which lists components and message
+        handlers actually used, so updating, drawing and messaging don't
+        have to search for them every time; must be called whenever the
+        components change
+        """
+        self._component_list = self.components.values()
+        self._component_table = ComponentTable.get(self._component_list)
+
     # == Messages ==
 
     def send_message(self, game, message, **kwargs):
@@ -78,20 +143,21 @@ class Entity(object):
         if not isinstance(message, Message):
             message = Message(str(message), **kwargs)
 
-        results = {}
+        components = self._component_list
+        table = self._component_table
+        handlers = table.message_handlers.get(message.type, table.default_message_handlers)
+        for i, message_handler in handlers:
+            message_handler(components[i], game, self, message)
 
-        for component_name, component in self.components.items():
+        # Let the game keep track of entities
+        game.on_entity_message(self, message)
 
-            method_name = 'on_' + message.type
-
-            if hasattr(component, method_name):
-                message_handler = getattr(component, method_name)
-            else:
-                message_handler = component.receive_message
-            result = message_handler(game, self, message)
-
-            if result is not None:
-                results[component_name] = result
+    def handles_message(self, message_type):
+        """
+        Returns True if some component handles messages of the type
+        """
+        table = self._component_table
+        return bool(table.message_handlers.get(message_type, table.default_message_handlers))
 
     # == Update ==
 
@@ -99,8 +165,22 @@ class Entity(object):
         self.update_components(game)
 
     def update_components(self, game):
-        for component in self.components.values():
+        components = self._component_list
+        for i in self._component_table.updated_components:
+            components[i].update(game, self)
+
+    def profile_update(self, game, profiler):
+        """
+        Same as update(), but time of every component is added to the
+        profiler section of its class
+        """
+        components = self._component_list
+        timer = profiler.timer
+        for i in self._component_table.updated_components:
+            component = components[i]
+            start = timer()
             component.update(game, self)
+            profiler.add(self._component_table.section_names[i], timer() - start)
 
     # == Draw ==
 
@@ -108,8 +188,89 @@ class Entity(object):
         self.draw_components(game, surface)
 
     def draw_components(self, game, surface):
-        for component in self.components.values():
-            if isinstance(component, DrawComponent):
-                component.draw(game, surface, self)
+        components = self._component_list
+        for i in self._component_table.draw_components:
+            components[i].draw(game, surface, self)
+
+    def get_sprites(self, game):
+        """
+        Returns [(surface, position), ...] of all drawing components, ready
+        to be passed to Surface.blits()
+        """
+        components = self._component_list
+        return [components[i].get_sprite(game, self)
+                for i in self._component_table.draw_components]
+
+    def get_appearance(self, game):
+        """
+        Returns ((rect, color), ...) of all drawing components; entity looks
+        the same as long as its appearance doesn't change
+        """
+        components = self._component_list
+        return tuple((components[i].get_rect(game, self), components[i].get_color(self))
+                     for i in self._component_table.draw_components)
 
     # == == ==
+
+
+class ComponentTable(object):
+    """
+    Components and message handlers, which are actually used by entities
+    with the same component classes (in the same order); tables are shared
+    by all such entities, components are referenced by their index
+    """
+
+    # (component_class, ...): ComponentTable
+    _tables = {}
+
+    @classmethod
+    def get(cls, components):
+        key = tuple(type(c) for c in components)
+        try:
+            return cls._tables[key]
+        except KeyError:
+            table = cls._tables[key] = cls(key)
+            return table
+
+    def __init__(self, classes):
+
+        # Indices of components, which implement update()
+        self.updated_components = [i for i, c in enumerate(classes)
+                                     if self._get_function(c, 'update') is not
+                                        self._get_function(Component, 'update')]
+
+        # Profiler sections of components by index, see Entity.profile_update()
+        self.section_names = ['update/entities/' + c.__name__ for c in classes]
+
+        # Indices of drawing components
+        self.draw_components = [i for i, c in enumerate(classes) if issubclass(c, DrawComponent)]
+
+        # Indices of components, which handle any message with receive_message()
+        receivers = set(i for i, c in enumerate(classes)
+                          if self._get_function(c, 'receive_message') is not
+                             self._get_function(Component, 'receive_message'))
+
+        # message_type: [(index, handler), ...], message handlers are called
+        # in the order of components
+        message_types = set(name[3:] for c in classes
+                                     for name in dir(c)
+                                     if name.startswith('on_'))
+        self.message_handlers = {}
+        for message_type in message_types:
+            method_name = 'on_' + message_type
+            handlers = []
+            for i, c in enumerate(classes):
+                if hasattr(c, method_name):
+                    handlers.append((i, self._get_function(c, method_name)))
+                elif i in receivers:
+                    handlers.append((i, self._get_function(c, 'receive_message')))
+            self.message_handlers[message_type] = handlers
+
+        # Handlers of all other messages
+        self.default_message_handlers = [(i, self._get_function(c, 'receive_message'))
+                                         for i, c in enumerate(classes) if i in receivers]
+
+    @staticmethod
+    def _get_function(cls, name):
+        method = getattr(cls, name)
+        return getattr(method, '__func__', method)
@@ -0,0 +1,69 @@
+class EntityIndex(object):
+    """
+    Entities grouped by the map cell they are in
+
+    Moving entities are keyed by their source cell (location.cs), i.e. they
+    move to the next cell when they've reached it.
+    """
+
+    def __init__(self):
+
+        # coord: [entity, ...]
+        self._cells = {}
+
+        # entity: (entity_type, coord)
+        self._entities = {}
+
+    def __len__(self):
+        return len(self._entities)
+
+    def __contains__(self, entity):
+        return entity in self._entities
+
+    def add(self, entity, entity_type=None):
+        if entity in self._entities or entity.location is None:
+            return
+        coord = entity.location.cs
+        self._entities[entity] = (entity_type, coord)
+        self._cells.setdefault(coord, []).append(entity)
+
+    def remove(self, entity):
+        try:
+            _, coord = self._entities.pop(entity)
+        except KeyError:
+            return
+        self._remove_from_cell(entity, coord)
+
+    def move(self, entity, new_coord):
+        try:
+            entity_type, coord = self._entities[entity]
+        except KeyError:
+            return
+        if coord == new_coord:
+            return
+        self._remove_from_cell(entity, coord)
+        self._entities[entity] = (entity_type, new_coord)
+        self._cells.setdefault(new_coord, []).append(entity)
+
+    def get(self, coord, types=None):
+        entities = self._cells.get(coord)
+        if not entities:
+            return []
+        if types is None:
+            return list(entities)
+        return [e for e in entities if self._entities[e][0] in types]
+
+    def get_type(self, entity):
+        return self._entities[entity][0]
+
+    def get_coords(self):
+        """
+        Returns list of coordinates of all cells with some entities
+        """
+        return self._cells.keys()
+
+    def _remove_from_cell(self, entity, coord):
+        entities = self._cells[coord]
+        entities.remove(entity)
+        if not entities:
+            del self._cells[coord]
@@ -0,0 +1,48 @@
+class EntityPool(object):
+    """
+    Destroyed entities kept for reuse, so short-lived entities like bombs
+    don't have to be built from scratch every time
+
+        pool = EntityPool(factory.create_bomb, factory.reset_bomb)
+        bomb = pool.acquire(coord)
+        ...
+        pool.release(bomb)  # After the bomb has been destroyed
+    """
+
+    def __init__(self, create, reset, max_size=256):
+        """
+        create    Function, which takes coord and returns a new entity
+        reset     Function, which takes an entity and coord and makes the
+                  entity as good as new
+        max_size  Maximum number of kept entities, the rest are dropped
+        """
+        self.create = create
+        self.reset = reset
+        self.max_size = max_size
+
+        # Released entities, [entity, ...]
+        self._free = []
+
+        # Metrics
+        self.created = 0
+        self.reused = 0
+
+    def __len__(self):
+        return len(self._free)
+
+    def acquire(self, coord=None):
+        if self._free:
+            entity = self._free.pop()
+            self.reset(entity, coord)
+            self.reused += 1
+        else:
+            entity = self.create(coord)
+            self.created += 1
+        return entity
+
+    def release(self, entity):
+        if len(self._free) < self.max_size:
+            self._free.append(entity)
+
+    def clear(self):
+        self._free = []
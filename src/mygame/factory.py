@@ -7,6 +7,10 @@ import components.behavior
 from components import Component
 from entities import Entity
 
+# Bomb explosion power and timer in seconds
+BOMB_POWER = 2.0
+BOMB_TIME = 3.0
+
 def create_coin(coord=None):
     return Entity(components=OrderedDict([
         (Component.LOCATION, components.location.StaticLocationComponent(
@@ -30,8 +34,8 @@ def create_bomb(coord=None):
             coord=coord
         )),
         (Component.EXPLOSION, components.ExplosionComponent(
-            power=2.0,
-            time=3.0
+            power=BOMB_POWER,
+            time=BOMB_TIME
         )),
         (Component.DRAW, components.draw.DrawCircleComponent(
             size=0.8,
@@ -42,6 +46,19 @@ def create_bomb(coord=None):
         )),
     ]))
 
+def reset_bomb(bomb, coord=None):
+    """
+    Make a destroyed bomb as good as new, see EntityPool
+    """
+    bomb.destroyed = False
+    bomb.clear_states()
+    bomb.clear_properties()
+    bomb.location.c = coord
+    explosion = bomb(Component.EXPLOSION)
+    explosion.power = BOMB_POWER
+    explosion.time = BOMB_TIME
+    return bomb
+
 def create_player(coord=None):
     return Entity(components=OrderedDict([
         (Component.BEHAVIOR, components.behavior.HumanPlayerInputComponent()),
@@ -61,18 +78,40 @@ def create_player(coord=None):
         )),
     ]))
 
-def create_monster(coord=None):
-    return Entity(components=OrderedDict([
-        (Component.BEHAVIOR, components.behavior.AgressiveAIComponent(
-            walk_distance=15,
-            attack_distance=10,
-            walk_speed=3,
-            attack_speed=5
-        )),
-        (Component.LOCATION, components.location.MovingLocationComponent(
+# AgressiveAIComponent arguments of monsters
+MONSTER_AI = dict(
+    walk_distance=15,
+    attack_distance=10,
+    walk_speed=3,
+    attack_speed=5,
+    max_search_nodes=1000,
+    use_flow_field=True
+)
+
+def create_monster(coord=None, movement_system=None, ai=None):
+    """
+    ai  AgressiveAIComponent arguments overriding MONSTER_AI
+    """
+
+    ai_arguments = dict(MONSTER_AI)
+    if ai:
+        ai_arguments.update(ai)
+
+    if movement_system is None:
+        location = components.location.MovingLocationComponent(
             coord=coord,
-            speed=3
-        )),
+            speed=ai_arguments['walk_speed']
+        )
+    else:
+        location = components.location.ArrayMovingLocationComponent(
+            movement_system,
+            coord=coord,
+            speed=ai_arguments['walk_speed']
+        )
+
+    monster = Entity(components=OrderedDict([
+        (Component.BEHAVIOR, components.behavior.AgressiveAIComponent(**ai_arguments)),
+        (Component.LOCATION, location),
         (Component.HEALTH, components.HealthComponent()),
         (Component.DRAW, components.draw.DrawRectangleComponent(
             size=0.8,
@@ -82,3 +121,8 @@ def create_monster(coord=None):
             ])
         )),
     ]))
+
+    if movement_system is not None:
+        location.attach(monster)
+
+    return monster
@@ -0,0 +1,50 @@
+class KeyState(object):
+    """
+    Set of pressed keys, which can be used in place of the result of
+    pygame.key.get_pressed(), i.e. keys[pygame.K_LEFT] is True if the key
+    is pressed
+    """
+
+    def __init__(self, keys=()):
+        self.keys = frozenset(keys)
+
+    def __getitem__(self, key):
+        return key in self.keys
+
+    def __iter__(self):
+        return iter(self.keys)
+
+    def __eq__(self, other):
+        return isinstance(other, KeyState) and self.keys == other.keys
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.keys)
+
+
+class ScriptedInput(object):
+    """
+    Keys pressed during a simulation, tick by tick
+
+    script  Either a function, which takes the tick number and returns
+            pressed keys, or a sequence of pressed keys for every tick;
+            no keys are pressed after the end of the sequence
+    """
+
+    def __init__(self, script=None):
+        self.script = script
+
+    def get_pressed(self, tick):
+
+        if self.script is None:
+            return KeyState()
+
+        if callable(self.script):
+            return KeyState(self.script(tick) or ())
+
+        if tick < len(self.script):
+            return KeyState(self.script[tick] or ())
+
+        return KeyState()
@@ -1,4 +1,5 @@
 import random
+import numpy
 import pygame
 from mygame.types import damage
 
@@ -23,7 +24,7 @@ class Cell(object):
 
     updated_cells = []
 
-    def __init__(self, coord, cell_type=FLOOR):
+    def __init__(self, coord, cell_type=FLOOR, map_=None):
         """
         cell_type (int)
             Visual representation of the cell, affects only rendering
@@ -40,8 +41,11 @@ class Cell(object):
             <0 - Destroyed
             0 - Not destroyed, but any damage will destroy it
             >0 - Not destroyed
+        map_ (Map)
+            Map which is notified about changes of the cell
         """
         self.coord = coord
+        self.map = map_
         self.type = cell_type
         self.passable = False
         self.durability = None
@@ -50,10 +54,13 @@ class Cell(object):
         self.redraw()
 
     def change_to(self, cell_type):
+        old_type = self.type
+        old_passable = self.passable
         self.type = cell_type
-        if not self.type_properties.has_key(cell_type):
-            return
-        self.passable, self.durability, self.health = self.type_properties[cell_type]
+        if self.type_properties.has_key(cell_type):
+            self.passable, self.durability, self.health = self.type_properties[cell_type]
+        if self.map is not None:
+            self.map.on_cell_change(self, old_type, old_passable)
 
     @property
     def x(self):
@@ -103,22 +110,77 @@ class Cell(object):
     def redraw(self):
         Cell.updated_cells.append(self)
 
-    def draw(self, game, surface):
-        rect = pygame.rect.Rect(self.x * game.cell_size[0],
+    def get_rect(self, game):
+        return pygame.rect.Rect(self.x * game.cell_size[0],
                                 self.y * game.cell_size[1],
                                 game.cell_size[0],
                                 game.cell_size[1])
-        pygame.draw.rect(surface, self.color, rect)
+
+    def draw(self, game, surface):
+        pygame.draw.rect(surface, self.color, self.get_rect(game))
+
+class CellSet(object):
+    """
+    Set of cells, which can pick a random cell in constant time; cells are
+    kept in a list, a removed cell is replaced by the last one
+    """
+
+    def __init__(self, cells=()):
+        self._cells = list(cells)
+
+        # cell: position in _cells
+        self._positions = dict((cell, i) for i, cell in enumerate(self._cells))
+
+    def __len__(self):
+        return len(self._cells)
+
+    def __iter__(self):
+        return iter(self._cells)
+
+    def __contains__(self, cell):
+        return cell in self._positions
+
+    def add(self, cell):
+        if cell not in self._positions:
+            self._positions[cell] = len(self._cells)
+            self._cells.append(cell)
+
+    def remove(self, cell):
+        i = self._positions.pop(cell)
+        last = self._cells.pop()
+        if last is not cell:
+            self._cells[i] = last
+            self._positions[last] = i
+
+    def get(self, i):
+        return self._cells[i]
+
+    def get_random(self):
+        return random.choice(self._cells)
+
 
 class Map(object):
 
+    # Functions called when cells become passable or impassable, see
+    # add_passability_listener()
+    _passability_listeners = ()
+
+    # cell type: CellSet of the cells of the type, updated by
+    # on_cell_change(); subclasses without Cell objects don't keep it
+    _cells_by_type = None
+
     def __init__(self, game, size, map_generator):
 
         self.game = game
         self.size = size
 
+        # Incremented every time any cell becomes passable or impassable
+        self.passability_version = 0
+
         # Generate empty map
-        self.cells = [[Cell((x, y)) for y in xrange(self.height)] for x in xrange(self.width)]
+        self._cells_by_type = {}
+        self.cells = [[Cell((x, y), map_=self) for y in xrange(self.height)] for x in xrange(self.width)]
+        self._cells_by_type[Cell.FLOOR] = CellSet(self.get_cells())
 
         # Generate random map
         map_generator.generate(self)
@@ -148,19 +210,57 @@ class Map(object):
             return False
 
     def get_cells(self, cell_types=None):
+        """
+        Cells of the given type or types, all cells by default; cells of a
+        type come in no particular order
+        """
         if cell_types is None:
-            cells = (self(x, y) for x in xrange(self.width)
-                                for y in xrange(self.height))
-        else:
-            if not hasattr(cell_types, '__iter__'):
-                cell_types = [cell_types]
-            cells = (self(x, y) for x in xrange(self.width)
-                                for y in xrange(self.height)
-                                if self(x, y).type in cell_types)
-        return cells
+            return (cell for column in self.cells for cell in column)
+        if not hasattr(cell_types, '__iter__'):
+            cell_types = [cell_types]
+        # Copied, so that cells can be changed while iterating
+        return iter([cell for cell_type in sorted(set(cell_types))
+                          for cell in self._cells_by_type.get(cell_type, ())])
+
+    def set_types(self, types):
+        """
+        Replace all cells with the given types, indexed by [x][y]
+        """
+        for x in xrange(self.width):
+            for y in xrange(self.height):
+                self.cells[x][y].change_to(int(types[x][y]))
+
+    def get_passable_mask(self):
+        """
+        Returns (width, height) bool array of passable cells
+        """
+        return numpy.array([[cell.passable for cell in column] for column in self.cells],
+                           dtype=numpy.bool_)
 
     def get_random_cell(self, cell_type=None):
-        return random.choice(list(self.get_cells(cell_type)))
+        """
+        Random cell of the given type or types, any cell by default
+        """
+
+        if self._cells_by_type is None:
+            return random.choice(list(self.get_cells(cell_type)))
+
+        if cell_type is None:
+            return self.cells[random.randrange(self.width)][random.randrange(self.height)]
+
+        if not hasattr(cell_type, '__iter__'):
+            return self._cells_by_type.get(cell_type, CellSet()).get_random()
+
+        # Pick a position among the cells of all the types
+        cell_sets = [self._cells_by_type[t] for t in sorted(set(cell_type)) if t in self._cells_by_type]
+        count = sum(len(cells) for cells in cell_sets)
+        if not count:
+            raise IndexError('No cells of types %s' % (cell_type,))
+        i = random.randrange(count)
+        for cells in cell_sets:
+            if i < len(cells):
+                return cells.get(i)
+            i -= len(cells)
 
     def get_adjacent_cells(self, coord, cell_type=None):
 
@@ -175,6 +275,57 @@ class Map(object):
 
         return adjacent_cells
 
+    def hit_cells(self, xs, ys, damages, damage_type=damage.DEFAULT):
+        """
+        Hit many cells at once, see Cell.hit(); takes arrays of coordinates,
+        which must be unique, and of damage amounts
+        """
+        for x, y, damage_amount in zip(xs.tolist(), ys.tolist(), damages.tolist()):
+            self.cells[x][y].hit(damage_amount, damage_type)
+
+    def update(self, game):
+        """
+        Called every tick, after all entities are updated
+        """
+        pass
+
+    def close(self):
+        """
+        Called when the game stops, releases files and other resources of
+        the map
+        """
+        pass
+
+    def add_passability_listener(self, listener):
+        """
+        Call the listener with coordinates of every cell, which becomes
+        passable or impassable, or with None when all cells are replaced
+        """
+        self._passability_listeners = self._passability_listeners + (listener,)
+
+    def on_cell_change(self, cell, old_type, old_passable):
+        if self._cells_by_type is not None and cell.type != old_type:
+            self._cells_by_type[old_type].remove(cell)
+            if cell.type not in self._cells_by_type:
+                self._cells_by_type[cell.type] = CellSet()
+            self._cells_by_type[cell.type].add(cell)
+        if cell.passable != old_passable:
+            self.passability_version += 1
+            for listener in self._passability_listeners:
+                listener(cell.coord)
+
+    def draw_area(self, game, surface, area):
+        """
+        Draw cells of the area (rect in cells) to the surface, the top left
+        cell of the area at (0, 0)
+        """
+        dx = -area.left * game.cell_size[0]
+        dy = -area.top * game.cell_size[1]
+        for x in xrange(area.left, area.right):
+            for y in xrange(area.top, area.bottom):
+                cell = self.cells[x][y]
+                pygame.draw.rect(surface, cell.color, cell.get_rect(game).move(dx, dy))
+
     def draw(self, game, surface):
         for cell in Cell.updated_cells:
             cell.draw(game, surface)
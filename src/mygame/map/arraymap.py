@@ -0,0 +1,255 @@
+import random
+import numpy
+import pygame
+from mygame.map import Cell, Map
+from mygame.types import damage
+
+
+def get_type_tables():
+    """
+    Returns lookup tables of passability, durability (-1 means None) and
+    health of cell types, indexed by cell type
+    """
+
+    max_type = max(Cell.type_properties)
+    type_passable = numpy.zeros(max_type + 1, dtype=numpy.bool_)
+    type_durability = numpy.full(max_type + 1, -1, dtype=numpy.int8)
+    type_health = numpy.zeros(max_type + 1, dtype=numpy.float32)
+    for cell_type, (passable, durability, health) in Cell.type_properties.items():
+        type_passable[cell_type] = passable
+        type_durability[cell_type] = -1 if durability is None else durability
+        type_health[cell_type] = health
+
+    return type_passable, type_durability, type_health
+
+
+def get_colors(types, health):
+    """
+    Returns (width, height, 3) array of colors of cells with given types
+    and health, see Cell.color
+    """
+
+    colors = numpy.zeros(types.shape + (3,), dtype=numpy.uint8)
+    health = numpy.clip(health, 0.0, 1.0)
+
+    colors[types == Cell.FLOOR] = (16, 16, 0)
+    colors[types == Cell.WALL] = (255, 255, 255)
+
+    rock = types == Cell.ROCK
+    color = (64 + health[rock] * (192 - 64)).astype(numpy.uint8)
+    colors[rock] = numpy.column_stack((color, color, color))
+
+    stone = types == Cell.STONE
+    color = 64 + health[stone] * (160 - 64)
+    colors[stone] = numpy.column_stack((color, color * 0.9, color * 0.7)).astype(numpy.uint8)
+
+    return colors
+
+
+class CellView(Cell):
+    """
+    Lightweight cell, which reads and writes its data from the arrays of
+    ArrayMap; views are created on demand and are not stored anywhere
+    """
+
+    def __init__(self, map_, x, y):
+        self.map = map_
+        self.coord = (x, y)
+
+    @property
+    def type(self): #@ReservedAssignment
+        return int(self.map.types[self.coord])
+
+    @type.setter
+    def type(self, cell_type): #@ReservedAssignment
+        self.map.types[self.coord] = cell_type
+
+    @property
+    def passable(self):
+        return bool(self.map.passable[self.coord])
+
+    @passable.setter
+    def passable(self, passable):
+        self.map.passable[self.coord] = passable
+
+    @property
+    def durability(self):
+        durability = self.map.durability[self.coord]
+        if durability < 0:
+            return None
+        return int(durability)
+
+    @durability.setter
+    def durability(self, durability):
+        self.map.durability[self.coord] = -1 if durability is None else durability
+
+    @property
+    def health(self):
+        return float(self.map.health[self.coord])
+
+    @health.setter
+    def health(self, health):
+        self.map.health[self.coord] = health
+
+    def __eq__(self, other):
+        return isinstance(other, CellView) and self.map is other.map and self.coord == other.coord
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.coord)
+
+
+class ArrayMap(Map):
+    """
+    Map which keeps cell data in typed NumPy arrays indexed by [x, y]:
+
+    types       int8     Cell type
+    passable    bool     If Player or NPCs can walk through the cell
+    durability  int8     Cell durability, -1 means None (can't destroy)
+    health      float32  Cell health
+    """
+
+    def __init__(self, game, size, map_generator, arrays=None):
+        """
+        arrays  {name: array} of all cell data arrays to be used instead of
+                generating the map, e.g. memory-mapped from a saved game,
+                see mygame.savegame
+        """
+
+        self.game = game
+        self.size = tuple(size)
+
+        # Incremented every time any cell becomes passable or impassable
+        self.passability_version = 0
+
+        # Lookup tables of type properties indexed by cell type
+        self._type_passable, self._type_durability, self._type_health = get_type_tables()
+
+        if arrays is not None:
+            self.types = arrays['types']
+            self.passable = arrays['passable']
+            self.durability = arrays['durability']
+            self.health = arrays['health']
+        else:
+            # Generate empty map
+            self.types = numpy.empty(self.size, dtype=numpy.int8)
+            self.passable = numpy.empty(self.size, dtype=numpy.bool_)
+            self.durability = numpy.empty(self.size, dtype=numpy.int8)
+            self.health = numpy.empty(self.size, dtype=numpy.float32)
+            self.fill(Cell.FLOOR)
+
+            # Generate random map
+            map_generator.generate(self)
+
+        # Cells are not drawn one by one the first time
+        self.redraw_all = True
+
+    def __call__(self, x, y=None):
+
+        if hasattr(x, '__iter__'):
+            x, y = x
+
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return CellView(self, x, y)
+        else:
+            return None
+
+    def can_move_to(self, coord):
+        x, y = coord
+        if (0 <= x < self.width) and (0 <= y < self.height):
+            return bool(self.passable[x, y])
+        else:
+            return False
+
+    # == Bulk access ==
+
+    def fill(self, cell_type):
+        self.set_types(numpy.full(self.size, cell_type, dtype=numpy.int8))
+
+    def set_types(self, types):
+        """
+        Replace all cells at once with the given array of cell types
+        """
+        types = numpy.asarray(types, dtype=numpy.int8)
+        self.types[...] = types
+        self.passable[...] = self._type_passable[types]
+        self.durability[...] = self._type_durability[types]
+        self.health[...] = self._type_health[types]
+        self.passability_version += 1
+        for listener in self._passability_listeners:
+            listener(None)
+        self.redraw_all = True
+
+    def hit_cells(self, xs, ys, damages, damage_type=damage.DEFAULT):
+
+        # Only destroyable cells accepting this type of damage are hit
+        types = self.types[xs, ys]
+        hit = self.durability[xs, ys] >= 0
+        for cell_type, damage_types in Cell.accepted_damage_types.items():
+            if damage_type not in damage_types:
+                hit &= types != cell_type
+        xs = xs[hit]
+        ys = ys[hit]
+
+        self.health[xs, ys] -= damages[hit]
+
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            cell = CellView(self, x, y)
+            if cell.health < 0:
+                cell.change_to(Cell.FLOOR)
+            cell.redraw()
+
+    def get_mask(self, cell_types=None):
+        if cell_types is None:
+            return numpy.ones(self.size, dtype=numpy.bool_)
+        if not hasattr(cell_types, '__iter__'):
+            cell_types = [cell_types]
+        return numpy.isin(self.types, list(cell_types))
+
+    def get_passable_mask(self):
+        return self.passable
+
+    def get_coords(self, cell_types=None):
+        """
+        Returns arrays of x and y coordinates of the cells of given types
+        """
+        return numpy.nonzero(self.get_mask(cell_types))
+
+    def count(self, cell_types=None):
+        return int(numpy.count_nonzero(self.get_mask(cell_types)))
+
+    def get_cells(self, cell_types=None):
+        xs, ys = self.get_coords(cell_types)
+        return (CellView(self, int(x), int(y)) for x, y in zip(xs, ys))
+
+    def get_random_cell(self, cell_type=None):
+        xs, ys = self.get_coords(cell_type)
+        i = random.randrange(len(xs))
+        return CellView(self, int(xs[i]), int(ys[i]))
+
+    def get_colors(self, area=None):
+        """
+        Returns (width, height, 3) array of cell colors, see Cell.color; only
+        of the cells of the area (rect in cells), if given
+        """
+        if area is None:
+            return get_colors(self.types, self.health)
+        return get_colors(self.types[area.left:area.right, area.top:area.bottom],
+                          self.health[area.left:area.right, area.top:area.bottom])
+
+    def draw_area(self, game, surface, area):
+        cw, ch = game.cell_size
+        pixels = self.get_colors(area).repeat(cw, axis=0).repeat(ch, axis=1)
+        pygame.surfarray.blit_array(surface, pixels)
+
+    def draw(self, game, surface):
+        if self.redraw_all:
+            cw, ch = game.cell_size
+            pixels = self.get_colors().repeat(cw, axis=0).repeat(ch, axis=1)
+            pygame.surfarray.blit_array(surface, pixels)
+            self.redraw_all = False
+            Cell.updated_cells = []
+        else:
+            super(ArrayMap, self).draw(game, surface)
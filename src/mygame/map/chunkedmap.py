@@ -0,0 +1,333 @@
+import os
+import shutil
+import tempfile
+import numpy
+import pygame
+from mygame.map import Cell, Map
+from mygame.map.arraymap import CellView, get_colors, get_type_tables
+from mygame.types import damage
+
+
+class Chunk(object):
+    """
+    Square area of ChunkedMap, cell data is kept in arrays like in ArrayMap
+    """
+
+    def __init__(self, coord, types, health, type_tables):
+
+        type_passable, type_durability, _ = type_tables
+
+        self.coord = coord
+        self.types = types
+        self.passable = type_passable[types]
+        self.durability = type_durability[types]
+        self.health = health
+
+        # Some cell has changed since the chunk was generated or loaded
+        self.modified = False
+
+        # ChunkedMap time of the last access
+        self.last_used = 0
+
+
+class ChunkCellView(CellView):
+    """
+    Cell of ChunkedMap, reads and writes its data from the arrays of its
+    chunk; every change marks the chunk as modified
+    """
+
+    def __init__(self, map_, chunk, x, y):
+        self.map = map_
+        self.chunk = chunk
+        self.coord = (x, y)
+        self._local_coord = (x - chunk.coord[0] * map_.chunk_size[0],
+                             y - chunk.coord[1] * map_.chunk_size[1])
+
+    @property
+    def type(self): #@ReservedAssignment
+        return int(self.chunk.types[self._local_coord])
+
+    @type.setter
+    def type(self, cell_type): #@ReservedAssignment
+        self.chunk.types[self._local_coord] = cell_type
+        self.chunk.modified = True
+
+    @property
+    def passable(self):
+        return bool(self.chunk.passable[self._local_coord])
+
+    @passable.setter
+    def passable(self, passable):
+        self.chunk.passable[self._local_coord] = passable
+        self.chunk.modified = True
+
+    @property
+    def durability(self):
+        durability = self.chunk.durability[self._local_coord]
+        if durability < 0:
+            return None
+        return int(durability)
+
+    @durability.setter
+    def durability(self, durability):
+        self.chunk.durability[self._local_coord] = -1 if durability is None else durability
+        self.chunk.modified = True
+
+    @property
+    def health(self):
+        return float(self.chunk.health[self._local_coord])
+
+    @health.setter
+    def health(self, health):
+        self.chunk.health[self._local_coord] = health
+        self.chunk.modified = True
+
+    def __eq__(self, other):
+        return isinstance(other, ChunkCellView) and self.map is other.map and self.coord == other.coord
+
+
+class ChunkedMap(Map):
+    """
+    Map of practically any size, split into chunks, which are generated on
+    demand: when some of their cells are accessed and around the player and
+    other entities every tick. Chunks, which were not used for a while, are
+    evicted when the memory limit is reached; modified chunks are saved to
+    disk and loaded back when needed again.
+
+    Cells are generated by map_generator.generate_chunk(), see
+    ArrayMazeGenerator. Bulk methods, like get_cells(), see only the loaded
+    chunks, and there is no passability mask of the whole map, so
+    MovementSystem can't be used. Extra arguments can be passed through
+    functools.partial:
+
+        Game(map_class=functools.partial(ChunkedMap, max_memory=2 ** 24),
+             map_size=(2 ** 20, 2 ** 20), map_generator=ArrayMazeGenerator(),
+             renderer_class=ChunkedRenderer)
+    """
+
+    def __init__(self, game, size, map_generator, chunk_size=(64, 64), max_memory=64 * 2 ** 20,
+                 store_path=None, active_radius=1, origin=None):
+        """
+        chunk_size     Size of the chunk in cells, must be even
+        max_memory     Memory limit for cell data of loaded chunks in bytes
+        store_path     Directory for modified chunks, by default a new
+                       temporary directory, which is removed by close()
+        active_radius  Chunks up to this distance (in chunks) from the
+                       player are always loaded
+        origin         Coordinates of the cell, around which chunks are
+                       loaded at the start, the map center by default
+        """
+
+        self.game = game
+        self.size = tuple(size)
+        self.map_generator = map_generator
+        self.chunk_size = tuple(chunk_size)
+        self.active_radius = active_radius
+        self.store_path = store_path
+
+        # store_path is a temporary directory created by the map
+        self._is_store_temporary = False
+
+        # Incremented every time any cell becomes passable or impassable
+        self.passability_version = 0
+
+        self._type_tables = get_type_tables()
+
+        chunk_bytes = self.chunk_size[0] * self.chunk_size[1] * (1 + 1 + 1 + 4)
+        self.max_chunks = max(1, max_memory / chunk_bytes)
+
+        # (chunk_x, chunk_y): Chunk
+        self.chunks = {}
+
+        # Coordinates of chunks saved to disk
+        self._stored_chunks = set()
+
+        # Incremented every tick, chunks used in the current tick can't be
+        # evicted
+        self._time = 1
+
+        # Statistics
+        self.generated_chunks = 0
+        self.restored_chunks = 0
+        self.spilled_chunks = 0
+        self.evicted_chunks = 0
+
+        if origin is None:
+            origin = (self.width / 2, self.height / 2)
+        self.load_area(origin, self.active_radius)
+
+    def __call__(self, x, y=None):
+
+        if hasattr(x, '__iter__'):
+            x, y = x
+
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return ChunkCellView(self, self._get_chunk((x / self.chunk_size[0], y / self.chunk_size[1])), x, y)
+        else:
+            return None
+
+    def can_move_to(self, coord):
+        x, y = coord
+        if (0 <= x < self.width) and (0 <= y < self.height):
+            cw, ch = self.chunk_size
+            return bool(self._get_chunk((x / cw, y / ch)).passable[x % cw, y % ch])
+        else:
+            return False
+
+    def get_cells(self, cell_types=None):
+        """
+        Cells of the loaded chunks
+        """
+        if cell_types is not None and not hasattr(cell_types, '__iter__'):
+            cell_types = [cell_types]
+        for chunk in self.chunks.values():
+            if cell_types is None:
+                mask = numpy.ones(chunk.types.shape, dtype=numpy.bool_)
+            else:
+                mask = numpy.isin(chunk.types, list(cell_types))
+            x0 = chunk.coord[0] * self.chunk_size[0]
+            y0 = chunk.coord[1] * self.chunk_size[1]
+            for x, y in zip(*numpy.nonzero(mask)):
+                x = x0 + int(x)
+                y = y0 + int(y)
+                if x < self.width and y < self.height:
+                    yield ChunkCellView(self, chunk, x, y)
+
+    def get_passable_mask(self):
+        raise NotImplementedError('ChunkedMap has no passability mask of the whole map')
+
+    def hit_cells(self, xs, ys, damages, damage_type=damage.DEFAULT):
+        for x, y, damage_amount in zip(xs.tolist(), ys.tolist(), damages.tolist()):
+            self(x, y).hit(damage_amount, damage_type)
+
+    def on_cell_change(self, cell, old_type, old_passable):
+        cell.chunk.modified = True
+        super(ChunkedMap, self).on_cell_change(cell, old_type, old_passable)
+
+    # == Chunks ==
+
+    def load_area(self, coord, radius):
+        """
+        Make sure chunks up to the radius (in chunks) from the cell are loaded
+        """
+        cx = coord[0] / self.chunk_size[0]
+        cy = coord[1] / self.chunk_size[1]
+        for x in xrange(max(0, cx - radius), cx + radius + 1):
+            for y in xrange(max(0, cy - radius), cy + radius + 1):
+                if x * self.chunk_size[0] < self.width and y * self.chunk_size[1] < self.height:
+                    self._get_chunk((x, y))
+
+    def update(self, game):
+
+        # Keep chunks around the player and all other entities loaded
+        self.load_area(game.player.location.cr, self.active_radius)
+        cw, ch = self.chunk_size
+        for chunk_coord in set((x / cw, y / ch) for x, y in game.entity_index.get_coords()):
+            self._get_chunk(chunk_coord)
+
+        self._evict()
+
+        self._time += 1
+
+    def _get_chunk(self, chunk_coord):
+
+        chunk = self.chunks.get(chunk_coord)
+        if chunk is None:
+            chunk = self.chunks[chunk_coord] = self._load_chunk(chunk_coord)
+        chunk.last_used = self._time
+
+        return chunk
+
+    def _load_chunk(self, chunk_coord):
+
+        if chunk_coord in self._stored_chunks:
+            data = numpy.load(self._get_chunk_path(chunk_coord))
+            self.restored_chunks += 1
+            return Chunk(chunk_coord, data['types'], data['health'], self._type_tables)
+
+        types = self.map_generator.generate_chunk(chunk_coord, self.chunk_size).astype(numpy.int8)
+
+        # Close the map at its right and bottom sides
+        x = self.width - chunk_coord[0] * self.chunk_size[0] - 1
+        y = self.height - chunk_coord[1] * self.chunk_size[1] - 1
+        if x < self.chunk_size[0]:
+            types[x:, :] = Cell.WALL
+        if y < self.chunk_size[1]:
+            types[:, y:] = Cell.WALL
+
+        self.generated_chunks += 1
+        return Chunk(chunk_coord, types, self._type_tables[2][types], self._type_tables)
+
+    def _evict(self):
+        """
+        Drop the least recently used chunks over the limit, modified chunks
+        are saved to disk first
+        """
+
+        if len(self.chunks) <= self.max_chunks:
+            return
+
+        chunks = sorted(self.chunks.values(), key=lambda chunk: chunk.last_used)
+        for chunk in chunks[:len(chunks) - self.max_chunks]:
+            if chunk.last_used == self._time:
+                break
+            if chunk.modified:
+                self._store_chunk(chunk)
+            del self.chunks[chunk.coord]
+            self.evicted_chunks += 1
+
+    def close(self):
+        """
+        Remove the temporary directory of saved chunks with them, the chunks
+        modified and evicted so far are lost; directories given as
+        store_path are kept
+        """
+        if self._is_store_temporary:
+            shutil.rmtree(self.store_path, ignore_errors=True)
+            self.store_path = None
+            self._is_store_temporary = False
+            self._stored_chunks.clear()
+
+    def _store_chunk(self, chunk):
+        if self.store_path is None:
+            self.store_path = tempfile.mkdtemp(prefix='mygame-chunks-')
+            self._is_store_temporary = True
+        with open(self._get_chunk_path(chunk.coord), 'wb') as f:
+            numpy.savez(f, types=chunk.types, health=chunk.health)
+        self._stored_chunks.add(chunk.coord)
+        self.spilled_chunks += 1
+
+    def _get_chunk_path(self, chunk_coord):
+        return os.path.join(self.store_path, 'chunk_%d_%d.npz' % chunk_coord)
+
+    # == Drawing ==
+
+    def get_colors(self, area):
+        """
+        Returns (width, height, 3) array of colors of the cells of the area
+        (rect in cells), see Cell.color
+        """
+
+        colors = numpy.zeros((area.width, area.height, 3), dtype=numpy.uint8)
+        cw, ch = self.chunk_size
+
+        for cx in xrange(area.left / cw, (area.right - 1) / cw + 1):
+            for cy in xrange(area.top / ch, (area.bottom - 1) / ch + 1):
+                chunk = self._get_chunk((cx, cy))
+                x0 = max(area.left, cx * cw)
+                x1 = min(area.right, (cx + 1) * cw)
+                y0 = max(area.top, cy * ch)
+                y1 = min(area.bottom, (cy + 1) * ch)
+                colors[x0 - area.left:x1 - area.left, y0 - area.top:y1 - area.top] = get_colors(
+                    chunk.types[x0 - cx * cw:x1 - cx * cw, y0 - cy * ch:y1 - cy * ch],
+                    chunk.health[x0 - cx * cw:x1 - cx * cw, y0 - cy * ch:y1 - cy * ch])
+
+        return colors
+
+    def draw_area(self, game, surface, area):
+        cw, ch = game.cell_size
+        pixels = self.get_colors(area).repeat(cw, axis=0).repeat(ch, axis=1)
+        pygame.surfarray.blit_array(surface, pixels)
+
+    def draw(self, game, surface):
+        raise NotImplementedError('ChunkedMap can be drawn only by ChunkedRenderer')
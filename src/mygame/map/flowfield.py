@@ -0,0 +1,88 @@
+from collections import deque
+from mygame.types import direction
+
+
+class FlowField(object):
+
+    adjacent_offsets = (
+        (direction.LEFT,  -1,  0),
+        (direction.RIGHT, +1,  0),
+        (direction.UP,     0, -1),
+        (direction.DOWN,   0, +1),
+    )
+
+    def __init__(self, game_map, max_distance=None):
+        """
+        Distances and directions from map cells to the single source cell,
+        shared by all entities heading to the same target
+
+        game_map (Map)
+            Map to build the field over
+        max_distance (int)
+            Cells further than this (in steps) are left out of the field;
+            None means the whole reachable map is covered
+        """
+        self.map = game_map
+        self.max_distance = max_distance
+
+        self.source = None
+        self.passability_version = None
+
+        # coord: distance to the source
+        self.distances = {}
+
+        # coord: direction of the next step towards the source
+        self.directions = {}
+
+        # How many times the field was rebuilt
+        self.updates = 0
+
+    def update(self, source):
+        """
+        Rebuild the field if the source cell or map passability has changed
+        since the last build; returns True if the field was rebuilt
+        """
+
+        if source == self.source and self.passability_version == self.map.passability_version:
+            return False
+
+        self.source = source
+        self.passability_version = self.map.passability_version
+        self.updates += 1
+
+        distances = {source: 0}
+        directions = {source: direction.NONE}
+        queue = deque([source])
+
+        while queue:
+
+            coord = queue.popleft()
+            distance = distances[coord] + 1
+
+            if self.max_distance is not None and self.max_distance < distance:
+                continue
+
+            for adjacent_direction, dx, dy in self.adjacent_offsets:
+                adjacent_coord = (coord[0] + dx, coord[1] + dy)
+                if adjacent_coord in distances:
+                    continue
+                if not self.map.can_move_to(adjacent_coord):
+                    continue
+                # Entity in the adjacent cell has to move back to the current one
+                distances[adjacent_coord] = distance
+                directions[adjacent_coord] = direction.get_opposite(adjacent_direction)
+                queue.append(adjacent_coord)
+
+        self.distances = distances
+        self.directions = directions
+
+        return True
+
+    def has(self, coord):
+        return coord in self.directions
+
+    def get_distance(self, coord):
+        return self.distances.get(coord)
+
+    def get_direction(self, coord):
+        return self.directions.get(coord, direction.NONE)
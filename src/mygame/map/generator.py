@@ -1,4 +1,5 @@
 import random
+import numpy
 
 from mygame.map import Cell
 
@@ -139,3 +140,137 @@ class MazeGenerator(MapGenerator):
         if rock_cells_count > 0:
             for cell in random.sample(stone_cells, rock_cells_count):
                 cell.change_to(Cell.ROCK)
+
+class ArrayMazeGenerator(MapGenerator):
+    """
+    Maze generator, which builds the whole map as an array of cell types
+    with bulk NumPy operations and writes it into the map in one go; the
+    same seed always produces the same map
+
+    The maze itself is a "binary tree" maze (every cell is connected either
+    to its left or to its upper neighbour), which, unlike the backtracking
+    maze of MazeGenerator, can be generated for all cells at once.
+    """
+
+    # Max number of random values generated at once, limits memory usage on
+    # very large maps
+    batch_size = 1 << 20
+
+    def __init__(self, seed=None, rooms=1, rock_ratio=0.1):
+        self.seed = seed
+        self.rooms = rooms
+        self.rock_ratio = rock_ratio
+
+    def generate(self, map_):
+        map_.set_types(self.generate_types(map_.size))
+
+    def generate_types(self, size):
+
+        rng = numpy.random.RandomState(self.seed)
+
+        width, height = size
+
+        # Maze size, which is about twice as small as the final map
+        w = int((width - 1) / 2)
+        h = int((height - 1) / 2)
+
+        # Pre-fill map with start pattern
+        types = numpy.full((width, height), Cell.STONE, dtype=numpy.int8)
+        types[[0, -1], :] = Cell.WALL
+        types[:, [0, -1]] = Cell.WALL
+        types[1:2 * w:2, 1:2 * h:2] = Cell.FLOOR
+
+        # Connect every maze cell to its left or upper neighbour, cells in
+        # the first row and column have only one choice
+        for x0 in xrange(0, w, self._get_batch_columns(h)):
+            x1 = min(w, x0 + self._get_batch_columns(h))
+            x = numpy.arange(x0, x1)[:, numpy.newaxis]
+            y = numpy.arange(h)[numpy.newaxis, :]
+            to_left = rng.randint(0, 2, size=(x1 - x0, h)).astype(numpy.bool_)
+            to_left |= (y == 0)
+            to_left &= (x > 0)
+            to_up = ~to_left & (y > 0)
+            cx, cy = numpy.nonzero(to_left)
+            types[2 * (cx + x0), 2 * cy + 1] = Cell.FLOOR
+            cx, cy = numpy.nonzero(to_up)
+            types[2 * (cx + x0) + 1, 2 * cy] = Cell.FLOOR
+
+        # Add random holes to the maze
+        holes_count = w * h / 2
+        while 0 < holes_count:
+            n = min(holes_count, self.batch_size)
+            horizontal = rng.randint(0, 2, size=n).astype(numpy.bool_)
+            x = numpy.where(horizontal,
+                            2 * rng.randint(1, max(w, 2), size=n),
+                            2 * rng.randint(1, w + 1, size=n) - 1)
+            y = numpy.where(horizontal,
+                            2 * rng.randint(1, h + 1, size=n) - 1,
+                            2 * rng.randint(1, max(h, 2), size=n))
+            inside = (x < width - 1) & (y < height - 1)
+            types[x[inside], y[inside]] = Cell.FLOOR
+            holes_count -= n
+
+        # Draw rooms
+        for _ in xrange(self.rooms):
+            d = 1  # Minimum distance from map borders
+            rw = int(w / 3)
+            rh = int(h / 3)
+            if rw < 2 * d + 1 or rh < 2 * d + 1:
+                break
+            rx = rng.randint(d, w - rw - d + 1)
+            ry = rng.randint(d, h - rh - d + 1)
+            # Walls
+            types[2 * rx:2 * (rx + rw) + 1, 2 * ry:2 * (ry + rh) + 1] = Cell.STONE
+            # Floor
+            types[2 * rx + 1:2 * (rx + rw), 2 * ry + 1:2 * (ry + rh)] = Cell.FLOOR
+            # Doors
+            types[2 * rng.randint(rx + d, rx + rw - d) + 1, 2 * ry] = Cell.FLOOR
+            types[2 * rng.randint(rx + d, rx + rw - d) + 1, 2 * (ry + rh)] = Cell.FLOOR
+            types[2 * rx, 2 * rng.randint(ry + d, ry + rh - d) + 1] = Cell.FLOOR
+            types[2 * (rx + rw), 2 * rng.randint(ry + d, ry + rh - d) + 1] = Cell.FLOOR
+
+        # Replace some stone with Rock, column by column so no random values
+        # are generated for the whole map at once
+        threshold = int(self.rock_ratio * 0x10000)
+        step = self._get_batch_columns(height)
+        for x0 in xrange(0, width, step):
+            columns = types[x0:x0 + step]
+            r = rng.randint(0, 0x10000, size=columns.shape)
+            columns[(columns == Cell.STONE) & (r < threshold)] = Cell.ROCK
+
+        return types
+
+    def generate_chunk(self, chunk_coord, chunk_size, doors=2):
+        """
+        Generate cell types of a single chunk of an endless maze, see
+        ChunkedMap; every chunk is a separate maze with walls on its left and
+        top sides and random doors in them, leading to the neighbour chunks.
+        The same seed and chunk coordinates always produce the same chunk.
+
+        chunk_size must be even in both dimensions.
+        """
+
+        if self.seed is None:
+            self.seed = random.getrandbits(32)
+
+        # Explicit mix of the seed and chunk coordinates, unlike hash() the
+        # same on every platform
+        cx, cy = chunk_coord
+        seed = (self.seed * 73856093 ^ cx * 19349663 ^ cy * 83492791) & 0xffffffff
+        width, height = chunk_size
+
+        # Right and bottom walls belong to the next chunks
+        chunk_generator = ArrayMazeGenerator(seed, self.rooms, self.rock_ratio)
+        types = chunk_generator.generate_types((width + 1, height + 1))[:width, :height]
+
+        # Doors, in front of maze cells of both chunks
+        rng = numpy.random.RandomState(seed ^ 0x5eed)
+        if chunk_coord[0] != 0:
+            types[0, 2 * rng.randint(0, height / 2, size=doors) + 1] = Cell.FLOOR
+        if chunk_coord[1] != 0:
+            types[2 * rng.randint(0, width / 2, size=doors) + 1, 0] = Cell.FLOOR
+
+        return types
+
+    def _get_batch_columns(self, column_size):
+        return max(1, self.batch_size / max(1, column_size))
@@ -0,0 +1,1039 @@
+import heapq
+import itertools
+from collections import deque, OrderedDict
+
+_offsets = ((-1, 0), (+1, 0), (0, -1), (0, +1))
+
+INFINITY = float('inf')
+
+
+class _Cluster(object):
+    """
+    Square block of map cells with its entrances and shortest distances
+    between them inside the cluster
+    """
+
+    __slots__ = ('origin', 'passable', 'transitions', 'nodes', '_edges', '_open', '_stride',
+                 '_node_indices')
+
+    def __init__(self, origin, passable, transitions):
+        """
+        origin       Coordinates of the top left cell
+        passable     Passability of the cluster cells, [x][y] lists
+        transitions  {entrance: [(adjacent cluster entrance, cost), ...]}
+        """
+        self.origin = origin
+        self.passable = passable
+        self.transitions = transitions
+        self.nodes = list(transitions)
+
+        # node: [(node, cost), ...], paths inside the cluster and transitions
+        # to adjacent clusters, see get_edges()
+        self._edges = {}
+
+        # Passability as a flat list by x * _stride + y, with a row of
+        # impassable cells around, so neighbours are found by adding offsets
+        self._stride = stride = len(passable[0]) + 2
+        self._open = [False] * stride
+        for column in passable:
+            self._open.append(False)
+            self._open.extend(column)
+            self._open.append(False)
+        self._open.extend([False] * stride)
+
+        ox, oy = origin
+        self._node_indices = [(node[0] - ox + 1) * stride + node[1] - oy + 1 for node in self.nodes]
+
+    def get_edges(self, node):
+        """
+        Returns [(node, cost), ...] of the entrance; paths to other
+        entrances are searched the first time they are needed
+        """
+        try:
+            return self._edges[node]
+        except KeyError:
+            pass
+        edges = [(other, cost) for other, cost in self.get_node_distances(node).iteritems()
+                 if other != node]
+        edges.extend(self.transitions[node])
+        self._edges[node] = edges
+        return edges
+
+    def get_node_distances(self, source):
+        """
+        Returns {entrance: distance} of entrances reachable from the source
+        cell within the cluster
+        """
+
+        stride = self._stride
+        is_open = self._open
+        ox, oy = self.origin
+        index = (source[0] - ox + 1) * stride + source[1] - oy + 1
+
+        # Breadth-first search level by level
+        distances = [None] * len(is_open)
+        distances[index] = 0
+        level = [index]
+        distance = 0
+        while level:
+            distance += 1
+            next_level = []
+            for index in level:
+                for adjacent_index in (index - stride, index + stride, index - 1, index + 1):
+                    if is_open[adjacent_index] and distances[adjacent_index] is None:
+                        distances[adjacent_index] = distance
+                        next_level.append(adjacent_index)
+            level = next_level
+
+        node_distances = {}
+        for node, index in zip(self.nodes, self._node_indices):
+            if distances[index] is not None:
+                node_distances[node] = distances[index]
+        return node_distances
+
+    def search(self, source):
+        """
+        Breadth-first search from the source cell, within the cluster;
+        returns {coord: distance} and {coord: parent coord} of all reachable
+        cells
+        """
+
+        ox, oy = self.origin
+        passable = self.passable
+        width = len(passable)
+        height = len(passable[0])
+
+        distances = {source: 0}
+        parents = {source: None}
+        queue = deque([source])
+
+        while queue:
+            coord = queue.popleft()
+            distance = distances[coord] + 1
+            for dx, dy in _offsets:
+                x = coord[0] + dx
+                y = coord[1] + dy
+                if not (0 <= x - ox < width and 0 <= y - oy < height):
+                    continue
+                adjacent_coord = (x, y)
+                if adjacent_coord in distances or not passable[x - ox][y - oy]:
+                    continue
+                distances[adjacent_coord] = distance
+                parents[adjacent_coord] = coord
+                queue.append(adjacent_coord)
+
+        return distances, parents
+
+
+class _TargetPaths(object):
+    """
+    Paths found towards one cluster; every entrance on a found path points
+    to the next one, so other searches can follow the path instead of
+    searching it again
+    """
+
+    __slots__ = ('paths', 'target', 'target_costs')
+
+    def __init__(self):
+
+        # node: (next node, cost, remaining cost, end), the path goes on to
+        # the next node at cost and ends after the remaining cost at the end
+        # entrance of the cluster; the end is None if the path has been cut
+        # by a cluster change, then it leads up to the cut and the remaining
+        # cost is meaningless; the last node of a path has no next node
+        self.paths = {}
+
+        # Cell the paths have been searched for last and {entrance: cost} of
+        # its cluster entrances, from which it can be reached inside the
+        # cluster
+        self.target = None
+        self.target_costs = None
+
+    def drop(self, cluster_coords, get_cluster_coord):
+        """
+        Forget nodes in the clusters and cut the paths going through them
+        """
+        self._update(lambda node: get_cluster_coord(node) in cluster_coords)
+
+    def set_end(self, node):
+        """
+        Make the node an end of paths, also of those already going through
+        it further
+        """
+        item = self.paths.get(node)
+        self.paths[node] = (None, 0, 0, node)
+        if item is not None and item[3] is not None:
+            self._update(lambda node: False)
+
+    def _update(self, is_forgotten):
+        """
+        Forget nodes, for which is_forgotten(node) is True, and update the
+        paths going through them or through changed ends
+        """
+
+        paths = self.paths
+
+        # node: new path item, None if the node is forgotten
+        items = {}
+
+        for node in paths:
+
+            # Nodes up to the first one already known, forgotten or the last
+            chain = []
+            while node not in items:
+                if is_forgotten(node):
+                    items[node] = None
+                    break
+                chain.append(node)
+                if paths[node][0] is None:
+                    break
+                node = paths[node][0]
+
+            for node in reversed(chain):
+                next_node, cost = paths[node][:2]
+                if next_node is None:
+                    items[node] = paths[node]
+                    continue
+                next_item = items[next_node]
+                if next_item is None:
+                    items[node] = (None, 0, 0, None)
+                else:
+                    items[node] = (next_node, cost, cost + next_item[2], next_item[3])
+
+        for node, item in items.iteritems():
+            if item is None:
+                del paths[node]
+            else:
+                paths[node] = item
+
+
+class HierarchicalPathfinder(object):
+    """
+    Hierarchical path search (HPA*) over the map passability
+
+    The map is split into square clusters. Cells on both sides of cluster
+    borders, where the border can be crossed, are entrances. Clusters keep
+    shortest distances between their entrances, so a long path is searched
+    in the small graph of entrances and only its first steps are looked up
+    cell by cell. Paths are close to, but not always exactly, the shortest
+    ones. Targets closer than a cluster size are searched cell by cell
+    around the start, their paths are the shortest ones when found there.
+
+    Clusters are built the first time a search reaches them. When a cell
+    becomes passable or impassable, only its cluster (and the neighbour
+    across the border, if the cell is on one) is dropped and rebuilt when
+    needed again.
+
+    Paths to recently searched target clusters are remembered, so entities
+    chasing the same target mostly join an already found path, also after
+    the target has moved. A cluster change only cuts the remembered paths
+    going through it, searches follow them up to the cut.
+    """
+
+    def __init__(self, game_map, cluster_size=16, cached_targets=8, heuristic_weight=1.1,
+                 near_expansions=256, detour_expansions=32):
+        """
+        game_map          Map to search; ChunkedMap is not supported
+        cluster_size      Size of clusters in cells
+        cached_targets    Number of target clusters with remembered paths
+        heuristic_weight  Distance estimates are multiplied by this; above
+                          1 the search finds slightly longer paths, but
+                          doesn't have to go through all the equally good
+                          ones, which are plenty on a grid
+        near_expansions   Number of entrances searched nearest first around
+                          the end of a followed remembered path, before the
+                          search goes on towards the target
+        detour_expansions Number of entrances searched on for a shorter way,
+                          after the search has joined a remembered path
+        """
+        self.map = game_map
+        self.cluster_size = cluster_size
+        self.cached_targets = cached_targets
+        self.heuristic_weight = heuristic_weight
+        self.near_expansions = near_expansions
+        self.detour_expansions = detour_expansions
+
+        self._passable = game_map.get_passable_mask()
+
+        # (cx, cy): _Cluster
+        self._clusters = {}
+
+        # (axis, cx, cy): [(coord, adjacent coord), ...], transitions from
+        # cluster (cx, cy) to the next one along the axis
+        self._borders = {}
+
+        # (cx, cy): _TargetPaths, remembered paths to the target cluster, the
+        # most recently used cluster goes last
+        self._targets = OrderedDict()
+
+        # Clusters dropped since the last search, remembered paths through
+        # them are cut before the next one
+        self._dropped_clusters = set()
+
+        # Incremented every time any cluster is dropped
+        self.version = 0
+
+        # Metrics
+        self.clusters_built = 0
+        self.nodes_expanded = 0
+
+        game_map.add_passability_listener(self.on_passability_change)
+
+    # == Queries ==
+
+    def get_next_step(self, start, target):
+        """
+        Returns coordinates of the next cell on the way from start to
+        target, None if the target can't be reached or is already reached
+        """
+
+        path, start_parents = self._find_path(start, target)
+        if path is None or len(path) < 2:
+            return None
+
+        next_node = path[1]
+        if abs(next_node[0] - start[0]) + abs(next_node[1] - start[1]) == 1:
+            return next_node
+
+        # Walk back from the first entrance, it's in the cluster of start
+        coord = next_node
+        while start_parents[coord] != start:
+            coord = start_parents[coord]
+        return coord
+
+    def get_path(self, start, target):
+        """
+        Returns list of coordinates of all cells from start to target, None
+        if the target can't be reached
+        """
+
+        path, start_parents = self._find_path(start, target)
+        if path is None:
+            return None
+
+        cells = [start]
+        for node in path[1:]:
+            cells.extend(self._refine(cells[-1], node))
+        return cells
+
+    # == Changes ==
+
+    def on_passability_change(self, coord):
+        """
+        Drop the cluster of the cell and borders it lies on; None means the
+        whole map has changed
+        """
+
+        self.version += 1
+
+        if coord is None:
+            self._passable = self.map.get_passable_mask()
+            self._clusters.clear()
+            self._borders.clear()
+            self._targets.clear()
+            self._dropped_clusters.clear()
+            return
+
+        # The map may keep passability in a copy
+        self._passable[coord] = self.map.can_move_to(coord)
+
+        s = self.cluster_size
+        x, y = coord
+        cx, cy = x // s, y // s
+        self._drop_cluster((cx, cy))
+
+        for axis, position, low, high in ((0, x, cx, cy), (1, y, cy, cx)):
+            if position % s == 0 and low > 0:
+                self._drop_border(axis, low - 1, high)
+            if position % s == s - 1:
+                self._drop_border(axis, low, high)
+
+    def _drop_border(self, axis, low, high):
+        if axis == 0:
+            key, adjacent = (0, low, high), (low + 1, high)
+            cluster = (low, high)
+        else:
+            key, adjacent = (1, high, low), (high, low + 1)
+            cluster = (high, low)
+        self._borders.pop(key, None)
+        self._drop_cluster(cluster)
+        self._drop_cluster(adjacent)
+
+    def _drop_cluster(self, cluster_coord):
+        self._clusters.pop(cluster_coord, None)
+        self._dropped_clusters.add(cluster_coord)
+
+    def _drop_paths(self):
+        """
+        Cut remembered paths going through clusters dropped since the last
+        search
+        """
+
+        dropped = self._dropped_clusters
+        if not dropped:
+            return
+
+        for cluster_coord in list(self._targets):
+            if cluster_coord in dropped:
+                del self._targets[cluster_coord]
+            else:
+                self._targets[cluster_coord].drop(dropped, self._get_cluster_coord)
+
+        self._dropped_clusters = set()
+
+    # == Search ==
+
+    def _find_path(self, start, target):
+        """
+        Returns path as a list of start, entrances on the way and target,
+        and parents of cells of the search from start in its cluster, see
+        _Cluster.search(); path is None if the target can't be reached;
+        parents are None if the path goes cell by cell
+        """
+
+        if start == target:
+            return [start], {start: None}
+
+        if not self._passable[target]:
+            return None, None
+
+        if abs(start[0] - target[0]) + abs(start[1] - target[1]) <= self.cluster_size:
+            path = self._find_near_path(start, target)
+            if path is not None:
+                return path, None
+
+        start_cluster = self._get_cluster(self._get_cluster_coord(start))
+        start_distances, start_parents = start_cluster.search(start)
+
+        # Target in the same cluster, reachable without leaving it
+        if target in start_distances:
+            return self._get_start_path(target, start_parents), start_parents
+
+        self._drop_paths()
+        target_paths, target_cells = self._get_target(target)
+        target = target_paths.target
+
+        if target in start_distances:
+            return self._get_start_path(target, start_parents) + target_cells[1:], start_parents
+
+        paths = target_paths.paths
+        target_costs = target_paths.target_costs
+
+        # Paths remembered to the neighbouring clusters lead close to the
+        # target too, searches follow them to their ends
+        tcx, tcy = self._get_cluster_coord(target)
+        neighbour_paths = [self._targets[(cx, cy)].paths
+                           for cx in (tcx - 1, tcx, tcx + 1) for cy in (tcy - 1, tcy, tcy + 1)
+                           if (cx, cy) != (tcx, tcy) and (cx, cy) in self._targets]
+
+        # A* over entrances, the start and target cells are connected to the
+        # entrances of their clusters. Around the end of a followed
+        # remembered path entrances are searched nearest first for a while,
+        # the cut path usually goes on close by
+        tx, ty = target
+        w = self.heuristic_weight
+        open_heap = []
+        near_heap = []
+        near_expansions = 0
+        costs = {}
+        counter = itertools.count()
+
+        # node: (parent node, cost of the edge from it)
+        parents = {}
+
+        def push(node, near):
+            if near:
+                heapq.heappush(near_heap, (costs[node], next(counter), node))
+            else:
+                h = w * (abs(node[0] - tx) + abs(node[1] - ty)) if node != target else 0
+                heapq.heappush(open_heap, (costs[node] + h, h, next(counter), node))
+
+        for node in start_cluster.nodes:
+            cost = start_distances.get(node)
+            if cost is not None:
+                costs[node] = cost
+                parents[node] = (start, cost)
+                push(node, False)
+
+        closed = set()
+
+        # The target or the node, where the shortest way found so far joins a
+        # remembered path; once there is one, the search goes on a little
+        # longer for a shorter way
+        goal = None
+        goal_cost = INFINITY
+        detour_expansions = self.detour_expansions
+
+        while open_heap or near_heap:
+
+            near = bool(near_heap)
+            if not near:
+                node = heapq.heappop(open_heap)[-1]
+            elif near_expansions < self.near_expansions:
+                node = heapq.heappop(near_heap)[-1]
+            else:
+                for item in near_heap:
+                    push(item[-1], False)
+                del near_heap[:]
+                continue
+
+            if node in closed:
+                continue
+            cost = costs[node]
+
+            if goal is not None:
+                if detour_expansions <= 0:
+                    break
+                if cost + abs(node[0] - tx) + abs(node[1] - ty) >= goal_cost:
+                    continue
+                detour_expansions -= 1
+
+            closed.add(node)
+            self.nodes_expanded += 1
+            if near:
+                near_expansions += 1
+
+            if node == target:
+                goal, goal_cost = node, cost
+                continue
+
+            # Join a remembered path, which ends where the target can be
+            # reached, or follow one as far as it goes
+            for remembered_paths in itertools.chain((paths,), neighbour_paths):
+                item = remembered_paths.get(node)
+                if item is None:
+                    continue
+                if remembered_paths is paths and item[3] in target_costs:
+                    join_cost = cost + item[2] + target_costs[item[3]]
+                    if join_cost < goal_cost:
+                        goal, goal_cost = node, join_cost
+                    break
+                followed_nodes = self._follow(remembered_paths, node, costs, parents, closed)
+                if followed_nodes:
+                    for followed_node in followed_nodes[:-1]:
+                        push(followed_node, False)
+                    push(followed_nodes[-1], True)
+                    near_expansions = 0
+                    near = True
+                break
+
+            # The target cell is an extra node connected to entrances of its
+            # cluster
+            target_cost = target_costs.get(node)
+            if target_cost is not None:
+                if target not in costs or cost + target_cost < costs[target]:
+                    costs[target] = cost + target_cost
+                    parents[target] = (node, target_cost)
+                    push(target, near)
+
+            cluster = self._get_cluster(self._get_cluster_coord(node))
+            for adjacent_node, edge_cost in cluster.get_edges(node):
+                if adjacent_node in closed:
+                    continue
+                adjacent_cost = cost + edge_cost
+                if adjacent_node not in costs or adjacent_cost < costs[adjacent_node]:
+                    costs[adjacent_node] = adjacent_cost
+                    parents[adjacent_node] = (node, edge_cost)
+                    push(adjacent_node, near)
+
+        if goal is None:
+            return None, start_parents
+
+        # Path to the goal
+        path = [goal]
+        while path[-1] != start:
+            path.append(parents[path[-1]][0])
+        path.reverse()
+
+        # Remember the way from every entrance on the path, the remembered
+        # paths it has joined stay as they are
+        if goal == target:
+            # The target may be an entrance itself
+            nodes = path[1:] if target in target_costs else path[1:-1]
+            if paths.get(nodes[-1], (None, 0, 0, None))[3] != nodes[-1]:
+                target_paths.set_end(nodes[-1])
+        else:
+            nodes = path[1:]
+        for node, next_node in reversed(zip(nodes[:-1], nodes[1:])):
+            if paths.get(node, (None, 0, 0, None))[3] is None:
+                edge_cost = parents[next_node][1]
+                _, _, remaining_cost, end = paths[next_node]
+                paths[node] = (next_node, edge_cost, edge_cost + remaining_cost, end)
+
+        # Followed by the remembered path to the target
+        if goal != target:
+            node = goal
+            while paths[node][0] is not None:
+                node = paths[node][0]
+                path.append(node)
+            path.append(target)
+
+        path.extend(target_cells[1:])
+        return path, start_parents
+
+    @staticmethod
+    def _get_start_path(target, start_parents):
+        path = [target]
+        while start_parents[path[-1]] is not None:
+            path.append(start_parents[path[-1]])
+        path.reverse()
+        return path
+
+    def _follow(self, paths, node, costs, parents, closed):
+        """
+        Sets costs and parents of nodes on the remembered path from the
+        node, while they are better than the known ones; returns list of
+        these nodes
+        """
+
+        nodes = []
+        cost = costs[node]
+        next_node, edge_cost = paths[node][:2]
+
+        while next_node is not None and next_node not in closed:
+            cost += edge_cost
+            if next_node in costs and costs[next_node] <= cost:
+                break
+            costs[next_node] = cost
+            parents[next_node] = (node, edge_cost)
+            nodes.append(next_node)
+            node = next_node
+            next_node, edge_cost = paths[node][:2]
+
+        return nodes
+
+    def _find_near_path(self, start, target):
+        """
+        Returns list of coordinates of cells of the shortest path to the
+        target, searched cell by cell within cluster_size around both; None
+        if the target can't be reached there
+        """
+
+        s = self.cluster_size
+        width, height = self.map.size
+        x0 = max(min(start[0], target[0]) - s, 0)
+        y0 = max(min(start[1], target[1]) - s, 0)
+        x1 = min(max(start[0], target[0]) + s + 1, width)
+        y1 = min(max(start[1], target[1]) + s + 1, height)
+        passable = self._passable[x0:x1, y0:y1].tolist()
+
+        # A*, deeper cells go first among equally good ones
+        tx, ty = target
+        costs = {start: 0}
+        parents = {start: None}
+        open_heap = [(abs(start[0] - tx) + abs(start[1] - ty), 0, start)]
+
+        while open_heap:
+
+            _, cost, coord = heapq.heappop(open_heap)
+            cost = -cost
+
+            if coord == target:
+                path = [target]
+                while path[-1] != start:
+                    path.append(parents[path[-1]])
+                path.reverse()
+                return path
+
+            if cost > costs[coord]:
+                continue
+            cost += 1
+
+            for dx, dy in _offsets:
+                x = coord[0] + dx
+                y = coord[1] + dy
+                if not (x0 <= x < x1 and y0 <= y < y1) or not passable[x - x0][y - y0]:
+                    continue
+                adjacent_coord = (x, y)
+                if costs.get(adjacent_coord, cost + 1) <= cost:
+                    continue
+                costs[adjacent_coord] = cost
+                parents[adjacent_coord] = coord
+                heapq.heappush(open_heap, (cost + abs(x - tx) + abs(y - ty), -cost, adjacent_coord))
+
+        return None
+
+    def _get_target(self, target):
+        """
+        Returns remembered paths to the target's cluster, see _TargetPaths,
+        and list of cells from their target to the given one
+
+        Paths are searched to the same target cell, while the given target
+        stays close to it, and go on to the given one cell by cell.
+        """
+
+        cluster_coord = self._get_cluster_coord(target)
+        target_paths = self._targets.pop(cluster_coord, None)
+
+        if target_paths is None:
+            target_paths = _TargetPaths()
+            while len(self._targets) >= self.cached_targets:
+                self._targets.popitem(last=False)
+
+        self._targets[cluster_coord] = target_paths
+
+        if target_paths.target == target:
+            return target_paths, [target]
+
+        old_target = target_paths.target
+        if old_target is not None and self._passable[old_target] and \
+                abs(old_target[0] - target[0]) + abs(old_target[1] - target[1]) <= self.cluster_size:
+            cells = self._find_near_path(old_target, target)
+            if cells is not None and len(cells) <= self.cluster_size:
+                return target_paths, cells
+
+        target_paths.target = target
+        target_paths.target_costs = self._get_cluster(cluster_coord).get_node_distances(target)
+        return target_paths, [target]
+
+    def _refine(self, coord, node):
+        """
+        Cells after coord up to the node, which is either adjacent or in the
+        same cluster
+        """
+        if abs(node[0] - coord[0]) + abs(node[1] - coord[1]) <= 1:
+            return [node] if node != coord else []
+        cluster = self._get_cluster(self._get_cluster_coord(coord))
+        _, parents = cluster.search(coord)
+        cells = [node]
+        while parents[cells[-1]] != coord:
+            cells.append(parents[cells[-1]])
+        cells.reverse()
+        return cells
+
+    # == Clusters ==
+
+    def _get_cluster_coord(self, coord):
+        return (coord[0] // self.cluster_size, coord[1] // self.cluster_size)
+
+    def _get_cluster(self, cluster_coord):
+        try:
+            return self._clusters[cluster_coord]
+        except KeyError:
+            cluster = self._clusters[cluster_coord] = self._build_cluster(cluster_coord)
+            return cluster
+
+    def _build_cluster(self, cluster_coord):
+
+        s = self.cluster_size
+        cx, cy = cluster_coord
+        x0, y0 = cx * s, cy * s
+
+        # Transitions to adjacent clusters
+        transitions = {}
+        for key, reverse in (((0, cx, cy), False), ((1, cx, cy), False),
+                             ((0, cx - 1, cy), True), ((1, cx, cy - 1), True)):
+            if key[1] < 0 or key[2] < 0:
+                continue
+            for coord, adjacent_coord in self._get_border(key):
+                if reverse:
+                    coord, adjacent_coord = adjacent_coord, coord
+                transitions.setdefault(coord, []).append((adjacent_coord, 1))
+
+        self.clusters_built += 1
+
+        return _Cluster((x0, y0), self._passable[x0:x0 + s, y0:y0 + s].tolist(), transitions)
+
+    def _get_border(self, key):
+        """
+        Returns transitions across the border, see _borders
+        """
+
+        try:
+            return self._borders[key]
+        except KeyError:
+            pass
+
+        axis, cx, cy = key
+        s = self.cluster_size
+        width, height = self.map.size
+
+        transitions = []
+
+        # Cells on both sides of the border
+        if axis == 0:
+            x = cx * s + s - 1
+            if x + 1 < width:
+                y0 = cy * s
+                both = self._passable[x, y0:y0 + s] & self._passable[x + 1, y0:y0 + s]
+                for y in self._get_entrance_positions(both.tolist()):
+                    transitions.append(((x, y0 + y), (x + 1, y0 + y)))
+        else:
+            y = cy * s + s - 1
+            if y + 1 < height:
+                x0 = cx * s
+                both = self._passable[x0:x0 + s, y] & self._passable[x0:x0 + s, y + 1]
+                for x in self._get_entrance_positions(both.tolist()):
+                    transitions.append(((x0 + x, y), (x0 + x, y + 1)))
+
+        self._borders[key] = transitions
+        return transitions
+
+    @staticmethod
+    def _get_entrance_positions(open_cells):
+        """
+        Positions of entrances along a border: the middle of every short
+        opening and both ends of long ones
+        """
+        positions = []
+        start = None
+        for i, is_open in enumerate(open_cells + [False]):
+            if is_open and start is None:
+                start = i
+            elif not is_open and start is not None:
+                if i - start < 6:
+                    positions.append((start + i - 1) // 2)
+                else:
+                    positions.extend((start, i - 1))
+                start = None
+        return positions
+
+
+class PassabilityLog(object):
+    """
+    Cells, which became passable or impassable, in the order of changes;
+    any number of planners can catch up with the changes since they last
+    looked, see IncrementalPlanner
+    """
+
+    def __init__(self, game_map, max_size=4096):
+        """
+        game_map  Map to watch
+        max_size  Number of the last changes kept
+        """
+        self.map = game_map
+        self.changes = deque(maxlen=max_size)
+
+        # Number of all logged changes
+        self.count = 0
+
+        game_map.add_passability_listener(self.on_passability_change)
+
+    def on_passability_change(self, coord):
+        self.changes.append(coord)
+        self.count += 1
+
+    def get_changes(self, since):
+        """
+        Returns list of coordinates of cells changed after the first `since`
+        changes; None if some of them are already forgotten or all cells have
+        been replaced
+        """
+        count = self.count - since
+        if count > len(self.changes):
+            return None
+        # Only the new changes are copied, not the whole log
+        changes = list(itertools.islice(reversed(self.changes), count))[::-1]
+        if None in changes:
+            return None
+        return changes
+
+
+class IncrementalPlanner(object):
+    """
+    Incremental path search (D* Lite) from one entity to its target, which
+    keeps its search between steps and only repairs it when the entity
+    moves or cells change; every entity needs its own planner, changes of
+    cells come through PassabilityLog shared by all planners
+
+    Distances are searched from the target, so every move of the target
+    would change all of them. Instead, the entity heads for the cell where
+    the target was, as long as the target stays close to it compared with
+    the distance to the entity, and the search starts anew only when the
+    target has moved further away.
+    """
+
+    def __init__(self, game_map, passability_log, max_expansions=10000, retarget_ratio=0.125):
+        """
+        game_map         Map to search
+        passability_log  PassabilityLog of the map
+        max_expansions   Maximum number of cells expanded per step; the
+                         search goes on in the next step if it isn't done
+        retarget_ratio   Search for the new target location when the
+                         target has moved further than this part of the
+                         distance to the entity
+        """
+        self.map = game_map
+        self.passability_log = passability_log
+        self.max_expansions = max_expansions
+        self.retarget_ratio = retarget_ratio
+
+        # Number of cells expanded by the last step
+        self.expansions = 0
+
+        # Number of times the search started anew
+        self.searches = 0
+
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the search, the next step starts from scratch
+        """
+
+        self.start = None
+        self.target = None
+
+        # coord: distance to the target, and its one-step lookahead
+        self._g = {}
+        self._rhs = {}
+
+        # Heap of (key1, key2, coord) with stale items, valid keys are in
+        # _keys
+        self._queue = []
+        self._keys = {}
+
+        # Sum of distances the start has moved, added to all new keys
+        # instead of updating the queued ones
+        self._km = 0
+
+        self._log_position = self.passability_log.count
+
+        self.searches += 1
+
+    def get_next_step(self, start, target):
+        """
+        Returns coordinates of the next cell on the way from start to
+        target, None if the target is reached, can't be reached or the
+        search is not done yet
+        """
+
+        self.expansions = 0
+
+        if self.target is not None:
+            changes = self.passability_log.get_changes(self._log_position)
+            if changes is None or self._is_target_lost(start, target):
+                self.reset()
+
+        if self.target is None:
+            self.start = start
+            self.target = target
+            self._update(target)
+        else:
+            if start != self.start:
+                self._km += self._get_distance(self.start, start)
+                self.start = start
+            for coord in changes:
+                self._update(coord)
+                for adjacent_coord in self._get_adjacent(coord):
+                    self._update(adjacent_coord)
+
+        self._log_position = self.passability_log.count
+
+        if not self._search() or start == target:
+            return None
+
+        # Adjacent cell closest to the target
+        g = self._g
+        best_coord = None
+        best_distance = g.get(start, INFINITY)
+        for adjacent_coord in self._get_adjacent(start):
+            distance = g.get(adjacent_coord, INFINITY)
+            if distance < best_distance:
+                best_coord = adjacent_coord
+                best_distance = distance
+
+        # Where the target was can't be reached any more, look for the target
+        if best_coord is None and target != self.target:
+            self.reset()
+            return self.get_next_step(start, target)
+
+        return best_coord
+
+    def _is_target_lost(self, start, target):
+        """
+        Returns True if the target has moved too far from the searched
+        location or the entity has got there
+        """
+        if target == self.target:
+            return False
+        if start == self.target:
+            return True
+        return self.retarget_ratio * self._get_distance(start, target) < \
+               self._get_distance(target, self.target)
+
+    # == D* Lite ==
+
+    def _get_distance(self, a, b):
+        return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+    def _get_adjacent(self, coord):
+        """
+        Passable cells next to the cell
+        """
+        can_move_to = self.map.can_move_to
+        x, y = coord
+        return [c for c in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)) if can_move_to(c)]
+
+    def _get_key(self, coord):
+        distance = min(self._g.get(coord, INFINITY), self._rhs.get(coord, INFINITY))
+        return (distance + self._get_distance(self.start, coord) + self._km, distance)
+
+    def _push(self, coord):
+        key = self._get_key(coord)
+        self._keys[coord] = key
+        heapq.heappush(self._queue, key + (coord,))
+
+    def _update(self, coord):
+
+        g = self._g
+
+        if coord == self.target:
+            rhs = 0
+        else:
+            rhs = INFINITY
+            if self.map.can_move_to(coord):
+                for adjacent_coord in self._get_adjacent(coord):
+                    distance = g.get(adjacent_coord, INFINITY) + 1
+                    if distance < rhs:
+                        rhs = distance
+        self._rhs[coord] = rhs
+
+        self._keys.pop(coord, None)
+        if g.get(coord, INFINITY) != self._rhs.get(coord, INFINITY):
+            self._push(coord)
+
+    def _search(self):
+        """
+        Returns False if the search has been stopped by max_expansions
+        """
+
+        g = self._g
+        rhs = self._rhs
+        queue = self._queue
+        keys = self._keys
+        start = self.start
+
+        while queue:
+
+            k1, k2, coord = queue[0]
+            if keys.get(coord) != (k1, k2):
+                # Stale item
+                heapq.heappop(queue)
+                continue
+
+            start_distance = g.get(start, INFINITY)
+            if (k1, k2) >= self._get_key(start) and rhs.get(start, INFINITY) == start_distance:
+                break
+
+            if self.expansions >= self.max_expansions:
+                return False
+            self.expansions += 1
+
+            heapq.heappop(queue)
+            del keys[coord]
+
+            new_key = self._get_key(coord)
+            if (k1, k2) < new_key:
+                self._push(coord)
+            elif g.get(coord, INFINITY) > rhs.get(coord, INFINITY):
+                g[coord] = rhs[coord]
+                for adjacent_coord in self._get_adjacent(coord):
+                    self._update(adjacent_coord)
+            else:
+                g[coord] = INFINITY
+                self._update(coord)
+                for adjacent_coord in self._get_adjacent(coord):
+                    self._update(adjacent_coord)
+
+        return True
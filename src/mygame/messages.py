@@ -3,6 +3,7 @@ class Message(object):
     CHANGE_LOCATION = 'change_location'
     COLLECT = 'collect'
     DAMAGE = 'damage'
+    DESTROY = 'destroy'
 
     def __init__(self, message_type, **params):
         self._type = message_type
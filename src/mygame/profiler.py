@@ -0,0 +1,185 @@
+import collections
+import csv
+import json
+import timeit
+import pygame
+from mygame import stats
+
+# Upper bounds of histogram buckets in milliseconds
+HISTOGRAM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 33, 66, float('inf'))
+
+
+class _Section(object):
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = self.profiler.timer()
+
+    def __exit__(self, *exc_info):
+        self.profiler.add(self.name, self.profiler.timer() - self.start)
+
+
+class _NullSection(object):
+
+    def __enter__(self): pass
+
+    def __exit__(self, *exc_info): pass
+
+
+_null_section = _NullSection()
+
+
+class Profiler(object):
+    """
+    Collects time spent in named sections of every frame, e.g. phases of
+    the game loop and updates of entity components by component class:
+
+        with game.profiler.section('draw/map'):
+            ...
+
+    Sections of the same name are summed within a frame; the last frames
+    are kept for statistics, see get_summary(). Does nothing unless
+    enabled.
+    """
+
+    timer = staticmethod(timeit.default_timer)
+
+    def __init__(self, enabled=False, history=600):
+        """
+        enabled  Collect timings
+        history  Number of the last frames kept for statistics
+        """
+        self.enabled = enabled
+        self.overlay = False
+
+        # Section: seconds in the current frame
+        self._frame = {}
+
+        # Last frames, [{section: seconds}, ...]
+        self.frames = collections.deque(maxlen=history)
+
+        self._font = None
+
+    def section(self, name):
+        if not self.enabled:
+            return _null_section
+        return _Section(self, name)
+
+    def add(self, name, seconds):
+        self._frame[name] = self._frame.get(name, 0.0) + seconds
+
+    def end_frame(self):
+        if self._frame:
+            self.frames.append(self._frame)
+            self._frame = {}
+
+    def reset(self):
+        self._frame = {}
+        self.frames.clear()
+
+    # == Statistics ==
+
+    def get_sections(self):
+        return sorted(set(name for frame in self.frames for name in frame))
+
+    def get_values(self, name):
+        """
+        Milliseconds spent in the section in every kept frame, 0 if the
+        section wasn't entered in the frame
+        """
+        return [1000.0 * frame.get(name, 0.0) for frame in self.frames]
+
+    def get_histogram(self, name):
+        """
+        Returns number of frames by HISTOGRAM_BUCKETS
+        """
+        histogram = [0] * len(HISTOGRAM_BUCKETS)
+        for value in self.get_values(name):
+            for i, bound in enumerate(HISTOGRAM_BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+        return histogram
+
+    def get_summary(self):
+        """
+        Returns {section: summary} of per-frame times in milliseconds, see
+        stats.summarize()
+        """
+        return dict((name, stats.summarize(self.get_values(name))) for name in self.get_sections())
+
+    def get_hottest(self, count=5, prefix=''):
+        """
+        Returns [(section, mean milliseconds per frame), ...] of the
+        slowest sections with names starting with the prefix
+        """
+        summary = self.get_summary()
+        means = [(name, s['mean']) for name, s in summary.items() if name.startswith(prefix)]
+        return sorted(means, key=lambda (name, mean): -mean)[:count]
+
+    # == Export ==
+
+    def export(self, path):
+        """
+        Write summary of all sections into a JSON or CSV file, depending on
+        the file extension
+        """
+
+        summary = self.get_summary()
+
+        if path.lower().endswith('.csv'):
+            columns = ['count', 'mean', 'min', 'max', 'p50', 'p95', 'p99']
+            with open(path, 'wb') as f:
+                writer = csv.writer(f)
+                writer.writerow(['section'] + columns)
+                for name in sorted(summary):
+                    writer.writerow([name] + [summary[name][column] for column in columns])
+        else:
+            # [[upper bound, frames], ...], the last bound is null (infinity)
+            bounds = list(HISTOGRAM_BUCKETS[:-1]) + [None]
+            for name in summary:
+                summary[name]['histogram'] = zip(bounds, self.get_histogram(name))
+            with open(path, 'w') as f:
+                json.dump({'frames': len(self.frames), 'unit': 'ms', 'sections': summary},
+                          f, indent=2, sort_keys=True)
+
+    # == Overlay ==
+
+    def toggle_overlay(self):
+        """
+        Show or hide the overlay; profiling is enabled when it's shown
+        """
+        self.overlay = not self.overlay
+        if self.overlay:
+            self.enabled = True
+
+    def draw_overlay(self, surface, count=8):
+        """
+        Draw the slowest sections of the last 60 frames in the top left
+        corner; returns the covered rectangle
+        """
+
+        if self._font is None:
+            pygame.font.init()
+            self._font = pygame.font.Font(None, 18)
+
+        frames = list(self.frames)[-60:]
+        means = collections.defaultdict(float)
+        for frame in frames:
+            for name, seconds in frame.items():
+                means[name] += 1000.0 * seconds / len(frames)
+        hottest = sorted(means.items(), key=lambda (name, mean): -mean)[:count]
+
+        line_height = self._font.get_linesize()
+        rect = pygame.rect.Rect(0, 0, 300, line_height * count + 4)
+        surface.fill((0, 0, 0), rect)
+        for i, (name, mean) in enumerate(hottest):
+            y = 2 + i * line_height
+            surface.blit(self._font.render(name, False, (255, 255, 0)), (2, y))
+            surface.blit(self._font.render('%.2f ms' % mean, False, (255, 255, 0)), (230, y))
+
+        return rect
@@ -0,0 +1,277 @@
+import collections
+import itertools
+import math
+import pygame
+from mygame.map import Cell
+
+
+class Renderer(object):
+    """
+    Draws the whole map and all entities every frame
+    """
+
+    def __init__(self, game):
+        self.map_surface = pygame.Surface(game.map_size_in_pixels)
+        self.draw_surface = pygame.Surface(game.map_size_in_pixels)
+
+    def draw(self, game):
+        """
+        Draws the frame; returns list of updated screen rectangles, None
+        means the whole screen has been updated
+        """
+
+        profiler = game.profiler
+
+        self._clear_screen(game)
+
+        with profiler.section('draw/map'):
+            game.map.draw(game, self.map_surface)
+            self.draw_surface.blit(self.map_surface, (0, 0))
+
+        with profiler.section('draw/entities'):
+            self._draw_entities(game, self._get_entities(game))
+
+        with profiler.section('draw/screen'):
+            self._update_screen(game)
+
+        return None
+
+    def invalidate(self):
+        """
+        Make sure the whole screen is redrawn in the next frame
+        """
+        pass
+
+    def _get_entities(self, game):
+        return itertools.chain(game.get_entities(), (game.player,))
+
+    def _draw_entities(self, game, entities):
+        sprites = []
+        for e in entities:
+            sprites.extend(e.get_sprites(game))
+        self.draw_surface.blits(sprites, False)
+
+    def _clear_screen(self, game):
+        game.screen.fill((0, 0, 0))
+        self.draw_surface.fill((0, 0, 0))
+
+    def _update_screen(self, game):
+        game.screen.blit(self.draw_surface, game.get_screen_offset())
+
+
+class DirtyRectRenderer(Renderer):
+    """
+    Redraws only the areas of changed cells and of entities, which have moved
+    or changed their look since the previous frame
+    """
+
+    def __init__(self, game):
+        super(DirtyRectRenderer, self).__init__(game)
+
+        # entity: appearance, as drawn in the previous frame
+        self._appearances = {}
+
+        # Screen offset of the previous frame
+        self._offset = None
+
+    def draw(self, game):
+
+        offset = game.get_screen_offset()
+        redraw_all = offset != self._offset or getattr(game.map, 'redraw_all', False)
+        self._offset = offset
+
+        profiler = game.profiler
+
+        # Changed cells
+        dirty_rects = [cell.get_rect(game) for cell in Cell.updated_cells]
+        with profiler.section('draw/map'):
+            game.map.draw(game, self.map_surface)
+
+        # Changed, appeared and disappeared entities
+        with profiler.section('draw/appearances'):
+            entities = list(self._get_entities(game))
+            appearances = {}
+            for e in entities:
+                appearance = e.get_appearance(game)
+                old_appearance = self._appearances.pop(e, ())
+                if appearance != old_appearance:
+                    dirty_rects.extend(rect for rect, _ in old_appearance)
+                    dirty_rects.extend(rect for rect, _ in appearance)
+                appearances[e] = appearance
+            for old_appearance in self._appearances.values():
+                dirty_rects.extend(rect for rect, _ in old_appearance)
+            self._appearances = appearances
+
+        if redraw_all:
+            self._clear_screen(game)
+            self.draw_surface.blit(self.map_surface, (0, 0))
+            with profiler.section('draw/entities'):
+                self._draw_entities(game, entities)
+            with profiler.section('draw/screen'):
+                self._update_screen(game)
+            return None
+
+        if not dirty_rects:
+            return []
+
+        # Restore background
+        with profiler.section('draw/map'):
+            for rect in dirty_rects:
+                self.draw_surface.blit(self.map_surface, rect, rect)
+
+        # Redraw all entities touching dirty areas, in the usual order, so
+        # overlapping entities look the same as on a full redraw
+        with profiler.section('draw/entities'):
+            self._draw_entities(game, (e for e in entities
+                                         if any(rect.collidelist(dirty_rects) != -1
+                                                for rect, _ in appearances[e])))
+
+        # Copy dirty areas to the screen
+        with profiler.section('draw/screen'):
+            return [game.screen.blit(self.draw_surface, rect.move(offset), rect)
+                    for rect in dirty_rects]
+
+    def invalidate(self):
+        self._offset = None
+
+
+class ChunkedRenderer(Renderer):
+    """
+    Draws only what is visible on the screen: the map is split into chunks
+    of cells, which are rendered on demand and cached until some of their
+    cells change; entities outside of the screen are skipped
+    """
+
+    def __init__(self, game, chunk_size=(32, 32), max_chunks=256):
+        """
+        chunk_size  Size of the chunk in cells
+        max_chunks  Maximum number of cached chunk surfaces, the least
+                    recently drawn ones are dropped first
+        """
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+
+        # (chunk_x, chunk_y): surface, from the least recently drawn
+        self._chunks = collections.OrderedDict()
+
+        # Chunks drawn in the last frame
+        self.drawn_chunks = 0
+
+    def draw(self, game):
+
+        offset = game.get_screen_offset()
+
+        game.screen.fill((0, 0, 0))
+
+        # Visible part of the map, in pixels
+        viewport = pygame.rect.Rect((-offset[0], -offset[1]), game.screen_size)
+        viewport = viewport.clip(pygame.rect.Rect((0, 0), game.map_size_in_pixels))
+
+        with game.profiler.section('draw/map'):
+            self._draw_map(game, offset, viewport)
+
+        with game.profiler.section('draw/entities'):
+            self._draw_visible_entities(game, offset, viewport)
+
+        return None
+
+    def _draw_map(self, game, offset, viewport):
+
+        # Changed cells are redrawn only in already rendered chunks
+        if getattr(game.map, 'redraw_all', False):
+            self._chunks.clear()
+            game.map.redraw_all = False
+        else:
+            for cell in Cell.updated_cells:
+                self._draw_cell(game, cell)
+        Cell.updated_cells = []
+
+        # Visible chunks
+        chunk_width = self.chunk_size[0] * game.cell_size[0]
+        chunk_height = self.chunk_size[1] * game.cell_size[1]
+        chunk_coords = [(cx, cy) for cx in xrange(viewport.left / chunk_width, (viewport.right - 1) / chunk_width + 1)
+                                 for cy in xrange(viewport.top / chunk_height, (viewport.bottom - 1) / chunk_height + 1)]
+        game.screen.blits([(self._get_chunk(game, chunk_coord),
+                            (chunk_coord[0] * chunk_width + offset[0],
+                             chunk_coord[1] * chunk_height + offset[1]))
+                           for chunk_coord in chunk_coords], False)
+        self.drawn_chunks = len(chunk_coords)
+
+    def _draw_visible_entities(self, game, offset, viewport):
+
+        # Visible entities, with a margin of one cell for partially visible
+        cw, ch = game.cell_size
+        left = 1.0 * viewport.left / cw - 1
+        right = 1.0 * viewport.right / cw
+        top = 1.0 * viewport.top / ch - 1
+        bottom = 1.0 * viewport.bottom / ch
+        entities = [e for e in self._get_indexed_entities(game, left, top, right, bottom)
+                    if left < e.location.x < right and top < e.location.y < bottom]
+
+        # Drawn by type in the usual order, so overlapping entities look
+        # mostly the same as on a full redraw
+        index = game.entity_index
+        type_order = dict((entity_type, i) for i, entity_type in enumerate(game.entities))
+        entities.sort(key=lambda e: type_order.get(index.get_type(e)))
+        player = game.player
+        if left < player.location.x < right and top < player.location.y < bottom:
+            entities.append(player)
+
+        sprites = []
+        for e in entities:
+            sprites.extend((sprite, (x + offset[0], y + offset[1]))
+                           for sprite, (x, y) in e.get_sprites(game))
+
+        # Entities are clipped to the map, as on a full redraw
+        game.screen.set_clip(viewport.move(offset))
+        game.screen.blits(sprites, False)
+        game.screen.set_clip(None)
+
+    def _get_indexed_entities(self, game, left, top, right, bottom):
+        """
+        Entities indexed in the cells of the area; an entity is indexed by its
+        source cell, so it may be up to a cell away from it
+        """
+
+        index = game.entity_index
+        xs = xrange(int(math.floor(left)), int(math.ceil(right)) + 1)
+        ys = xrange(int(math.floor(top)), int(math.ceil(bottom)) + 1)
+
+        # Look up the visible cells, or the occupied ones if there are fewer
+        if len(xs) * len(ys) <= len(index):
+            coords = ((x, y) for y in ys for x in xs)
+        else:
+            coords = (coord for coord in index.get_coords()
+                      if xs[0] <= coord[0] <= xs[-1] and ys[0] <= coord[1] <= ys[-1])
+
+        return [e for coord in coords for e in index.get(coord)]
+
+    def _get_chunk(self, game, chunk_coord):
+
+        chunk = self._chunks.pop(chunk_coord, None)
+        if chunk is None:
+            area = self._get_chunk_area(game, chunk_coord)
+            chunk = pygame.Surface((area.width * game.cell_size[0], area.height * game.cell_size[1]))
+            game.map.draw_area(game, chunk, area)
+
+        self._chunks[chunk_coord] = chunk
+        while self.max_chunks < len(self._chunks):
+            self._chunks.popitem(last=False)
+
+        return chunk
+
+    def _get_chunk_area(self, game, chunk_coord):
+        """
+        Cells of the chunk, chunks at the map edges may be smaller
+        """
+        area = pygame.rect.Rect((chunk_coord[0] * self.chunk_size[0], chunk_coord[1] * self.chunk_size[1]),
+                                self.chunk_size)
+        return area.clip(pygame.rect.Rect((0, 0), game.map.size))
+
+    def _draw_cell(self, game, cell):
+        chunk_coord = (cell.x / self.chunk_size[0], cell.y / self.chunk_size[1])
+        chunk = self._chunks.get(chunk_coord)
+        if chunk is not None:
+            rect = cell.get_rect(game).move(-chunk_coord[0] * self.chunk_size[0] * game.cell_size[0],
+                                            -chunk_coord[1] * self.chunk_size[1] * game.cell_size[1])
+            pygame.draw.rect(chunk, cell.color, rect)
@@ -0,0 +1,145 @@
+"""
+Recorded game sessions
+
+File layout, all numbers are little-endian:
+
+    header  Fixed-size header, see HEADER
+    ticks   TICK_DTYPE[], one record per tick, up to the end of the file
+
+A session is fully determined by the random seed, duration of every tick
+and the keys, so a recording can be replayed headless with exactly the
+same results, see BaseGame.replay(). The game has to be created with the
+same arguments as the recorded one, except for headless and the seed:
+
+    recording = replay.load('session.rec')
+    game = Game(headless=True, seed=recording.seed)
+    game.replay(recording)
+
+Keys are stored as bitmasks over RECORDED_KEYS, so the game logic must not
+read any other keys.
+"""
+
+import struct
+import numpy
+import pygame
+from mygame.input import KeyState
+
+MAGIC = 'MYGREC\0\0'
+VERSION = 1
+
+# Keys, which affect the game logic, either pressed or as key events
+RECORDED_KEYS = (
+    pygame.K_LEFT,
+    pygame.K_RIGHT,
+    pygame.K_UP,
+    pygame.K_DOWN,
+    pygame.K_SPACE,
+    pygame.K_PAUSE,
+)
+
+# magic, version, seed, fps
+HEADER = struct.Struct('<8sHxxII')
+
+# Tick duration, pressed keys, key down and key up events of the tick
+TICK = struct.Struct('<dHHH')
+TICK_DTYPE = numpy.dtype([
+    ('milliseconds', '<f8'),
+    ('pressed', '<u2'),
+    ('keydown', '<u2'),
+    ('keyup', '<u2'),
+])
+assert TICK.size == TICK_DTYPE.itemsize
+
+
+def get_mask(keys):
+    """
+    Bitmask of the recorded keys among the pressed keys, e.g. KeyState or
+    the result of pygame.key.get_pressed()
+    """
+    mask = 0
+    for i, key in enumerate(RECORDED_KEYS):
+        if keys[key]:
+            mask |= 1 << i
+    return mask
+
+
+def get_keys(mask):
+    """
+    Returns list of the recorded keys in the bitmask
+    """
+    return [key for i, key in enumerate(RECORDED_KEYS) if mask & (1 << i)]
+
+
+class Recorder(object):
+    """
+    Writes the session of a running game into a file, tick by tick, see
+    BaseGame(recorder=...); ticks are written as they happen, so the
+    recording survives a crash
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.ticks = 0
+        self._file = None
+
+    def start(self, seed, fps):
+        self._file = open(self.path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, VERSION, seed, fps))
+        self.ticks = 0
+
+    def record(self, milliseconds, pressed_keys, keydown=(), keyup=()):
+        """
+        Write a tick, keydown and keyup are lists of keys of the tick's
+        events; returns the pressed keys as seen on replay, which the
+        game should use instead of the real ones
+        """
+        pressed = get_mask(pressed_keys)
+        self._file.write(TICK.pack(milliseconds, pressed,
+                                   get_mask(KeyState(keydown)), get_mask(KeyState(keyup))))
+        self.ticks += 1
+        return KeyState(get_keys(pressed))
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class Recording(object):
+
+    def __init__(self, seed, fps, ticks):
+        """
+        seed   Random seed of the game
+        fps    Frame rate of the recorded game
+        ticks  TICK_DTYPE array
+        """
+        self.seed = seed
+        self.fps = fps
+        self.ticks = ticks
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def __iter__(self):
+        """
+        Yields (milliseconds, pressed keys, key down list, key up list) of
+        every tick
+        """
+        for milliseconds, pressed, keydown, keyup in self.ticks.tolist():
+            yield milliseconds, KeyState(get_keys(pressed)), get_keys(keydown), get_keys(keyup)
+
+
+def load(path):
+
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError('%s is not a recording' % path)
+        magic, version, seed, fps = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError('%s is not a recording' % path)
+        if version != VERSION:
+            raise ValueError('Unsupported recording version %d' % version)
+        ticks = numpy.fromfile(f, dtype=TICK_DTYPE)
+
+    return Recording(seed, fps, ticks)
@@ -0,0 +1,254 @@
+"""
+Binary saved games
+
+File layout, all numbers are little-endian:
+
+    header      Fixed-size header, see HEADER, padded to MAP_OFFSET bytes
+    types       int8[width][height] cell types
+    passable    bool[width][height] cell passability
+    durability  int8[width][height] cell durability, -1 means None
+    health      float32[width][height] cell health, aligned to 4 bytes
+    entities    ENTITY_DTYPE[entity_count], the player goes first
+
+Map sections are memory-mapped (copy-on-write) straight into ArrayMap on
+loading, so large maps are read from disk only as far as they are used.
+Passability and durability follow from cell types, but are stored too, so
+they don't have to be computed for the whole map on loading.
+
+Entities resume where they were saved: moving ones with their speed and
+directions, monsters still chasing the player if they were, and the player
+with the time since the last bomb. Caches, like searched paths, are not
+saved and are rebuilt by the loaded game.
+"""
+
+import os
+import struct
+import numpy
+from mygame import factory
+from mygame.components import Component
+from mygame.components.behavior import AgressiveAIComponent, HumanPlayerInputComponent
+from mygame.components.location import MovingLocationComponent
+from mygame.map.arraymap import ArrayMap
+
+MAGIC = 'MYGSAVE\0'
+VERSION = 2
+
+# Map sections in the file order, (ArrayMap array, dtype)
+MAP_SECTIONS = (
+    ('types', 'i1'),
+    ('passable', '?'),
+    ('durability', 'i1'),
+    ('health', '<f4'),
+)
+
+# magic, version, width, height, entities offset, entity count
+HEADER = struct.Struct('<8sHxxIIQI')
+MAP_OFFSET = 64
+
+# Entity types by type code
+ENTITY_TYPES = ('player', 'coins', 'bombs', 'monsters')
+
+ENTITY_DTYPE = numpy.dtype([
+    ('type', 'u1'),
+    ('x', '<f8'),
+    ('y', '<f8'),
+    ('health', '<f8'),          # NaN - no health component or health is None
+    ('time', '<f8'),            # NaN - no explosion component or time is None
+    ('size', '<f8'),            # Size and color of the draw component, size is
+    ('color', 'u1', 3),         # NaN if there's none
+    ('state', '<u4'),           # Entity state flags, see mygame.types.state
+    ('speed', '<f8'),           # NaN - not a moving location
+    ('direction', 'u1'),
+    ('next_direction', 'u1'),
+    ('following', '?'),         # AgressiveAIComponent is chasing the player
+    ('last_direction', 'u1'),   # Of the random movement behavior
+    ('bomb_time', '<f8'),       # Time since the player's last bomb, NaN if
+                                # not the player
+])
+
+_creators = {
+    'player': factory.create_player,
+    'coins': factory.create_coin,
+    'bombs': factory.create_bomb,
+}
+
+
+def save(game, path):
+    """
+    Save the map and all entities of the game; the file is replaced only
+    after the new one is written, so the game loaded from it may keep using
+    its memory-mapped data
+    """
+
+    width, height = game.map.size
+    arrays = _get_map_arrays(game.map)
+    entities_offset = _get_section_offsets(width, height)[-1]
+
+    entities = [('player', game.player)]
+    for entity_type, entities_of_type in game.entities.items():
+        if entity_type not in ENTITY_TYPES:
+            raise ValueError('Entities of type %r can\'t be saved' % entity_type)
+        entities.extend((entity_type, e) for e in entities_of_type if not e.destroyed)
+
+    records = numpy.zeros(len(entities), dtype=ENTITY_DTYPE)
+    for record, (entity_type, e) in zip(records, entities):
+        _save_entity(record, entity_type, e)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, width, height, entities_offset, len(records)))
+        for (_, dtype), offset, array in zip(MAP_SECTIONS, _get_section_offsets(width, height), arrays):
+            f.seek(offset)
+            numpy.ascontiguousarray(array, dtype=dtype).tofile(f)
+        f.seek(entities_offset)
+        records.tofile(f)
+
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Windows doesn't replace existing files
+        os.remove(path)
+        os.rename(tmp_path, path)
+
+
+def load(game, path):
+    """
+    Load the map into a new ArrayMap and create all saved entities
+    """
+
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError('%s is not a saved game' % path)
+        magic, version, width, height, entities_offset, entity_count = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError('%s is not a saved game' % path)
+        if version != VERSION:
+            raise ValueError('Unsupported saved game version %d' % version)
+        f.seek(entities_offset)
+        records = numpy.fromfile(f, dtype=ENTITY_DTYPE, count=entity_count)
+
+    if len(records) != entity_count or entity_count == 0:
+        raise ValueError('%s is truncated' % path)
+
+    arrays = dict((name, numpy.memmap(path, dtype=dtype, mode='c', offset=offset, shape=(width, height)))
+                  for (name, dtype), offset in zip(MAP_SECTIONS, _get_section_offsets(width, height)))
+    game.map = ArrayMap(game, (width, height), None, arrays=arrays)
+
+    for record in records:
+        entity_type = ENTITY_TYPES[record['type']]
+        e = _load_entity(game, record, entity_type)
+        if entity_type == 'player':
+            game.player = e
+        else:
+            game.add_entity(entity_type, e)
+
+
+def _get_section_offsets(width, height):
+    """
+    Returns offsets of all map sections and of the entity section, sections
+    are aligned to their item size
+    """
+    offsets = []
+    offset = MAP_OFFSET
+    for _, dtype in MAP_SECTIONS:
+        itemsize = numpy.dtype(dtype).itemsize
+        offset = (offset + itemsize - 1) / itemsize * itemsize
+        offsets.append(offset)
+        offset += itemsize * width * height
+    offsets.append(offset)
+    return offsets
+
+
+def _get_map_arrays(game_map):
+
+    if isinstance(game_map, ArrayMap):
+        return [getattr(game_map, name) for name, _ in MAP_SECTIONS]
+
+    arrays = [numpy.empty(game_map.size, dtype=dtype) for _, dtype in MAP_SECTIONS]
+    types, passable, durability, health = arrays
+    for cell in game_map.get_cells():
+        types[cell.coord] = cell.type
+        passable[cell.coord] = cell.passable
+        durability[cell.coord] = -1 if cell.durability is None else cell.durability
+        health[cell.coord] = cell.health
+    return arrays
+
+
+def _save_entity(record, entity_type, e):
+
+    record['type'] = ENTITY_TYPES.index(entity_type)
+    record['x'], record['y'] = e.location.c
+
+    health = e(Component.HEALTH)
+    record['health'] = numpy.nan if health is None or health.health is None else health.health
+
+    explosion = e(Component.EXPLOSION)
+    record['time'] = numpy.nan if explosion is None or explosion.time is None else explosion.time
+
+    draw = e(Component.DRAW)
+    if draw is None:
+        record['size'] = numpy.nan
+    else:
+        record['size'] = draw.size
+        record['color'] = draw.color
+
+    record['state'] = e.state_mask
+
+    location = e.location
+    if isinstance(location, MovingLocationComponent):
+        record['speed'] = location.speed
+        record['direction'] = location._direction
+        record['next_direction'] = location._next_direction
+    else:
+        record['speed'] = numpy.nan
+
+    behavior = e(Component.BEHAVIOR)
+    if isinstance(behavior, AgressiveAIComponent):
+        record['following'] = behavior.is_following
+        record['last_direction'] = behavior._random_movement_behavior._last_direction
+    if isinstance(behavior, HumanPlayerInputComponent):
+        record['bomb_time'] = behavior._time_since_last_bomb
+    else:
+        record['bomb_time'] = numpy.nan
+
+
+def _load_entity(game, record, entity_type):
+
+    # Static entities stand in the cells and have integer coordinates
+    coord = tuple(int(c) if c.is_integer() else c
+                  for c in (float(record['x']), float(record['y'])))
+    if entity_type == 'monsters':
+        e = factory.create_monster(coord, movement_system=game.movement_system, ai=game.monster_ai)
+    else:
+        e = _creators[entity_type](coord)
+
+    health = e(Component.HEALTH)
+    if health is not None:
+        health.health = None if numpy.isnan(record['health']) else float(record['health'])
+
+    explosion = e(Component.EXPLOSION)
+    if explosion is not None:
+        explosion.time = None if numpy.isnan(record['time']) else float(record['time'])
+
+    draw = e(Component.DRAW)
+    if draw is not None and not numpy.isnan(record['size']):
+        draw.size = float(record['size'])
+        draw.color = tuple(int(c) for c in record['color'])
+
+    e.state_mask = int(record['state'])
+
+    location = e.location
+    if isinstance(location, MovingLocationComponent) and not numpy.isnan(record['speed']):
+        location.speed = float(record['speed'])
+        location._direction = int(record['direction'])
+        location._next_direction = int(record['next_direction'])
+
+    behavior = e(Component.BEHAVIOR)
+    if isinstance(behavior, AgressiveAIComponent):
+        behavior.is_following = bool(record['following'])
+        behavior._random_movement_behavior._last_direction = int(record['last_direction'])
+    if isinstance(behavior, HumanPlayerInputComponent) and not numpy.isnan(record['bomb_time']):
+        behavior._time_since_last_bomb = float(record['bomb_time'])
+
+    return e
@@ -0,0 +1,37 @@
+import math
+
+
+def percentile(values, p):
+    """
+    p-th percentile (0..100) of the values, linearly interpolated between
+    the closest ranks; None if there are no values
+    """
+
+    values = sorted(values)
+    if not values:
+        return None
+
+    k = (len(values) - 1) * p / 100.0
+    f = int(math.floor(k))
+    c = min(f + 1, len(values) - 1)
+
+    return values[f] + (values[c] - values[f]) * (k - f)
+
+
+def summarize(values, percentiles=(50, 95, 99)):
+    """
+    Returns dict with count, mean, min, max and pNN of the values
+    """
+
+    values = sorted(values)
+
+    summary = {
+        'count': len(values),
+        'mean': math.fsum(values) / len(values) if values else None,
+        'min': values[0] if values else None,
+        'max': values[-1] if values else None,
+    }
+    for p in percentiles:
+        summary['p%d' % p] = percentile(values, p)
+
+    return summary
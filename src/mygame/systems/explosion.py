@@ -0,0 +1,144 @@
+import timeit
+import numpy
+from mygame.messages import Message
+from mygame.types import damage
+
+# power: (dx, dy, damage_amount)
+_kernels = {}
+
+
+def get_radius(power):
+    return (8 * power) ** 0.5
+
+
+def get_kernel(power):
+    """
+    Offsets of all cells within the explosion radius and the damage done to
+    them, as three arrays; kernels are computed once per power
+    """
+
+    try:
+        return _kernels[power]
+    except KeyError:
+        pass
+
+    r = get_radius(power)
+    ri = int(numpy.ceil(r))
+
+    dx, dy = numpy.mgrid[-ri:ri + 1, -ri:ri + 1]
+    d = numpy.sqrt(dx ** 2 + dy ** 2)
+    inside = d <= r
+    if r:
+        damage_amount = power * (1 - (d[inside] / r) ** 2)
+    else:
+        damage_amount = numpy.full(1, float(power))
+
+    kernel = (dx[inside], dy[inside], damage_amount)
+    for array in kernel:
+        array.flags.writeable = False
+    _kernels[power] = kernel
+
+    return kernel
+
+
+class ExplosionSystem(object):
+    """
+    Collects explosions during a tick and resolves them all together: bombs
+    hit by an explosion detonate in the same tick, wave after wave, until the
+    chain reaction stops; then damage of all explosions is summed per cell
+    and every damaged cell and entity is hit once
+    """
+
+    def __init__(self):
+
+        # [(coord, power), ...]
+        self.pending = []
+
+        # Metrics of the last resolved chain reaction
+        self.chain_size = 0
+        self.chain_waves = 0
+        self.resolve_time = 0.0
+
+        # Metrics of all chain reactions
+        self.chains = 0
+        self.max_chain_size = 0
+        self.total_resolve_time = 0.0
+
+    def detonate(self, coord, power):
+        self.pending.append((coord, power))
+
+    def update(self, game):
+
+        if not self.pending:
+            return
+
+        from mygame.components import Component
+
+        start = timeit.default_timer()
+
+        width, height = game.map.size
+
+        # Occupied cells, entities don't move while the chain is resolved
+        coords = game.entity_index.get_coords()
+        coords = numpy.array(coords, dtype=numpy.intp).reshape(-1, 2)
+        coord_keys = coords[:, 0] * height + coords[:, 1]
+
+        # Expand the chain: bombs in cells hit by the current wave make the
+        # next one
+        detonations = []
+        waves = 0
+        while self.pending:
+            wave = self.pending
+            self.pending = []
+            detonations.extend(wave)
+            waves += 1
+            keys, _ = self._get_damage(wave, width, height)
+            for x, y in coords[numpy.isin(coord_keys, keys)].tolist():
+                for e in game.get_entities(coord=(x, y)):
+                    explosion = e(Component.EXPLOSION)
+                    if explosion is not None:
+                        explosion.explode(game, e)
+
+        # Damage map
+        keys, damages = self._get_damage(detonations, width, height)
+        xs, ys = numpy.divmod(keys, height)
+        game.map.hit_cells(xs, ys, damages, damage.BOMB)
+
+        # Damage entities which survived the chain
+        positions = numpy.minimum(numpy.searchsorted(keys, coord_keys), len(keys) - 1)
+        damaged = keys[positions] == coord_keys
+        for (x, y), damage_amount in zip(coords[damaged].tolist(), damages[positions[damaged]].tolist()):
+            for e in game.get_entities(coord=(x, y)):
+                e.send_message(game, Message.DAMAGE, damage=damage_amount)
+
+        self.chain_size = len(detonations)
+        self.chain_waves = waves
+        self.resolve_time = timeit.default_timer() - start
+        self.chains += 1
+        self.max_chain_size = max(self.max_chain_size, self.chain_size)
+        self.total_resolve_time += self.resolve_time
+
+    def _get_damage(self, detonations, width, height):
+        """
+        Returns sorted array of keys (x * height + y) of cells damaged by the
+        explosions and array of summed damage per cell; cells outside of the
+        map are dropped
+        """
+
+        xs = []
+        ys = []
+        damages = []
+        for (x, y), power in detonations:
+            dx, dy, damage_amount = get_kernel(power)
+            xs.append(dx + x)
+            ys.append(dy + y)
+            damages.append(damage_amount)
+        xs = numpy.concatenate(xs)
+        ys = numpy.concatenate(ys)
+        damages = numpy.concatenate(damages)
+
+        inside = (0 <= xs) & (xs < width) & (0 <= ys) & (ys < height)
+        keys, inverse = numpy.unique(xs[inside] * height + ys[inside], return_inverse=True)
+        damages = numpy.bincount(inverse, weights=damages[inside])
+
+        return keys, damages
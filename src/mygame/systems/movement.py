@@ -0,0 +1,249 @@
+import numpy
+from mygame.messages import Message
+from mygame.types import direction, state
+
+
+def _get_table(values, dtype):
+    """
+    Array indexed by direction
+    """
+    table = numpy.zeros(max(direction.directions_with_none) + 1, dtype=dtype)
+    for direction_, value in values.items():
+        table[direction_] = value
+    return table
+
+# Lookup tables indexed by direction
+_opposites = _get_table(direction.opposites, numpy.int8)
+_signs = _get_table(direction.signs, numpy.float64)
+_horizontal = _get_table(dict((d, d in (direction.LEFT, direction.RIGHT))
+                              for d in direction.directions_with_none), numpy.bool_)
+
+
+class MovementSystem(object):
+    """
+    Archetype storage of all moving entities: location, speed and direction
+    of every entity are kept in contiguous arrays and all entities are moved
+    at once in a single vectorized step, see ArrayMovingLocationComponent
+
+    Movement rules are the same as in MovingLocationComponent.update().
+    Only the movement is vectorized, behaviours still steer every entity in
+    Python, and with many entities they take most of the tick.
+    """
+
+    def __init__(self, capacity=64):
+
+        self.count = 0
+        self.entities = []
+
+        self.x = numpy.zeros(capacity, dtype=numpy.float64)
+        self.y = numpy.zeros(capacity, dtype=numpy.float64)
+        self.speed = numpy.zeros(capacity, dtype=numpy.float64)
+        self.direction = numpy.zeros(capacity, dtype=numpy.int8)
+        self.next_direction = numpy.zeros(capacity, dtype=numpy.int8)
+        self.active = numpy.zeros(capacity, dtype=numpy.bool_)
+        self.moving = numpy.zeros(capacity, dtype=numpy.bool_)
+        self.colliding = numpy.zeros(capacity, dtype=numpy.bool_)
+
+        # Released slots, which can be reused
+        self._free_slots = []
+
+        # Map passability as an array, rebuilt when the map changes
+        self._passable = None
+        self._passability_version = None
+
+    @property
+    def capacity(self):
+        return len(self.x)
+
+    # == Slots ==
+
+    def add(self, coord=(0.0, 0.0), speed=0.0, direction_=direction.NONE):
+        """
+        Allocate a slot for a new entity; returns the slot index
+        """
+
+        if self._free_slots:
+            i = self._free_slots.pop()
+        else:
+            if self.count == self.capacity:
+                self._grow()
+            i = self.count
+            self.count += 1
+            self.entities.append(None)
+
+        self.x[i], self.y[i] = coord
+        self.speed[i] = speed
+        self.direction[i] = direction_
+        self.next_direction[i] = direction.NONE
+        self.active[i] = False
+        self.moving[i] = False
+        self.colliding[i] = False
+
+        return i
+
+    def attach(self, i, entity):
+        self.entities[i] = entity
+        self.active[i] = True
+
+    def remove(self, i):
+        self.entities[i] = None
+        self.active[i] = False
+        self._free_slots.append(i)
+
+    def _grow(self):
+        for name in ('x', 'y', 'speed', 'direction', 'next_direction',
+                     'active', 'moving', 'colliding'):
+            array = getattr(self, name)
+            grown = numpy.zeros(2 * len(array), dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    # == Movement ==
+
+    def update(self, game):
+
+        n = self.count
+        d = self.direction[:n]
+        nd = self.next_direction[:n]
+
+        # Entities which don't move at all are skipped entirely
+        slots = numpy.flatnonzero(self.active[:n] & ((d != direction.NONE) | (nd != direction.NONE)))
+        if not len(slots):
+            return
+
+        # Usually all entities move, slices are much faster than indices then
+        if len(slots) == n:
+            index = slice(0, n)
+        else:
+            index = slots
+
+        d = d[index]
+        nd = nd[index]
+
+        # Start moving or change direction to the opposite; after this every
+        # entity has some direction
+        start = (d == direction.NONE) | (_opposites[d] == nd)
+        d = numpy.where(start, nd, d)
+
+        # Coordinates along the movement axis are turned by the sign of the
+        # direction, so that every entity moves forward: its target cell
+        # (ahead) is ceil() and its source cell (behind) is floor()
+        horizontal = _horizontal[d]
+        sign = _signs[d]
+        x = self.x[index]
+        y = self.y[index]
+        along = sign * numpy.where(horizontal, x, y)
+        target_old = numpy.ceil(along)
+        source_old = numpy.floor(along)
+
+        # Update locations
+        along += self.speed[index] * game.seconds
+
+        # Most entities stay between the same cells; only the ones, which
+        # have moved to a new target or source cell, can collide, read the
+        # next direction or change their cell
+        crossing = numpy.ceil(along) != target_old
+        crossing |= numpy.floor(along) != source_old
+        events = numpy.flatnonzero(crossing)
+
+        event_slots = slots[events]
+        event_horizontal = horizontal[events]
+        event_sign = sign[events]
+        event_d = d[events]
+        event_nd = nd[events]
+        event_along = along[events]
+        event_target_old = target_old[events]
+        event_source_old = source_old[events]
+        across = numpy.floor(numpy.where(event_horizontal, y[events], x[events]) + 0.5)
+
+        # Moving to a new cell, check for collisions
+        target = numpy.ceil(event_along)
+        colliding = target != event_target_old
+        target = event_sign[colliding] * target[colliding]
+        colliding[colliding] = ~self._can_move_to(
+            game.map,
+            numpy.where(event_horizontal[colliding], target, across[colliding]),
+            numpy.where(event_horizontal[colliding], across[colliding], target))
+        event_along[colliding] = event_target_old[colliding]
+        snapped = colliding.copy()
+
+        # Reached new cell
+        source = numpy.floor(event_along)
+        changed = source != event_source_old
+
+        # Read new direction
+        update_direction = colliding | changed
+        event_along *= event_sign
+        snap = update_direction & (event_d != event_nd)
+        event_along[snap] = numpy.floor(event_along[snap] + 0.5)
+        snapped |= snap
+        d[events] = numpy.where(update_direction, event_nd, event_d)
+
+        # Store new locations and directions
+        along *= sign
+        along[events] = event_along
+        self.x[index] = numpy.where(horizontal, along, x)
+        self.y[index] = numpy.where(horizontal, y, along)
+        snapped_slots = event_slots[snapped]
+        snapped_horizontal = event_horizontal[snapped]
+        self.x[snapped_slots[~snapped_horizontal]] = across[snapped][~snapped_horizontal]
+        self.y[snapped_slots[snapped_horizontal]] = across[snapped][snapped_horizontal]
+        self.direction[index] = d
+
+        # States, only changes are passed to entities
+        moving = d != direction.NONE
+        colliding &= moving[events]
+        is_colliding = numpy.zeros(len(slots), dtype=numpy.bool_)
+        is_colliding[events] = colliding
+        entities = self.entities
+        for flag, states, new_states in ((state.MOVING, self.moving, moving),
+                                         (state.COLLIDING, self.colliding, is_colliding)):
+            old_states = states[index]
+            for i in slots[new_states & ~old_states].tolist():
+                entities[i].set_state_flags(flag)
+            for i in slots[old_states & ~new_states].tolist():
+                entities[i].unset_state_flags(flag)
+            states[index] = new_states
+
+        # Notice other components about new locations
+        changed_slots = event_slots[changed].tolist()
+        if not changed_slots:
+            return
+        event_sign = event_sign[changed]
+        source = (event_sign * source[changed]).astype(numpy.intp).tolist()
+        source_old = (event_sign * event_source_old[changed]).astype(numpy.intp).tolist()
+        across = across[changed].astype(numpy.intp).tolist()
+        moved_entities = []
+        moved_coords = []
+        for i, is_horizontal, s, s_old, a in zip(changed_slots, event_horizontal[changed].tolist(),
+                                                 source, source_old, across):
+            entity = entities[i]
+            if is_horizontal:
+                coord = (s, a)
+                old_coord = (s_old, a)
+            else:
+                coord = (a, s)
+                old_coord = (a, s_old)
+            if entity.handles_message(Message.CHANGE_LOCATION):
+                entity.send_message(game, Message.CHANGE_LOCATION, coord=coord, old_coord=old_coord)
+            else:
+                moved_entities.append(entity)
+                moved_coords.append(coord)
+
+        # The game is told about the rest of entities at once
+        if moved_entities:
+            game.on_entities_moved(moved_entities, moved_coords)
+
+    def _can_move_to(self, game_map, x, y):
+
+        if self._passability_version != game_map.passability_version:
+            self._passable = game_map.get_passable_mask()
+            self._passability_version = game_map.passability_version
+
+        x = x.astype(numpy.intp)
+        y = y.astype(numpy.intp)
+        width, height = self._passable.shape
+        inside = (0 <= x) & (x < width) & (0 <= y) & (y < height)
+        result = numpy.zeros(len(x), dtype=numpy.bool_)
+        result[inside] = self._passable[x[inside], y[inside]]
+        return result
@@ -0,0 +1,142 @@
+import json
+import time
+import numpy
+from mygame import stats
+
+# One record per frame, times are in milliseconds
+FRAME_DTYPE = numpy.dtype([
+    ('tick', '<i8'),
+    ('frame', '<f4'),     # Time since the previous frame, as returned by Clock.tick()
+    ('update', '<f4'),
+    ('draw', '<f4'),      # Including display update
+    ('entities', '<i4'),
+])
+
+# Fields summarized with percentiles
+TIME_FIELDS = ('frame', 'update', 'draw')
+
+
+class Telemetry(object):
+    """
+    Frame times and entity counts of the last frames in a ring buffer, with
+    rolling percentiles and a frame budget alarm:
+
+        def on_hitch(telemetry, frame):
+            log.warning('Frame %(tick)d took %(frame).1f ms', frame)
+
+        game = Game(telemetry=Telemetry(on_over_budget=on_hitch,
+                                        path='session.json'))
+
+    The session summary is written to the path when the game is stopped.
+    """
+
+    def __init__(self, capacity=3600, budget=None, on_over_budget=None, path=None):
+        """
+        capacity        Number of the last frames kept in the ring buffer
+        budget          Maximum frame time in milliseconds, by default one
+                        and a half frame interval of the game, see
+                        BaseGame.fps
+        on_over_budget  Function called with the telemetry and the frame
+                        (dict of FRAME_DTYPE fields) when the frame time
+                        exceeds the budget
+        path            JSON file, where the session summary is written
+        """
+        self.budget = budget
+        self.on_over_budget = on_over_budget
+        self.path = path
+
+        self.frames = numpy.zeros(capacity, dtype=FRAME_DTYPE)
+
+        # Number of recorded frames, the ring buffer position is count %
+        # capacity
+        self.count = 0
+
+        # Whole session metrics
+        self.over_budget = 0
+        self.max_frame = 0.0
+        self.max_frame_tick = None
+        self.started = time.time()
+
+    @property
+    def capacity(self):
+        return len(self.frames)
+
+    def set_fps(self, fps):
+        """
+        Set the default budget for the game running at the fps
+        """
+        if self.budget is None:
+            self.budget = 1.5 * 1000.0 / fps
+
+    def record(self, tick, frame, update, draw, entities):
+        """
+        Add a frame, times are in milliseconds
+        """
+
+        self.frames[self.count % self.capacity] = (tick, frame, update, draw, entities)
+        self.count += 1
+
+        if frame > self.max_frame:
+            self.max_frame = frame
+            self.max_frame_tick = tick
+
+        if self.budget is not None and frame > self.budget:
+            self.over_budget += 1
+            if self.on_over_budget is not None:
+                self.on_over_budget(self, dict(tick=tick, frame=frame, update=update,
+                                               draw=draw, entities=entities))
+
+    def reset(self):
+        self.count = 0
+        self.over_budget = 0
+        self.max_frame = 0.0
+        self.max_frame_tick = None
+        self.started = time.time()
+
+    # == Statistics ==
+
+    def get_frames(self):
+        """
+        Kept frames, oldest first
+        """
+        if self.count <= self.capacity:
+            return self.frames[:self.count]
+        i = self.count % self.capacity
+        return numpy.concatenate((self.frames[i:], self.frames[:i]))
+
+    def get_percentile(self, field, p):
+        """
+        p-th percentile of the field over the kept frames, None if there
+        are no frames
+        """
+        return stats.percentile(self.get_frames()[field].tolist(), p)
+
+    def get_summary(self):
+        """
+        Returns summary of the kept frames, see stats.summarize(), and of
+        the whole session
+        """
+
+        frames = self.get_frames()
+
+        summary = {
+            'frames': self.count,
+            'seconds': time.time() - self.started,
+            'budget': self.budget,
+            'over_budget': self.over_budget,
+            'max_frame': self.max_frame,
+            'max_frame_tick': self.max_frame_tick,
+            'window': dict((field, stats.summarize(frames[field].tolist(), (50, 95, 99)))
+                           for field in TIME_FIELDS),
+        }
+        summary['window']['entities'] = stats.summarize(frames['entities'].tolist(), ())
+
+        return summary
+
+    def write_summary(self, path=None):
+        """
+        Write the summary into a JSON file, the path given to the
+        constructor by default
+        """
+        with open(path or self.path, 'w') as f:
+            json.dump(self.get_summary(), f, indent=2, sort_keys=True)
@@ -0,0 +1,29 @@
+# Entity states are interned: every state name gets its own bit, and entity
+# keeps all its states in one integer
+
+flags = {}
+
+
+def get_flag(name):
+    try:
+        return flags[name]
+    except KeyError:
+        flag = flags[name] = 1 << len(flags)
+        return flag
+
+
+def get_mask(names):
+    mask = 0
+    for name in names:
+        mask |= get_flag(name)
+    return mask
+
+
+def get_names(mask):
+    return set(name for name, flag in flags.items() if mask & flag)
+
+
+MOVING = get_flag('moving')
+COLLIDING = get_flag('colliding')
+CHASING = get_flag('chasing')
+FLASHING = get_flag('flashing')
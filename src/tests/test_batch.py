@@ -0,0 +1,53 @@
+from batch import runner
+
+# Fields of a result, which don't depend on timing
+_GAME_FIELDS = ('seed', 'config', 'caught', 'survival_ticks', 'survival_seconds',
+                'coins_collected', 'coins')
+
+
+def _get_game_fields(result):
+    return tuple(result[field] for field in _GAME_FIELDS)
+
+
+def _get_jobs():
+    return [(seed, {'map_size': 31, 'max_ticks': 120, 'monster_count': monster_count})
+            for monster_count in (2, 10)
+            for seed in xrange(3)]
+
+
+def test_run_job():
+
+    job = (3, {'map_size': 31, 'max_ticks': 120})
+    result = runner.run_job(job)
+
+    assert set(result) == set(_GAME_FIELDS + ('tick_mean', 'tick_p99', 'seconds'))
+    assert result['seed'] == 3
+    assert result['config'] == job[1]
+    assert 0 < result['survival_ticks'] <= 120
+    assert result['caught'] or result['survival_ticks'] == 120
+    assert result['coins'] == runner.DEFAULT_CONFIG['coin_count']
+    assert _get_game_fields(runner.run_job(job)) == _get_game_fields(result)
+
+
+def test_run_batch():
+
+    jobs = _get_jobs()
+    done = []
+    results = runner.run_batch(jobs, processes=2, callback=done.append)
+
+    # Results in the order of the jobs, the same as in a single process
+    assert [(r['seed'], r['config']) for r in results] == jobs
+    assert sorted(_get_game_fields(r) for r in done) == sorted(_get_game_fields(r) for r in results)
+    assert [_get_game_fields(r) for r in results] == \
+           [_get_game_fields(runner.run_job(job)) for job in jobs]
+
+    aggregated = runner.aggregate(results)
+    assert [config for config, _ in aggregated] == [jobs[0][1], jobs[3][1]]
+    for _, statistics in aggregated:
+        assert set(statistics) == set(('games', 'caught_ratio', 'survival_seconds',
+                                       'coins_collected', 'tick_mean', 'tick_p99'))
+        assert statistics['games'] == 3
+        assert 0.0 <= statistics['caught_ratio'] <= 1.0
+        assert statistics['survival_seconds']['count'] == 3
+
+    assert runner.run_batch([], processes=2) == []
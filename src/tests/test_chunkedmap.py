@@ -0,0 +1,69 @@
+import os
+import zlib
+import numpy
+from mygame.map import Cell, generator
+from mygame.map.chunkedmap import ChunkedMap
+
+
+def _spill_chunks(store_path=None):
+    """
+    Returns a map, which has saved modified chunks to disk
+    """
+
+    game_map = ChunkedMap(None, (4096, 4096), generator.ArrayMazeGenerator(seed=0),
+                          max_memory=2 ** 16, store_path=store_path, origin=(0, 0))
+    for x in xrange(0, 4096, 64):
+        game_map(x + 1, 1).change_to(Cell.STONE)
+        game_map.load_area((x, 1), 0)
+        game_map._time += 1
+        game_map._evict()
+
+    assert game_map.spilled_chunks
+    assert os.listdir(game_map.store_path)
+    return game_map
+
+
+def test_close_removes_temporary_store():
+    game_map = _spill_chunks()
+    store_path = game_map.store_path
+    game_map.close()
+    assert not os.path.exists(store_path)
+
+
+def test_close_keeps_given_store(tmpdir):
+    game_map = _spill_chunks(str(tmpdir))
+    game_map.close()
+    assert len(os.listdir(str(tmpdir))) == game_map.spilled_chunks
+
+
+def test_spill_and_reload(tmpdir):
+
+    game_map = _spill_chunks(str(tmpdir))
+    reference = ChunkedMap(None, (4096, 4096), generator.ArrayMazeGenerator(seed=0), origin=(0, 0))
+
+    # Modified chunks are restored from disk, with only the modified cell
+    # different from a freshly generated chunk
+    for x in xrange(0, 4096, 64):
+        cell = game_map(x + 1, 1)
+        assert cell.type == Cell.STONE
+        types = game_map._get_chunk((x / 64, 0)).types
+        expected = reference._get_chunk((x / 64, 0)).types.copy()
+        expected[1, 1] = Cell.STONE
+        assert (types == expected).all()
+    assert game_map.restored_chunks == game_map.spilled_chunks
+
+    # Unmodified chunks are generated again, the same as before
+    assert (0, 1) not in game_map.chunks
+    generated_chunks = game_map.generated_chunks
+    for chunk_coord in [(0, 1), (1, 1), (40, 17)]:
+        types = game_map._get_chunk(chunk_coord).types
+        assert (types == reference._get_chunk(chunk_coord).types).all()
+    assert game_map.generated_chunks == generated_chunks + 3
+
+
+def test_chunk_seed():
+
+    # Chunks depend only on the seed and their coordinates, not on the
+    # platform or the Python process
+    types = generator.ArrayMazeGenerator(seed=1234).generate_chunk((3, 5), (32, 32))
+    assert zlib.crc32(types.astype(numpy.int8).tobytes()) & 0xffffffff == 1940302708
@@ -0,0 +1,97 @@
+import pygame
+import pytest
+from mygame import Game, factory
+from mygame.components import Component
+from mygame.map import Cell
+
+
+def _bot(tick):
+    # Runs around and plants bombs all the time
+    move = (pygame.K_LEFT, pygame.K_UP, pygame.K_RIGHT, pygame.K_DOWN)[tick / 30 % 4]
+    return (move, pygame.K_SPACE)
+
+
+def _check_entities(game):
+    """
+    Entity lists have no destroyed entities and the entity index has all
+    of them in their cells
+    """
+
+    entities = list(game.get_entities())
+    assert len(entities) == game.get_entity_count() == len(game.entity_index)
+    for entity_type, type_entities in game.entities.items():
+        for e in type_entities:
+            assert not e.destroyed
+            assert e in game.entity_index
+            assert e in game.get_entities(entity_type, coord=e.location.cs)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_compaction(seed):
+
+    game = Game(headless=True, seed=seed, map_size=(31, 31), coin_count=20, monster_count=10)
+    pool = game.entity_pools['bombs']
+
+    for _ in xrange(40):
+        game.simulate(15, inputs=_bot)
+        _check_entities(game)
+
+    # Bombs have exploded and have been reused, none has been lost
+    assert pool.reused
+    assert pool.created == len(game.entities['bombs']) + len(pool)
+
+
+def test_reused_bomb():
+
+    game = Game(headless=True, seed=0, map_size=(31, 31))
+    pool = game.entity_pools['bombs']
+    first, second = [cell.coord for cell in list(game.map.get_cells(Cell.FLOOR))[:2]]
+
+    bomb = game.spawn_entity('bombs', first)
+    bomb.set_state('flashing')
+    bomb.set_property('owner', game.player)
+    explosion = bomb(Component.EXPLOSION)
+    explosion.power = 5.0
+    explosion.time = 0.5
+    bomb.destroy(game)
+    game.compact_entities()
+
+    assert bomb not in game.entities['bombs']
+    assert bomb not in game.entity_index
+    assert len(pool) == 1
+
+    reused = game.spawn_entity('bombs', second)
+    assert reused is bomb
+    assert not reused.destroyed
+    assert reused.state_mask == 0
+    assert not reused.has_property('owner')
+    assert reused.location.c == second
+    assert explosion.power == factory.BOMB_POWER
+    assert explosion.time == factory.BOMB_TIME
+    assert game.entities['bombs'] == [reused]
+    assert game.get_entities('bombs', coord=second) == [reused]
+    assert pool.created == pool.reused == 1
+
+
+def test_long_session():
+
+    # The player stands and plants a bomb every second, see
+    # long_session_tick_update
+    game = Game(headless=True, seed=0, map_size=(31, 31))
+    pool = game.entity_pools['bombs']
+
+    counts = []
+    for _ in xrange(6):
+        game.simulate(30 * game.fps, inputs=lambda tick: (pygame.K_SPACE,))
+        bomb_count = len(game.entities['bombs'])
+        counts.append((game.get_entity_count() - bomb_count, bomb_count, len(pool), pool.created))
+
+    # Other entities are only destroyed, and a bomb explodes in BOMB_TIME
+    # seconds, so only a few are ever alive
+    max_bombs = int(factory.BOMB_TIME) + 1
+    for other_count, bomb_count, free_count, created in counts:
+        assert other_count <= counts[0][0]
+        assert bomb_count <= max_bombs
+        assert free_count <= max_bombs
+        assert created <= max_bombs
+    assert pool.reused >= 150
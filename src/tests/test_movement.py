@@ -0,0 +1,79 @@
+import random
+import pytest
+from mygame.components import Component
+from mygame.components.location import ArrayMovingLocationComponent, MovingLocationComponent
+from mygame.entities import Entity
+from mygame.map import Cell, generator
+from mygame.map.arraymap import ArrayMap
+from mygame.messages import Message
+from mygame.systems.movement import MovementSystem
+from mygame.types import direction
+
+
+class _Game(object):
+    """
+    Just enough of a game to move entities, records their cell changes
+    """
+
+    def __init__(self, game_map):
+        self.map = game_map
+        self.milliseconds = 1000.0 / 60
+        self.moves = []
+
+    @property
+    def seconds(self):
+        return self.milliseconds / 1000.0
+
+    def on_entity_message(self, entity, message):
+        if message.type == Message.CHANGE_LOCATION:
+            self.moves.append((entity.properties['id'], message.coord))
+
+    def on_entities_moved(self, entities, coords):
+        self.moves.extend((entity.properties['id'], coord) for entity, coord in zip(entities, coords))
+
+
+def _create_entities(game, rng, count, movement_system=None):
+    cells = [cell.coord for cell in game.map.get_cells(Cell.FLOOR)]
+    entities = []
+    for i in xrange(count):
+        coord = rng.choice(cells)
+        speed = rng.choice((1.0, 3.0, 5.0, 9.5))
+        if movement_system is None:
+            location = MovingLocationComponent(coord, speed)
+        else:
+            location = ArrayMovingLocationComponent(movement_system, coord, speed)
+        entity = Entity(components={Component.LOCATION: location}, properties={'id': i})
+        if movement_system is not None:
+            location.attach(entity)
+        entities.append(entity)
+    return entities
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_same_as_moving_location(seed):
+
+    game_map = ArrayMap(None, (63, 63), generator.ArrayMazeGenerator(seed=seed))
+    game = _Game(game_map)
+    vectorized_game = _Game(game_map)
+    system = MovementSystem()
+
+    entities = _create_entities(game, random.Random(seed), 500)
+    vectorized_entities = _create_entities(vectorized_game, random.Random(seed), 500, system)
+
+    rng = random.Random(seed)
+    for tick in xrange(300):
+        game.milliseconds = vectorized_game.milliseconds = rng.choice((1000.0 / 60, 50.0, 150.0))
+        for e, vectorized_e in zip(entities, vectorized_entities):
+            if rng.random() < 0.1:
+                e.location.direction = vectorized_e.location.direction = \
+                    rng.choice(direction.directions_with_none)
+        for e in entities:
+            e.location.update(game, e)
+        system.update(vectorized_game)
+
+        for e, vectorized_e in zip(entities, vectorized_entities):
+            assert vectorized_e.location.c == e.location.c
+            assert vectorized_e.location._direction == e.location._direction
+            assert vectorized_e.state_mask == e.state_mask
+        assert sorted(vectorized_game.moves) == sorted(game.moves)
+        del game.moves[:], vectorized_game.moves[:]
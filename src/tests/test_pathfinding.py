@@ -0,0 +1,202 @@
+import random
+from collections import deque
+import pytest
+from mygame.map import Cell, generator
+from mygame.map.arraymap import ArrayMap
+from mygame.map.pathfinding import HierarchicalPathfinder, IncrementalPlanner, PassabilityLog
+
+
+def _create_map(size, seed):
+    return ArrayMap(None, (size, size), generator.ArrayMazeGenerator(seed=seed))
+
+
+def _get_distance(game_map, start, target):
+    """
+    Breadth-first search distance, None if the target can't be reached
+    """
+    distances = {start: 0}
+    queue = deque([start])
+    while queue:
+        coord = queue.popleft()
+        if coord == target:
+            return distances[coord]
+        x, y = coord
+        for adjacent_coord in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+            if adjacent_coord not in distances and game_map.can_move_to(adjacent_coord):
+                distances[adjacent_coord] = distances[coord] + 1
+                queue.append(adjacent_coord)
+    return None
+
+
+def _get_floor(game_map):
+    return [cell.coord for cell in game_map.get_cells(Cell.FLOOR)]
+
+
+def _toggle(game_map, rng, keep):
+    x = rng.randrange(1, game_map.width - 1)
+    y = rng.randrange(1, game_map.height - 1)
+    if (x, y) not in keep:
+        cell = game_map(x, y)
+        cell.change_to(Cell.STONE if cell.passable else Cell.FLOOR)
+
+
+def _toggle_on_border(game_map, rng, cluster_size, keep):
+    """
+    Toggle a cell next to a cluster border
+    """
+    x = rng.randrange(1, game_map.width - 1)
+    y = rng.randrange(1, game_map.height - 1)
+    if rng.random() < 0.5:
+        x = min(x // cluster_size * cluster_size + rng.choice((0, cluster_size - 1)), game_map.width - 2)
+    else:
+        y = min(y // cluster_size * cluster_size + rng.choice((0, cluster_size - 1)), game_map.height - 2)
+    if (x, y) not in keep:
+        cell = game_map(x, y)
+        cell.change_to(Cell.STONE if cell.passable else Cell.FLOOR)
+
+
+def _check_path(game_map, path, start, target):
+    assert path[0] == start
+    assert path[-1] == target
+    for coord, next_coord in zip(path, path[1:]):
+        assert abs(coord[0] - next_coord[0]) + abs(coord[1] - next_coord[1]) == 1
+        assert game_map.can_move_to(next_coord)
+
+
+def _move_randomly(game_map, rng, coord):
+    x, y = coord
+    adjacent = [c for c in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)) if game_map.can_move_to(c)]
+    return rng.choice(adjacent) if adjacent else coord
+
+
+def test_passability_log():
+
+    game_map = _create_map(15, 0)
+    log = PassabilityLog(game_map, max_size=4)
+
+    cells = [game_map(1, 1), game_map(1, 2), game_map(2, 1)]
+    for cell in cells:
+        cell.change_to(Cell.STONE if cell.passable else Cell.FLOOR)
+    assert log.get_changes(0) == [cell.coord for cell in cells]
+    assert log.get_changes(1) == [cell.coord for cell in cells[1:]]
+    assert log.get_changes(3) == []
+
+    # Forgotten changes
+    for cell in cells:
+        cell.change_to(Cell.STONE if cell.passable else Cell.FLOOR)
+    assert log.get_changes(1) is None
+    assert log.get_changes(2) == [cells[2].coord] + [cell.coord for cell in cells]
+
+    # All cells replaced
+    game_map.fill(Cell.FLOOR)
+    assert log.get_changes(log.count - 1) is None
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_steps_are_shortest(seed):
+
+    rng = random.Random(seed)
+    game_map = _create_map(41, seed)
+    planner = IncrementalPlanner(game_map, PassabilityLog(game_map, max_size=16))
+    floor = _get_floor(game_map)
+
+    steps = 0
+    while steps < 300:
+        start, target = rng.sample(floor, 2)
+        while steps < 300:
+            next_coord = planner.get_next_step(start, target)
+            distance = _get_distance(game_map, start, target)
+            if distance in (None, 0):
+                assert next_coord is None
+                break
+            assert next_coord is not None
+            assert _get_distance(game_map, next_coord, target) == distance - 1
+            start = next_coord
+            steps += 1
+            for _ in xrange(rng.randrange(3)):
+                _toggle(game_map, rng, (start, target))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_moving_target_is_caught(seed):
+
+    rng = random.Random(seed)
+    game_map = _create_map(41, seed)
+    planner = IncrementalPlanner(game_map, PassabilityLog(game_map))
+    floor = _get_floor(game_map)
+
+    for _ in xrange(10):
+        start, target = rng.sample(floor, 2)
+        max_steps = 4 * _get_distance(game_map, start, target) + 50
+        for _ in xrange(max_steps):
+            next_coord = planner.get_next_step(start, target)
+            if start == target:
+                assert next_coord is None
+                break
+            assert next_coord is not None
+            if planner.target == target:
+                assert _get_distance(game_map, next_coord, target) == \
+                       _get_distance(game_map, start, target) - 1
+            start = next_coord
+            if start != target and rng.random() < 0.5:
+                target = _move_randomly(game_map, rng, target)
+        else:
+            pytest.fail('Target not caught in %d steps' % max_steps)
+
+    # Searches started anew when the target moved too far
+    assert planner.searches > 10
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_hierarchical_paths_are_valid(seed):
+
+    rng = random.Random(seed)
+    game_map = _create_map(65, seed)
+    pathfinder = HierarchicalPathfinder(game_map, cluster_size=8)
+
+    for _ in xrange(40):
+        start, target = rng.sample(_get_floor(game_map), 2)
+        for _ in xrange(10):
+            path = pathfinder.get_path(start, target)
+            distance = _get_distance(game_map, start, target)
+            if distance is None:
+                assert path is None
+                assert pathfinder.get_next_step(start, target) is None
+            else:
+                _check_path(game_map, path, start, target)
+                next_coord = pathfinder.get_next_step(start, target)
+                if distance == 0:
+                    assert next_coord is None
+                else:
+                    _check_path(game_map, [start, next_coord], start, next_coord)
+                    assert _get_distance(game_map, next_coord, target) is not None
+            target = _move_randomly(game_map, rng, target)
+            for _ in xrange(rng.randrange(3)):
+                _toggle(game_map, rng, (start, target))
+                _toggle_on_border(game_map, rng, 8, (start, target))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_hierarchical_paths_are_short(seed):
+
+    rng = random.Random(seed)
+    game_map = _create_map(97, seed)
+    pathfinder = HierarchicalPathfinder(game_map)
+
+    lengths = []
+    for _ in xrange(30):
+        start, target = rng.sample(_get_floor(game_map), 2)
+        for _ in xrange(10):
+            path = pathfinder.get_path(start, target)
+            distance = _get_distance(game_map, start, target)
+            if distance is not None:
+                # Close targets are searched cell by cell
+                if distance <= pathfinder.cluster_size:
+                    assert len(path) - 1 == distance
+                # Remembered paths don't notice new shortcuts
+                assert len(path) - 1 <= 2 * distance + 2 * pathfinder.cluster_size
+                lengths.append((len(path) - 1, distance))
+            target = _move_randomly(game_map, rng, target)
+            _toggle(game_map, rng, (start, target))
+
+    assert sum(length for length, _ in lengths) <= 1.1 * sum(distance for _, distance in lengths)
@@ -0,0 +1,92 @@
+import pygame
+import pytest
+from mygame import Game, replay, savegame
+from mygame.input import KeyState
+
+
+def _bot(tick):
+    # Runs around and plants bombs now and then
+    move = (pygame.K_LEFT, pygame.K_UP, pygame.K_RIGHT, pygame.K_DOWN)[tick / 20 % 4]
+    if tick % 25 == 0:
+        return (move, pygame.K_SPACE)
+    return (move,)
+
+
+def _create_game(**kwargs):
+    return Game(map_size=(31, 31), coin_count=10, monster_count=5, **kwargs)
+
+
+def _get_entities(game):
+    """
+    Kind, location and state of all entities, the player first
+    """
+
+    entities = [('player', game.player)]
+    for entity_type in sorted(game.entities):
+        entities.extend((entity_type, e) for e in game.entities[entity_type] if not e.destroyed)
+
+    return [(entity_type, e.location.c, e.state_mask,
+             getattr(e.location, '_direction', None))
+            for entity_type, e in entities]
+
+
+def _record(path, monkeypatch, ticks):
+    """
+    Runs the game loop with a recorder, the keyboard replaced by _bot, and
+    stops it after the given number of ticks
+    """
+
+    events = {
+        10: pygame.K_PAUSE,
+        15: pygame.K_PAUSE,
+        ticks: pygame.K_ESCAPE,
+    }
+    tick = [0]
+
+    # Read once per tick by the recorder
+    def get_pressed():
+        key = events.get(tick[0])
+        if key is not None:
+            pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key))
+        tick[0] += 1
+        return KeyState(_bot(tick[0] - 1))
+
+    monkeypatch.setattr(pygame.key, 'get_pressed', get_pressed)
+
+    recorder = replay.Recorder(path)
+    game = _create_game(seed=7, recorder=recorder)
+    game.start()
+    return game
+
+
+def test_replay(tmpdir, monkeypatch):
+
+    path = str(tmpdir.join('session.rec'))
+    game = _record(path, monkeypatch, 90)
+
+    recording = replay.load(path)
+    assert recording.seed == 7
+    assert recording.fps == game.fps
+    assert len(recording) == game.ticks == 91
+    assert [keys for _, keys, _, _ in recording][:3] == [KeyState(_bot(tick)) for tick in xrange(3)]
+
+    replayed = _create_game(headless=True, seed=recording.seed)
+    assert replayed.replay(recording) == len(recording)
+
+    assert replayed.ticks == game.ticks
+    assert game.entities['bombs']
+    assert _get_entities(replayed) == _get_entities(game)
+    for array, replayed_array in zip(savegame._get_map_arrays(game.map),
+                                     savegame._get_map_arrays(replayed.map)):
+        assert replayed_array.tobytes() == array.tobytes()
+
+
+def test_seed_mismatch(tmpdir, monkeypatch):
+
+    path = str(tmpdir.join('session.rec'))
+    _record(path, monkeypatch, 5)
+
+    game = _create_game(headless=True, seed=8)
+    with pytest.raises(ValueError, match='seed'):
+        game.replay(replay.load(path))
+    assert game.ticks == 0
@@ -0,0 +1,170 @@
+import random
+import numpy
+import pygame
+import pytest
+from mygame import Game, savegame
+from mygame.components import Component
+from mygame.map import Cell, Map
+from mygame.map.arraymap import ArrayMap
+
+
+def _bot(tick):
+    # Runs around and plants bombs now and then
+    move = (pygame.K_LEFT, pygame.K_UP, pygame.K_RIGHT, pygame.K_DOWN)[tick / 40 % 4]
+    if tick % 50 == 0:
+        return (move, pygame.K_SPACE)
+    return (move,)
+
+
+def _create_game(map_class=Map):
+    game = Game(headless=True, seed=1, map_class=map_class, map_size=(31, 31),
+                coin_count=10, monster_count=5)
+    game.simulate(180, inputs=_bot)
+    return game
+
+
+def _get_entities(game):
+    """
+    Kind, location, speed and directions of all entities, the player first
+    """
+
+    entities = [('player', game.player)]
+    for entity_type in sorted(game.entities):
+        entities.extend((entity_type, e) for e in game.entities[entity_type] if not e.destroyed)
+
+    result = []
+    for entity_type, e in entities:
+        location = e.location
+        result.append((entity_type, location.c, e.state_mask,
+                       getattr(location, 'speed', None), getattr(location, '_direction', None),
+                       getattr(location, '_next_direction', None)))
+    return result
+
+
+def _save_and_load(game, path):
+    savegame.save(game, path)
+    return Game(headless=True, save_path=path)
+
+
+@pytest.mark.parametrize('map_class', [Map, ArrayMap])
+def test_round_trip(tmpdir, map_class):
+
+    game = _create_game(map_class)
+    first_path = str(tmpdir.join('first.sav'))
+    second_path = str(tmpdir.join('second.sav'))
+
+    loaded = _save_and_load(game, first_path)
+    reloaded = _save_and_load(loaded, second_path)
+
+    arrays = savegame._get_map_arrays(game.map)
+    for map_ in (loaded.map, reloaded.map):
+        assert isinstance(map_, ArrayMap)
+        assert map_.size == tuple(game.map.size)
+        for (name, dtype), array in zip(savegame.MAP_SECTIONS, arrays):
+            assert getattr(map_, name).tobytes() == numpy.asarray(array, dtype=dtype).tobytes()
+
+    assert _get_entities(loaded) == _get_entities(game)
+    assert _get_entities(reloaded) == _get_entities(game)
+
+    with open(first_path, 'rb') as first, open(second_path, 'rb') as second:
+        assert first.read() == second.read()
+
+
+def test_entity_state(tmpdir):
+
+    game = _create_game()
+    monsters = game.entities['monsters']
+    monsters[0](Component.BEHAVIOR).is_following = True
+    monsters[0].location.speed = 7.5
+    monsters[1](Component.BEHAVIOR)._random_movement_behavior._last_direction = 4
+    game.player(Component.BEHAVIOR)._time_since_last_bomb = 0.25
+
+    loaded = _save_and_load(game, str(tmpdir.join('game.sav')))
+
+    for monster, loaded_monster in zip(monsters, loaded.entities['monsters']):
+        behavior = monster(Component.BEHAVIOR)
+        loaded_behavior = loaded_monster(Component.BEHAVIOR)
+        assert loaded_behavior.is_following == behavior.is_following
+        assert loaded_behavior._random_movement_behavior._last_direction == \
+               behavior._random_movement_behavior._last_direction
+    assert loaded.entities['monsters'][0].location.speed == 7.5
+    assert loaded.player(Component.BEHAVIOR)._time_since_last_bomb == 0.25
+
+    times = [e(Component.EXPLOSION).time for e in game.entities['bombs'] if not e.destroyed]
+    assert times
+    assert [e(Component.EXPLOSION).time for e in loaded.entities['bombs']] == times
+
+
+def test_loaded_game_resumes(tmpdir):
+
+    game = _create_game()
+    loaded = _save_and_load(game, str(tmpdir.join('game.sav')))
+
+    for g in (game, loaded):
+        random.seed(2)
+        g.simulate(300, inputs=_bot)
+
+    assert _get_entities(loaded) == _get_entities(game)
+    assert savegame._get_map_arrays(loaded.map)[0].tobytes() == \
+           savegame._get_map_arrays(game.map)[0].tobytes()
+
+
+def test_mapped_load_keeps_file(tmpdir):
+
+    path = str(tmpdir.join('game.sav'))
+    savegame.save(_create_game(), path)
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    game = Game(headless=True, save_path=path)
+    assert isinstance(game.map.types, numpy.memmap)
+    assert game.map.types.mode == 'c'
+
+    for cell in list(game.map.get_cells((Cell.STONE, Cell.ROCK)))[:20]:
+        cell.change_to(Cell.FLOOR)
+    game.simulate(120, inputs=_bot)
+    del game
+
+    with open(path, 'rb') as f:
+        assert f.read() == data
+
+
+def _rewrite_header(path, **fields):
+    with open(path, 'rb') as f:
+        data = f.read()
+    values = dict(zip(('magic', 'version', 'width', 'height', 'entities_offset', 'entity_count'),
+                      savegame.HEADER.unpack_from(data)))
+    values.update(fields)
+    header = savegame.HEADER.pack(values['magic'], values['version'], values['width'],
+                                  values['height'], values['entities_offset'],
+                                  values['entity_count'])
+    with open(path, 'wb') as f:
+        f.write(header + data[len(header):])
+
+
+def test_wrong_magic(tmpdir):
+    path = str(tmpdir.join('game.sav'))
+    savegame.save(_create_game(), path)
+    _rewrite_header(path, magic='MYGREC\0\0')
+    with pytest.raises(ValueError, match='not a saved game'):
+        Game(headless=True, save_path=path)
+
+
+def test_unsupported_version(tmpdir):
+    path = str(tmpdir.join('game.sav'))
+    savegame.save(_create_game(), path)
+    _rewrite_header(path, version=savegame.VERSION + 1)
+    with pytest.raises(ValueError, match='Unsupported saved game version'):
+        Game(headless=True, save_path=path)
+
+
+@pytest.mark.parametrize('size', [0, savegame.HEADER.size - 1, -1])
+def test_truncated_file(tmpdir, size):
+    path = str(tmpdir.join('game.sav'))
+    savegame.save(_create_game(), path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:size])
+    with pytest.raises(ValueError):
+        Game(headless=True, save_path=path)